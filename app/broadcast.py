@@ -0,0 +1,544 @@
+"""
+Движок рассылки: пул отправителей + общий лимит скорости.
+
+- workers корутин берут получателей из ограниченной очереди (получатели идут потоком из
+  журнала доставки, Repo.iter_broadcast_pending), поэтому в полёте не больше workers запросов.
+- RateLimiter — один на процесс: ровный темп rate сообщений/с на все рассылки сразу
+  (лимит Telegram ~30/с на бота).
+- TelegramRetryAfter ставит на паузу весь лимитер (а не одного отправителя): Telegram
+  считает лимит на бота, продолжать слать другим — только продлевать бан.
+- Сетевые/5xx ошибки — повтор для этого получателя с backoff (до retries раз).
+- Итог по каждому получателю классифицируется: sent / blocked / deactivated /
+  not_found / bad_request / transient / error (on_result + счётчики BroadcastStats).
+
+BroadcastWorker — фоновая задача над заданиями из broadcast_jobs (миграция v7):
+- хендлер только создаёт задание (снимок аудитории в broadcast_deliveries) и будит воркер;
+- получатели берутся из журнала (status=0) keyset-страницами, итоги пишутся пачками
+  (FLUSH_ROWS / FLUSH_EVERY) — после рестарта задание продолжается с неотправленных;
+  при падении повторно уйдёт не больше одной незаписанной пачки.
+- прогресс — одно сообщение админу, редактируется не чаще PROGRESS_EVERY и берёт слот
+  общего лимитера (правки не выходят за бюджет отправки); кнопки пауза/продолжить/отмена.
+- волны (Rollout): сначала канарейка canary_pct% аудитории, затем ×wave_factor до 100%.
+  Доля получателя — стабильный хэш (job_id, telegram_id) -> корзина 0..9999, поэтому после
+  рестарта волны те же. Если доля ошибок (blocked / bad_request / transient / error, без
+  удалённых аккаунтов) после HALT_MIN_SAMPLE отправок >= halt_error_rate — задание
+  останавливается (status=halted), остаток не тратит лимит; «Продолжить» — под ответственность админа.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app import texts
+from app.db.models import DELIVERY_STATUSES, BroadcastJob
+
+if TYPE_CHECKING:
+    from app.db.repo import Repo
+
+logger = logging.getLogger("form_bronze_bot.broadcast")
+
+BROADCAST_RATE = 25.0     # сообщений/с на бота
+BROADCAST_WORKERS = 8     # одновременных запросов
+RETRIES = 3               # повторов временной ошибки на получателя
+BACKOFF = 0.5             # сек, удваивается с каждой попыткой
+FLUSH_ROWS = 200          # итогов в одной записи журнала
+FLUSH_EVERY = 2.0         # сек, не реже
+IDLE_POLL = 60            # сек: воркер без заданий всё равно иногда смотрит в БД
+PROGRESS_EVERY = 5.0      # сек между правками сообщения с прогрессом
+HALT_MIN_SAMPLE = 20      # отправок до первой проверки доли ошибок
+DEDUP_WINDOW = 6 * 3600   # сек: тот же пост той же аудитории в этом окне — то же задание
+BUCKETS = 10_000          # корзины волн (0.01%)
+
+SENT = "sent"
+BLOCKED = "blocked"           # бот заблокирован пользователем
+DEACTIVATED = "deactivated"   # аккаунт удалён
+NOT_FOUND = "not_found"       # chat not found
+BAD_REQUEST = "bad_request"   # прочие 400 (например, исходное сообщение удалено)
+TRANSIENT = "transient"       # сеть/5xx не прошли и после повторов
+ERROR = "error"               # неожиданное исключение
+UNREACHABLE = (BLOCKED, DEACTIVATED, NOT_FOUND)  # писать пользователю бесполезно (Repo.mark_unreachable)
+# ошибки, которые говорят о проблеме поста/кнопки, а не о чистоте аудитории
+HALT_OUTCOMES = (BLOCKED, BAD_REQUEST, TRANSIENT, ERROR)
+
+FAIL_LABELS = {
+    BLOCKED: "заблокировали бота",
+    DEACTIVATED: "аккаунт удалён",
+    NOT_FOUND: "чат не найден",
+    BAD_REQUEST: "ошибка запроса",
+    TRANSIENT: "сеть/сервер",
+    ERROR: "прочие",
+}
+
+Send = Callable[[int], Awaitable[object]]
+OnResult = Callable[[int, str], Awaitable[None]]
+
+
+def classify(exc: BaseException) -> str:
+    """Окончательный итог для ошибки отправки (TelegramRetryAfter сюда не попадает)."""
+    msg = str(exc).lower()
+    if isinstance(exc, TelegramForbiddenError):
+        return DEACTIVATED if "deactivated" in msg else BLOCKED
+    if isinstance(exc, TelegramBadRequest):
+        if "chat not found" in msg or "user not found" in msg:
+            return NOT_FOUND
+        if "deactivated" in msg:
+            return DEACTIVATED
+        return BAD_REQUEST
+    if isinstance(exc, (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError)):
+        return TRANSIENT
+    return ERROR
+
+
+class RateLimiter:
+    """Ровный темп: слоты через 1/rate с; pause() сдвигает все слоты (RetryAfter)."""
+
+    def __init__(self, rate: float = BROADCAST_RATE) -> None:
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            start = max(now, self._next, self._paused_until)
+            self._next = start + self.interval  # между чтением и записью нет await
+            if start > now:
+                await asyncio.sleep(start - now)
+            # пауза могла начаться, пока ждали слот — тогда ждём новый
+            if time.monotonic() >= self._paused_until:
+                return
+
+
+@dataclass
+class BroadcastStats:
+    outcomes: Counter = field(default_factory=Counter)
+    retry_after: int = 0          # сколько раз Telegram просил подождать
+    retry_after_seconds: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def sent(self) -> int:
+        return self.outcomes[SENT]
+
+    @property
+    def failed(self) -> int:
+        return sum(v for k, v in self.outcomes.items() if k != SENT)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def text(self) -> str:
+        lines = [f"Успешно: {self.sent} / Ошибок: {self.failed}"]
+        fails = [f"{FAIL_LABELS[k]} {v}" for k, v in self.outcomes.items() if k != SENT and v]
+        if fails:
+            lines.append("Ошибки: " + ", ".join(fails))
+        rate = self.sent / self.elapsed if self.elapsed else 0.0
+        lines.append(f"Время: {self.elapsed:.0f} с · {rate:.1f} сообщ./с")
+        if self.retry_after:
+            lines.append(f"Паузы RetryAfter: {self.retry_after} ({self.retry_after_seconds:.0f} с)")
+        return "\n".join(lines)
+
+
+@dataclass
+class JobControl:
+    """Пауза/отмена идущей рассылки: gate снят — отправители ждут; cancelled — дочитывают очередь без отправки."""
+    gate: asyncio.Event = field(default_factory=asyncio.Event)
+    cancelled: bool = False
+
+    def __post_init__(self) -> None:
+        self.gate.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self.gate.is_set()
+
+
+def bucket(job_id: int, telegram_id: int) -> int:
+    """Стабильная корзина 0..BUCKETS-1 (splitmix64 от пары) — у каждого задания своя канарейка."""
+    x = (telegram_id * 0x9E3779B97F4A7C15 + job_id) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (x ^ (x >> 31)) % BUCKETS
+
+
+@dataclass(frozen=True)
+class Rollout:
+    """Волны рассылки (Config.broadcast_*). canary_pct >= 100 — одной волной."""
+    canary_pct: float = 2.0
+    wave_factor: float = 5.0
+    halt_error_rate: float = 0.2
+
+    def waves(self) -> list[float]:
+        """Накопительные доли аудитории в %, последняя — 100."""
+        out: list[float] = []
+        pct = max(self.canary_pct, 0.01)
+        while pct < 100:
+            out.append(pct)
+            pct *= max(self.wave_factor, 1.5)
+        return out + [100.0]
+
+
+class BroadcastEngine:
+    """Один на процесс (общий limiter). run() — одна рассылка."""
+
+    def __init__(self, rate: float = BROADCAST_RATE, workers: int = BROADCAST_WORKERS, retries: int = RETRIES) -> None:
+        self.limiter = RateLimiter(rate)
+        self.workers = max(1, workers)
+        self.retries = retries
+
+    async def deliver(self, chat_id: int, send: Send, stats: BroadcastStats) -> str:
+        """Одна отправка с повторами. Возвращает итог (SENT или причину ошибки)."""
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            try:
+                await send(chat_id)
+                return SENT
+            except TelegramRetryAfter as e:
+                # не попытка: ждём вместе со всеми и пробуем снова
+                self.limiter.pause(e.retry_after)
+                stats.retry_after += 1
+                stats.retry_after_seconds += e.retry_after
+                logger.warning("broadcast: RetryAfter %ss", e.retry_after)
+            except Exception as e:
+                outcome = classify(e)
+                if outcome == TRANSIENT and attempt < self.retries:
+                    await asyncio.sleep(BACKOFF * 2 ** attempt)
+                    attempt += 1
+                    continue
+                if outcome == ERROR:
+                    logger.exception("broadcast: send to %s failed", chat_id)
+                return outcome
+
+    async def run(
+        self,
+        recipients: AsyncIterator[int],
+        send: Send,
+        on_result: OnResult | None = None,
+        stats: BroadcastStats | None = None,
+        control: JobControl | None = None,
+    ) -> BroadcastStats:
+        stats = stats or BroadcastStats()
+        control = control or JobControl()
+        queue: asyncio.Queue[int | None] = asyncio.Queue(maxsize=self.workers * 4)
+
+        async def produce() -> None:
+            async for chat_id in recipients:
+                if control.cancelled:
+                    break
+                await queue.put(chat_id)
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work() -> None:
+            while (chat_id := await queue.get()) is not None:
+                await control.gate.wait()
+                if control.cancelled:
+                    continue
+                outcome = await self.deliver(chat_id, send, stats)
+                stats.outcomes[outcome] += 1
+                if on_result:
+                    await on_result(chat_id, outcome)
+
+        tasks = [asyncio.create_task(produce()), *(asyncio.create_task(work()) for _ in range(self.workers))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:  # ошибка в одном отправителе не оставляет висеть остальных
+                t.cancel()
+        return stats
+
+
+def idempotency_key(src_chat_id: int, src_msg_id: int, audience: str, link_url: str | None = None) -> str:
+    """Ключ задания: исходное сообщение + аудитория (+ ссылка). Двойное нажатие даёт тот же ключ."""
+    raw = f"{src_chat_id}:{src_msg_id}:{audience}:{link_url or ''}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def broadcast_markup(link_text: str | None, link_url: str | None) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    if link_text and link_url:
+        kb.button(text=link_text, url=link_url)
+    kb.button(text="🏠 Главное меню", callback_data="menu:main")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60} с"
+    return f"{seconds} с"
+
+
+def _control_markup(job_id: int, paused: bool) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    if paused:
+        kb.button(text="▶️ Продолжить", callback_data=f"bcj:resume:{job_id}")
+    else:
+        kb.button(text="⏸ Пауза", callback_data=f"bcj:pause:{job_id}")
+    kb.button(text="✖️ Отменить", callback_data=f"bcj:cancel:{job_id}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+@dataclass
+class _Run:
+    """Идущее задание: счётчики до этого запуска + живые stats движка + сообщение прогресса."""
+    job: BroadcastJob
+    stats: BroadcastStats
+    control: JobControl
+    msg_id: int | None = None
+    last_text: str = ""
+    wave: str = ""              # «канарейка 2%» / «волна 2/4 · до 10%»
+    halted: str | None = None   # причина автоостановки
+    sample: tuple[float, int] = (0.0, 0)  # (monotonic, обработано) прошлой правки — для msg/s
+    poke: asyncio.Event = field(default_factory=asyncio.Event)  # обновить прогресс сейчас
+
+    @property
+    def done(self) -> int:
+        return self.job.sent + self.job.failed + self.stats.sent + self.stats.failed
+
+    def text(self) -> str:
+        job, stats = self.job, self.stats
+        now, done = time.monotonic(), self.done
+        t0, done0 = self.sample
+        rate = (done - done0) / (now - t0) if t0 and now > t0 else stats.sent / max(stats.elapsed, 1e-9)
+        self.sample = (now, done)
+        remaining = max(0, job.total - done)
+
+        if self.halted:
+            state = "⛔ остановлена"
+        elif self.control.paused:
+            state = "⏸ пауза"
+        else:
+            state = "✖️ отменяется" if self.control.cancelled else "идёт"
+        lines = [
+            f"📣 Рассылка #{job.id} · {state}" + (f" · {self.wave}" if self.wave else ""),
+            f"Отправлено: {job.sent + stats.sent} · Ошибок: {job.failed + stats.failed} · Осталось: {remaining}",
+        ]
+        if self.control.paused:
+            lines.append("Скорость: —")
+        else:
+            eta = f" · ETA ~{_duration(remaining / rate)}" if rate > 0 and remaining else ""
+            lines.append(f"Скорость: {rate:.1f} сообщ./с{eta}")
+        if stats.retry_after:
+            lines.append(f"⏳ Telegram просил подождать: {stats.retry_after} раз ({stats.retry_after_seconds:.0f} с)")
+        return "\n".join(lines)
+
+
+class BroadcastWorker:
+    """Выполняет задания рассылки по одному (см. docstring модуля). wake() — новое задание."""
+
+    def __init__(self, bot: Bot, repo: "Repo", engine: BroadcastEngine, rollout: Rollout | None = None) -> None:
+        self.bot = bot
+        self.repo = repo
+        self.engine = engine
+        self.rollout = rollout or Rollout()
+        self._wake = asyncio.Event()
+        self._run: _Run | None = None  # текущее задание
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                job = await self.repo.next_broadcast_job()
+                if job:
+                    await self.run_job(job)
+                    continue
+            except Exception:
+                logger.exception("broadcast worker failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), IDLE_POLL)
+            except asyncio.TimeoutError:
+                pass
+
+    # --------- управление (кнопки под прогрессом) ---------
+    async def control(self, job_id: int, action: str) -> str:
+        """pause / resume / cancel. Возвращает текст для ответа на нажатие."""
+        run = self._run if self._run and self._run.job.id == job_id else None
+        job = run.job if run else await self.repo.get_broadcast_job(job_id)
+        if job is None or (job.status in ("done", "cancelled") and not run):
+            return "Рассылка уже завершена."
+
+        if action == "pause":
+            await self.repo.set_broadcast_job_status(job_id, "paused")
+            if run:
+                run.control.gate.clear()
+            msg = "Пауза."
+        elif action == "resume":
+            # прерванное рестартом на паузе задание подхватит loop()
+            await self.repo.set_broadcast_job_status(job_id, "running")
+            if run:
+                run.control.gate.set()
+            self.wake()
+            msg = "Продолжаем."
+        elif action == "cancel":
+            await self.repo.set_broadcast_job_status(job_id, "cancelled")
+            if run:
+                run.control.cancelled = True
+                run.control.gate.set()
+            msg = "Рассылка отменена."
+        else:
+            return ""
+        if run:
+            run.poke.set()  # прогресс обновит _progress_loop — нажатие не ждёт слота лимитера
+        return msg
+
+    # --------- прогресс ---------
+    async def _edit(self, run: _Run, text: str, markup: InlineKeyboardMarkup | None) -> None:
+        await self.engine.limiter.acquire()  # правка — тоже запрос к Telegram, в общий темп
+        try:
+            if run.msg_id is None:
+                msg = await self.bot.send_message(run.job.admin_id, text, reply_markup=markup)
+                run.msg_id = msg.message_id
+            else:
+                await self.bot.edit_message_text(
+                    text=text, chat_id=run.job.admin_id, message_id=run.msg_id, reply_markup=markup
+                )
+            run.last_text = text
+        except TelegramAPIError as e:
+            # "message is not modified", RetryAfter на правку и т.п. — просто пропускаем обновление
+            logger.info("broadcast #%s: progress update skipped: %s", run.job.id, e)
+
+    async def _progress(self, run: _Run, force: bool = False) -> None:
+        if not run.job.admin_id:
+            return
+        text = run.text()
+        if force or text != run.last_text:
+            await self._edit(run, text, _control_markup(run.job.id, run.control.paused))
+
+    async def _progress_loop(self, run: _Run) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(run.poke.wait(), PROGRESS_EVERY)
+            except asyncio.TimeoutError:
+                pass
+            force = run.poke.is_set()
+            run.poke.clear()
+            try:
+                await self._progress(run, force)
+            except Exception:
+                logger.exception("broadcast #%s: progress failed", run.job.id)
+
+    async def run_job(self, job: BroadcastJob) -> BroadcastStats:
+        repo = self.repo
+        resumed = job.status == "running"
+        await repo.set_broadcast_job_status(job.id, "running")
+        logger.info("broadcast #%s %s: %s recipients", job.id, "resumed" if resumed else "started", job.total)
+
+        markup = broadcast_markup(job.link_text, job.link_url)
+
+        async def send(uid: int):
+            return await self.bot.copy_message(
+                chat_id=uid,
+                from_chat_id=job.src_chat_id,
+                message_id=job.src_msg_id,
+                reply_markup=markup,
+            )
+
+        buf: list[tuple[int, int]] = []
+        last_flush = time.monotonic()
+
+        async def flush() -> None:
+            nonlocal buf, last_flush
+            batch, buf = buf, []  # отправители продолжают писать в новый список
+            last_flush = time.monotonic()
+            if batch:
+                await repo.record_deliveries(job.id, batch)
+
+        run = self._run = _Run(job, BroadcastStats(), JobControl())
+        stats = run.stats
+        halt_rate = self.rollout.halt_error_rate
+
+        async def on_result(uid: int, outcome: str) -> None:
+            buf.append((uid, DELIVERY_STATUSES.index(outcome)))
+            if len(buf) >= FLUSH_ROWS or time.monotonic() - last_flush >= FLUSH_EVERY:
+                await flush()
+            processed = stats.sent + stats.failed
+            if run.halted or processed < HALT_MIN_SAMPLE:
+                return
+            bad = sum(stats.outcomes[k] for k in HALT_OUTCOMES)
+            if bad / processed >= halt_rate:
+                run.halted = f"доля ошибок {bad / processed:.0%} (порог {halt_rate:.0%}) после {processed} отправок"
+                run.control.cancelled = True  # движок дочитает очередь без отправки
+                run.control.gate.set()
+                logger.warning("broadcast #%s halted: %s", job.id, run.halted)
+
+        async def wave_recipients(limit: int) -> AsyncIterator[int]:
+            async for uid in repo.iter_broadcast_pending(job.id):
+                if bucket(job.id, uid) < limit:
+                    yield uid
+
+        waves = self.rollout.waves()
+        await self._progress(run)
+        progress_task = asyncio.create_task(self._progress_loop(run))
+        try:
+            for i, pct in enumerate(waves, 1):
+                if run.control.cancelled:
+                    break
+                run.wave = f"канарейка {pct:g}%" if i == 1 and len(waves) > 1 else f"волна {i}/{len(waves)} · до {pct:g}%"
+                t0, done0 = time.monotonic(), run.done
+                run.poke.set()
+                await self.engine.run(wave_recipients(round(pct * BUCKETS / 100)), send, on_result, stats, run.control)
+                # следующая волна читает status=0 из журнала: итоги этой должны быть записаны,
+                # иначе её получатели попадут в выборку ещё раз
+                await flush()
+                logger.info(
+                    "broadcast #%s %s: %s processed in %.1fs", job.id, run.wave, run.done - done0, time.monotonic() - t0
+                )
+        finally:
+            progress_task.cancel()
+            self._run = None
+            await flush()
+        cancelled = run.control.cancelled and not run.halted
+        if run.halted:
+            await repo.set_broadcast_job_status(job.id, "halted")
+        elif not cancelled:
+            await repo.set_broadcast_job_status(job.id, "done")
+
+        done = await repo.get_broadcast_job(job.id)
+        logger.info("broadcast #%s %s: sent=%s failed=%s", job.id, done.status, done.sent, done.failed)
+        if done.admin_id:
+            if run.halted:
+                head = f"⛔ Рассылка остановлена: {run.halted}.\nПроверьте пост и кнопку-ссылку."
+            else:
+                head = "Рассылка отменена." if cancelled else texts.BROADCAST_DONE_TEXT
+            text = f"{head}\nРассылка #{done.id}, получателей: {done.total}\n{stats.text()}"
+            if resumed:
+                text += f"\nВсего с учётом до перезапуска: успешно {done.sent} / ошибок {done.failed}"
+            if cancelled or run.halted:
+                text += f"\nНе отправлено: {done.total - done.sent - done.failed}"
+            # после автоостановки можно продолжить (если причина не в посте) или отменить
+            await self._edit(run, text, _control_markup(done.id, paused=True) if run.halted else None)
+        return stats
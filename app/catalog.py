@@ -0,0 +1,125 @@
+"""
+Снимок каталога в памяти (collections / sculptures / sculpture_photos).
+
+Каталог маленький и меняется редко, поэтому экраны каталога читают не SQLite,
+а неизменяемый снимок:
+- заранее отсортированные массивы id (read-only memoryview над array('q')) —
+  страница = срез O(1) без копирования;
+- словари id -> frozen-модели (app.db.models) только с нужными экрану полями;
+- file_id фото по скульптуре (tuple).
+
+После записи в админке вызывается Catalog.refresh(): новый снимок строится целиком
+и подменяется одним присваиванием — читатели видят либо старый, либо новый.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from array import array
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from app.db.models import Collection, Sculpture
+from app.db.repo import Repo, utcnow_iso
+
+logger = logging.getLogger("form_bronze_bot.catalog")
+
+
+def _ids(values) -> memoryview:
+    return memoryview(array("q", values)).toreadonly()
+
+
+_EMPTY_IDS = _ids(())
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    collections: Mapping[int, Collection]
+    sculptures: Mapping[int, Sculpture]
+    photos: Mapping[int, tuple[str, ...]]
+    collection_ids: memoryview          # все коллекции: sort_order DESC, id DESC
+    active_collection_ids: memoryview   # только is_active=1, тот же порядок
+    by_collection: Mapping[int, memoryview]  # collection_id -> id скульптур (id DESC)
+    new_ids: memoryview                 # published_at DESC
+    featured_ids: memoryview            # is_featured=1, id DESC
+    loaded_at: str | None = None
+
+    @classmethod
+    def empty(cls) -> "CatalogSnapshot":
+        none = MappingProxyType({})
+        return cls(none, none, none, _EMPTY_IDS, _EMPTY_IDS, none, _EMPTY_IDS, _EMPTY_IDS)
+
+    @classmethod
+    def build(cls, collections: list[Collection], sculptures: list[Sculpture], photos: list[tuple[int, str]]) -> "CatalogSnapshot":
+        # модели уже неизменяемые — кладём как есть, без копирования полей
+        cols = {c.id: c for c in collections}
+        scs = {s.id: s for s in sculptures}
+
+        ph: dict[int, list[str]] = {}
+        for sid, file_id in photos:  # уже по (sculpture_id, sort_order, id)
+            ph.setdefault(sid, []).append(file_id)
+
+        col_order = sorted(cols.values(), key=lambda c: (c.sort_order or 0, c.id), reverse=True)
+        sc_desc = sorted(scs.values(), key=lambda s: s.id, reverse=True)
+
+        per_col: dict[int, list[int]] = {cid: [] for cid in cols}
+        for s in sc_desc:
+            per_col.setdefault(s.collection_id, []).append(s.id)
+
+        new = sorted(
+            (s for s in scs.values() if s.published_at is not None),
+            key=lambda s: (s.published_at, s.id),
+            reverse=True,
+        )
+
+        return cls(
+            collections=MappingProxyType(cols),
+            sculptures=MappingProxyType(scs),
+            photos=MappingProxyType({sid: tuple(v) for sid, v in ph.items()}),
+            collection_ids=_ids(c.id for c in col_order),
+            active_collection_ids=_ids(c.id for c in col_order if c.is_active == 1),
+            by_collection=MappingProxyType({cid: _ids(v) for cid, v in per_col.items()}),
+            new_ids=_ids(s.id for s in new),
+            featured_ids=_ids(s.id for s in sc_desc if s.is_featured == 1),
+            loaded_at=utcnow_iso(),
+        )
+
+    # --------- чтение (без БД) ---------
+    def collections_page(self, active_only: bool = True, limit: int = 10, offset: int = 0) -> tuple[list[Collection], int]:
+        ids = self.active_collection_ids if active_only else self.collection_ids
+        return [self.collections[i] for i in ids[offset:offset + limit]], len(ids)
+
+    def sculptures_page(self, collection_id: int, limit: int = 10, offset: int = 0) -> tuple[list[Sculpture], int]:
+        ids = self.by_collection.get(collection_id, _EMPTY_IDS)
+        return [self.sculptures[i] for i in ids[offset:offset + limit]], len(ids)
+
+    def new_page(self, limit: int = 10, offset: int = 0) -> tuple[list[Sculpture], int]:
+        return [self.sculptures[i] for i in self.new_ids[offset:offset + limit]], len(self.new_ids)
+
+    def featured_page(self, limit: int = 10, offset: int = 0) -> tuple[list[Sculpture], int]:
+        return [self.sculptures[i] for i in self.featured_ids[offset:offset + limit]], len(self.featured_ids)
+
+    def sculpture_photos(self, sculpture_id: int) -> tuple[str, ...]:
+        return self.photos.get(sculpture_id, ())
+
+
+class Catalog:
+    """Держатель текущего снимка. snap читается без блокировок, refresh() подменяет его."""
+
+    def __init__(self, repo: Repo) -> None:
+        self._repo = repo
+        self._lock = asyncio.Lock()
+        self.snap: CatalogSnapshot = CatalogSnapshot.empty()
+
+    async def refresh(self) -> CatalogSnapshot:
+        # lock: два параллельных refresh не подменят новый снимок старым
+        async with self._lock:
+            collections, sculptures, photos = await self._repo.load_catalog()
+            snap = CatalogSnapshot.build(collections, sculptures, photos)
+            self.snap = snap
+        logger.info(
+            "catalog snapshot: %s collections, %s sculptures, %s photos",
+            len(snap.collections), len(snap.sculptures), len(photos),
+        )
+        return snap
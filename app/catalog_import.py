@@ -0,0 +1,405 @@
+"""
+Массовый импорт каталога из манифеста: CSV / JSONL (построчно) / JSON (массив объектов).
+
+Одна строка манифеста = одна скульптура. Колонки (лишние игнорируются):
+  collection*        — название коллекции (нет такой — будет создана)
+  title*             — название работы
+  photos*            — file_id фото (1–6): в CSV через "|", в JSON — список или строка
+  artist, material, year, dimensions, description_short, description_full
+  status             — in_expo | available | sold | on_request (по умолчанию in_expo)
+  featured           — 1/0, да/нет, true/false
+  published_at       — ISO-дата, "now" или пусто (новинка = published_at задан)
+  collection_desc, collection_cover, collection_sort — только для новых коллекций
+  key                — стабильный ключ строки (по умолчанию "коллекция/название")
+
+- Файл читается потоково, строки проверяются, ошибки собираются в отчёт (строка не грузится).
+- Запись пачками по BATCH_ROWS строк: одна транзакция на пачку, executemany для
+  коллекций / скульптур / фото.
+- import_ledger (миграция v4) хранит key загруженных строк: повторный запуск того же
+  файла (после ошибки или правок) догружает только недостающее.
+- dry_run: тот же разбор и сверка с БД, без записи — отчёт «что будет сделано».
+
+Запуск:  python -m app.catalog_import manifest.csv [--dry-run] [--db PATH]
+Бот подхватит изменения после /catalog_refresh (или рестарта).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import aiosqlite
+
+from app.config import DbProfile, load_db_profile
+from app.db.migrations import migrate, require_latest
+from app.db.models import SCULPTURE_STATUSES
+from app.db.repo import utcnow_iso
+from app.db.tuning import apply_profile
+
+logger = logging.getLogger("form_bronze_bot.catalog_import")
+
+SUFFIXES = (".csv", ".jsonl", ".ndjson", ".json")
+BATCH_ROWS = 500
+MAX_PHOTOS = 6
+MAX_ERRORS_SHOWN = 20
+
+_TRUE = {"1", "true", "yes", "y", "да", "+"}
+_FALSE = {"", "0", "false", "no", "n", "нет", "-"}
+_PHOTO_SPLIT_RE = re.compile(r"[|,\s]+")
+
+
+@dataclass(slots=True)
+class ManifestRow:
+    line: int
+    key: str
+    collection: str
+    title: str
+    artist: str | None
+    material: str | None
+    year: str | None
+    dimensions: str | None
+    description_short: str | None
+    description_full: str | None
+    status: str
+    is_featured: int
+    published_at: str | None
+    photos: tuple[str, ...]
+    collection_desc: str | None
+    collection_cover: str | None
+    collection_sort: int
+
+
+@dataclass
+class ImportReport:
+    source: str
+    dry_run: bool
+    rows: int = 0
+    already: int = 0          # key уже в import_ledger
+    imported: int = 0         # загружено (или будет загружено при dry_run)
+    photos: int = 0
+    new_collections: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    errors_total: int = 0
+    aborted: str | None = None
+
+    def error(self, line: int, msg: str) -> None:
+        self.errors_total += 1
+        if len(self.errors) < MAX_ERRORS_SHOWN:
+            self.errors.append(f"строка {line}: {msg}")
+
+    def text(self) -> str:
+        head = f"Импорт: {self.source}" + (" (пробный прогон, без записи)" if self.dry_run else "")
+        verb = "К загрузке" if self.dry_run else "Загружено"
+        out = [
+            head,
+            f"Строк: {self.rows} · {verb}: {self.imported} (фото: {self.photos})"
+            f" · Уже были: {self.already} · Ошибок: {self.errors_total}",
+        ]
+        if self.new_collections:
+            out.append(f"Новые коллекции ({len(self.new_collections)}): " + ", ".join(self.new_collections))
+        if self.errors:
+            out.append("Ошибки:")
+            out.extend(f"  {e}" for e in self.errors)
+            if self.errors_total > len(self.errors):
+                out.append(f"  … и ещё {self.errors_total - len(self.errors)}")
+        if self.aborted:
+            out.append(f"⚠️ Прервано: {self.aborted}\nПовторный запуск продолжит с места остановки.")
+        return "\n".join(out)
+
+
+# --------- чтение манифеста (потоково) ---------
+def iter_manifest(path: str | Path) -> Iterator[tuple[int, object]]:
+    """(номер строки, сырая запись) — без загрузки CSV/JSONL целиком в память."""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with path.open(newline="", encoding="utf-8-sig") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(f, dialect=dialect)
+            for raw in reader:
+                yield reader.line_num, raw
+    elif suffix in (".jsonl", ".ndjson"):
+        with path.open(encoding="utf-8-sig") as f:
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield n, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield n, e
+    elif suffix == ".json":
+        # массив объектов целиком; для больших каталогов — JSONL
+        with path.open(encoding="utf-8-sig") as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError("JSON-манифест должен быть массивом объектов")
+        yield from enumerate(data, 1)
+    else:
+        raise ValueError(f"Неизвестный формат {suffix!r}: нужен {', '.join(SUFFIXES)}")
+
+
+def _text(raw: dict, name: str, max_len: int | None = None) -> str | None:
+    v = raw.get(name)
+    if v is None:
+        return None
+    v = str(v).strip()
+    if v in ("", "-"):
+        return None
+    if max_len and len(v) > max_len:
+        raise ValueError(f"{name}: длиннее {max_len} символов")
+    return v
+
+
+def parse_row(line: int, raw: object) -> ManifestRow:
+    """Проверка одной записи манифеста. ValueError — с понятным текстом для отчёта."""
+    if isinstance(raw, Exception):
+        raise ValueError(f"не JSON: {raw}")
+    if not isinstance(raw, dict):
+        raise ValueError("ожидался объект с полями")
+
+    collection = _text(raw, "collection", 80)
+    title = _text(raw, "title", 120)
+    if not collection:
+        raise ValueError("нет collection")
+    if not title:
+        raise ValueError("нет title")
+
+    status = _text(raw, "status") or "in_expo"
+    if status not in SCULPTURE_STATUSES:
+        raise ValueError(f"status {status!r} — допустимо: {', '.join(SCULPTURE_STATUSES)}")
+
+    featured = str(raw.get("featured") or "").strip().lower()
+    if featured not in _TRUE and featured not in _FALSE:
+        raise ValueError(f"featured {featured!r} — нужно 1/0")
+
+    published_at = _text(raw, "published_at")
+    if published_at == "now":
+        published_at = utcnow_iso()
+    elif published_at:
+        try:
+            datetime.fromisoformat(published_at)
+        except ValueError:
+            raise ValueError(f"published_at {published_at!r} — нужна ISO-дата (2026-01-31)") from None
+
+    photos_raw = raw.get("photos") or ()
+    if isinstance(photos_raw, str):
+        photos_raw = _PHOTO_SPLIT_RE.split(photos_raw)
+    photos = tuple(str(p).strip() for p in photos_raw if str(p).strip())
+    if not 1 <= len(photos) <= MAX_PHOTOS:
+        raise ValueError(f"photos: нужно 1–{MAX_PHOTOS} file_id, получено {len(photos)}")
+
+    sort_raw = _text(raw, "collection_sort")
+    try:
+        collection_sort = int(sort_raw) if sort_raw else 0
+    except ValueError:
+        raise ValueError("collection_sort — нужно целое число") from None
+
+    return ManifestRow(
+        line=line,
+        key=_text(raw, "key") or f"{collection}/{title}".casefold(),
+        collection=collection,
+        title=title,
+        artist=_text(raw, "artist"),
+        material=_text(raw, "material"),
+        year=_text(raw, "year"),
+        dimensions=_text(raw, "dimensions"),
+        description_short=_text(raw, "description_short"),
+        description_full=_text(raw, "description_full"),
+        status=status,
+        is_featured=int(featured in _TRUE),
+        published_at=published_at,
+        photos=photos,
+        collection_desc=_text(raw, "collection_desc"),
+        collection_cover=_text(raw, "collection_cover"),
+        collection_sort=collection_sort,
+    )
+
+
+# --------- запись ---------
+async def _flush(
+    conn: aiosqlite.Connection,
+    rows: list[ManifestRow],
+    collections: dict[str, int | None],
+    report: ImportReport,
+    source: str,
+) -> None:
+    """Одна пачка строк: сверка с ledger, затем всё одной транзакцией (или ничего)."""
+    marks = ", ".join("?" * len(rows))
+    cur = await conn.execute(f"SELECT item_key FROM import_ledger WHERE item_key IN ({marks})", [r.key for r in rows])
+    done = {k for (k,) in await cur.fetchall()}
+    fresh = [r for r in rows if r.key not in done]
+    report.already += len(rows) - len(fresh)
+    if not fresh:
+        return
+
+    new_cols: dict[str, ManifestRow] = {}
+    for r in fresh:
+        cf = r.collection.casefold()
+        if cf not in collections and cf not in new_cols:
+            new_cols[cf] = r
+
+    if report.dry_run:
+        for cf, r in new_cols.items():
+            collections[cf] = None  # «будет создана»: не считаем второй раз
+            report.new_collections.append(r.collection)
+        report.imported += len(fresh)
+        report.photos += sum(len(r.photos) for r in fresh)
+        return
+
+    now = utcnow_iso()
+    await conn.execute("BEGIN IMMEDIATE")
+    try:
+        # id новых строк: всё, что больше MAX(id) до вставки (пишем только мы — держим write lock)
+        if new_cols:
+            (base,) = await (await conn.execute("SELECT COALESCE(MAX(id), 0) FROM collections")).fetchone()
+            await conn.executemany(
+                """
+                INSERT INTO collections(title, short_desc, cover_photo_file_id, is_active, sort_order, created_at, updated_at)
+                VALUES(?, ?, ?, 1, ?, ?, ?)
+                """,
+                [(r.collection, r.collection_desc, r.collection_cover, r.collection_sort, now, now) for r in new_cols.values()],
+            )
+            cur = await conn.execute("SELECT id, title FROM collections WHERE id > ? ORDER BY id", (base,))
+            created = {title.casefold(): cid for cid, title in await cur.fetchall()}
+        else:
+            created = {}
+
+        (base,) = await (await conn.execute("SELECT COALESCE(MAX(id), 0) FROM sculptures")).fetchone()
+        await conn.executemany(
+            """
+            INSERT INTO sculptures(
+                collection_id, title, artist, year, material, dimensions,
+                description_short, description_full, status, is_featured,
+                published_at, created_at, updated_at
+            )
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    collections.get(r.collection.casefold()) or created[r.collection.casefold()],
+                    r.title, r.artist, r.year, r.material, r.dimensions,
+                    r.description_short, r.description_full, r.status, r.is_featured,
+                    r.published_at, now, now,
+                )
+                for r in fresh
+            ],
+        )
+        cur = await conn.execute("SELECT id FROM sculptures WHERE id > ? ORDER BY id", (base,))
+        sids = [sid for (sid,) in await cur.fetchall()]
+        if len(sids) != len(fresh):
+            raise RuntimeError(f"ожидали {len(fresh)} новых скульптур, получили {len(sids)}")
+
+        await conn.executemany(
+            "INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order) VALUES(?, ?, ?)",
+            [(sid, fid, i) for sid, r in zip(sids, fresh) for i, fid in enumerate(r.photos)],
+        )
+        await conn.executemany(
+            "INSERT INTO import_ledger(item_key, sculpture_id, source, imported_at) VALUES(?, ?, ?, ?)",
+            [(r.key, sid, source, now) for sid, r in zip(sids, fresh)],
+        )
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+
+    collections.update(created)
+    report.new_collections.extend(r.collection for r in new_cols.values())
+    report.imported += len(fresh)
+    report.photos += sum(len(r.photos) for r in fresh)
+
+
+async def import_manifest(
+    db_path: str,
+    path: str | Path,
+    *,
+    dry_run: bool = False,
+    batch: int = BATCH_ROWS,
+    source: str | None = None,
+    profile: DbProfile | None = None,
+) -> ImportReport:
+    """
+    Импорт манифеста в БД. Отдельное соединение: транзакции импорта не смешиваются
+    с запросами бота на общем соединении Repo.
+    """
+    source = source or Path(path).name
+    report = ImportReport(source=source, dry_run=dry_run)
+    # пробный прогон: БД только на чтение, без миграций
+    conn = await aiosqlite.connect(f"file:{db_path}?mode=ro" if dry_run else db_path, uri=dry_run)
+    try:
+        await apply_profile(conn, profile or DbProfile(), read_only=dry_run)
+        if dry_run:
+            try:
+                await require_latest(conn)
+            except RuntimeError as e:
+                report.aborted = str(e)
+                return report
+        else:
+            await migrate(conn)
+
+        cur = await conn.execute("SELECT id, title FROM collections")
+        collections: dict[str, int | None] = {title.casefold(): cid for cid, title in await cur.fetchall()}
+
+        seen: set[str] = set()
+        pending: list[ManifestRow] = []
+        try:
+            for line, raw in iter_manifest(path):
+                report.rows += 1
+                try:
+                    row = parse_row(line, raw)
+                except ValueError as e:
+                    report.error(line, str(e))
+                    continue
+                if row.key in seen:
+                    report.error(line, f"повтор key {row.key!r}")
+                    continue
+                seen.add(row.key)
+                pending.append(row)
+                if len(pending) >= batch:
+                    await _flush(conn, pending, collections, report, source)
+                    pending = []
+            if pending:
+                await _flush(conn, pending, collections, report, source)
+        except (ValueError, UnicodeDecodeError, csv.Error, RuntimeError, aiosqlite.Error) as e:
+            report.aborted = str(e)
+            logger.warning("catalog import %s aborted: %s", source, e)
+    finally:
+        await conn.close()
+
+    logger.info(
+        "catalog import %s%s: rows=%s imported=%s already=%s errors=%s",
+        source, " (dry run)" if dry_run else "", report.rows, report.imported, report.already, report.errors_total,
+    )
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.catalog_import", description="Массовый импорт каталога")
+    parser.add_argument("manifest", help="CSV / JSONL / JSON")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/bot.sqlite"))
+    parser.add_argument("--dry-run", action="store_true", help="только проверить и показать отчёт")
+    parser.add_argument("--batch", type=int, default=BATCH_ROWS, help="строк на транзакцию")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(import_manifest(
+        args.db, args.manifest, dry_run=args.dry_run, batch=args.batch, profile=load_db_profile(),
+    ))
+    print(report.text())
+    return 1 if report.aborted or report.errors_total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,11 +16,75 @@ def _parse_admin_ids(raw: str | None) -> set[int]:
     return out
 
 
+def _parse_kind_ints(raw: str | None) -> dict[str, int]:
+    """'visit=3,phone=-100123' -> {'visit': 3, 'phone': -100123}; мусор пропускаем."""
+    out: dict[str, int] = {}
+    for p in (raw or "").split(","):
+        k, _, v = p.partition("=")
+        if k.strip() and v.strip().lstrip("-").isdigit():
+            out[k.strip()] = int(v)
+    return out
+
+
+def _parse_chat_id(raw: str | None) -> int | None:
+    raw = (raw or "").strip()
+    return int(raw) if raw.lstrip("-").isdigit() else None
+
+
+@dataclass(frozen=True)
+class DbProfile:
+    """PRAGMA-профиль SQLite, применяется к каждому соединению (app/db/tuning.py)."""
+    synchronous: str = "NORMAL"          # в WAL: без fsync на каждый commit, целостность сохраняется
+    cache_size_kib: int = 16384
+    mmap_size_mb: int = 128
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5000
+    wal_autocheckpoint: int = 1000       # страниц
+    journal_size_limit_mb: int = 64      # до какого размера усекать WAL после checkpoint
+    wal_alarm_mb: int = 256              # WAL больше — предупреждение админам
+
+
+def load_db_profile() -> DbProfile:
+    """Профиль из окружения (без BOT_TOKEN — нужен и CLI-утилитам)."""
+    d = DbProfile()
+    return DbProfile(
+        synchronous=os.getenv("DB_SYNCHRONOUS", d.synchronous).upper(),
+        cache_size_kib=int(os.getenv("DB_CACHE_SIZE_KIB", d.cache_size_kib)),
+        mmap_size_mb=int(os.getenv("DB_MMAP_SIZE_MB", d.mmap_size_mb)),
+        temp_store=os.getenv("DB_TEMP_STORE", d.temp_store).upper(),
+        busy_timeout_ms=int(os.getenv("DB_BUSY_TIMEOUT_MS", d.busy_timeout_ms)),
+        wal_autocheckpoint=int(os.getenv("DB_WAL_AUTOCHECKPOINT", d.wal_autocheckpoint)),
+        journal_size_limit_mb=int(os.getenv("DB_JOURNAL_SIZE_LIMIT_MB", d.journal_size_limit_mb)),
+        wal_alarm_mb=int(os.getenv("DB_WAL_ALARM_MB", d.wal_alarm_mb)),
+    )
+
+
 @dataclass(frozen=True)
 class Config:
     bot_token: str
     admin_ids: set[int]
     db_path: str
+    db_profile: DbProfile = DbProfile()
+    # ✅ бэкапы (app/db/backup.py): интервал 0 — только вручную (/backup)
+    backup_dir: str = "/data/backups"
+    backup_interval_hours: float = 24
+    backup_keep: int = 7
+    # ✅ рассылка (app/broadcast.py): общий темп на бота и число одновременных запросов
+    broadcast_rate: float = 25.0
+    broadcast_workers: int = 8
+    # ✅ волны рассылки: канарейка % аудитории, множитель следующих волн, доля ошибок для остановки
+    broadcast_canary_pct: float = 2.0
+    broadcast_wave_factor: float = 5.0
+    broadcast_halt_error_rate: float = 0.2
+    # ✅ уведомления админам (app/notify.py): окно сворачивания всплеска (0 — без окна)
+    # и с какого числа событий вида за окно слать сводку (visit=3,phone=3,designer=3)
+    notify_window_s: float = 120.0
+    notify_digest_min: dict[str, int] = field(default_factory=dict)
+    # ✅ куда слать: группа админов (для всех видов), своя группа вида, тема форума вида
+    # (visit / phone / designer / system). Не задано — личка каждому из admin_ids.
+    notify_chat_id: int | None = None
+    notify_chats: dict[str, int] = field(default_factory=dict)
+    notify_topics: dict[str, int] = field(default_factory=dict)
 
 
 def load_config() -> Config:
@@ -32,4 +96,18 @@ def load_config() -> Config:
         bot_token=token,
         admin_ids=_parse_admin_ids(os.getenv("ADMIN_IDS")),
         db_path=os.getenv("DB_PATH", "/data/bot.sqlite"),
+        db_profile=load_db_profile(),
+        backup_dir=os.getenv("BACKUP_DIR", "/data/backups"),
+        backup_interval_hours=float(os.getenv("BACKUP_INTERVAL_HOURS", "24")),
+        backup_keep=int(os.getenv("BACKUP_KEEP", "7")),
+        broadcast_rate=float(os.getenv("BROADCAST_RATE", "25")),
+        broadcast_workers=int(os.getenv("BROADCAST_WORKERS", "8")),
+        broadcast_canary_pct=float(os.getenv("BROADCAST_CANARY_PCT", "2")),
+        broadcast_wave_factor=float(os.getenv("BROADCAST_WAVE_FACTOR", "5")),
+        broadcast_halt_error_rate=float(os.getenv("BROADCAST_HALT_ERROR_RATE", "0.2")),
+        notify_window_s=float(os.getenv("NOTIFY_WINDOW_S", "120")),
+        notify_digest_min=_parse_kind_ints(os.getenv("NOTIFY_DIGEST_MIN")),
+        notify_chat_id=_parse_chat_id(os.getenv("NOTIFY_CHAT_ID")),
+        notify_chats=_parse_kind_ints(os.getenv("NOTIFY_CHATS")),
+        notify_topics=_parse_kind_ints(os.getenv("NOTIFY_TOPICS")),
     )
@@ -0,0 +1,153 @@
+"""
+Онлайн-бэкап SQLite через backup API — без остановки бота.
+
+- Копия делается в отдельном потоке на своих соединениях (asyncio.to_thread):
+  event loop и соединение Repo продолжают обслуживать пользователей.
+- Копируем шагами по PAGES_PER_STEP страниц с паузой STEP_SLEEP между шагами —
+  блокировка источника держится только на время шага.
+- Если БД меняет другое соединение, SQLite начинает копию заново. После MAX_RESTARTS
+  перезапусков копируем одним шагом: одна read-транзакция, в WAL писателей не блокирует.
+- Готовая копия переводится в journal_mode=DELETE (один самодостаточный файл),
+  проверяется PRAGMA integrity_check и только потом получает итоговое имя.
+- Хранятся keep последних копий: bot-YYYYmmdd-HHMMSS.sqlite.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger("form_bronze_bot.backup")
+
+PAGES_PER_STEP = 1024
+STEP_SLEEP = 0.005  # сек между шагами
+MAX_RESTARTS = 3
+NAME_PREFIX = "bot-"
+NAME_SUFFIX = ".sqlite"
+
+
+class BackupError(RuntimeError):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class BackupResult:
+    path: Path
+    size: int
+    pages: int
+    seconds: float
+    restarts: int
+
+    def text(self) -> str:
+        return (
+            f"Бэкап: {self.path.name}\n"
+            f"Размер: {self.size / 1024 / 1024:.1f} МБ ({self.pages} стр.) · {self.seconds:.1f} с"
+            f" · перезапусков: {self.restarts}\n"
+            "integrity_check: ok"
+        )
+
+
+def _copy(src_path: str, dst_path: Path) -> tuple[int, int]:
+    """Синхронная часть (в потоке): копия + проверка. Возвращает (pages, restarts)."""
+    restarts = 0
+    last_remaining: int | None = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1  # источник изменился — SQLite начал копию сначала
+            if restarts >= MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    try:
+        try:
+            src.backup(dst, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_SLEEP)
+        except _TooManyRestarts:
+            logger.info("backup: %s restarts under writes, copying in one step", restarts)
+            src.backup(dst, pages=-1)
+
+        dst.execute("PRAGMA journal_mode=DELETE")
+        rows = dst.execute("PRAGMA integrity_check").fetchall()
+        if rows != [("ok",)]:
+            raise BackupError("integrity_check: " + "; ".join(r[0] for r in rows[:5]))
+        (pages,) = dst.execute("PRAGMA page_count").fetchone()
+        return pages, restarts
+    finally:
+        dst.close()
+        src.close()
+
+
+class Backups:
+    """Бэкапы БД: run() — одна копия (вручную /backup), loop() — по расписанию."""
+
+    def __init__(self, db_path: str, backup_dir: str, keep: int) -> None:
+        self.db_path = db_path
+        self.dir = Path(backup_dir)
+        self.keep = max(1, keep)
+        self._lock = asyncio.Lock()  # не больше одного бэкапа одновременно
+
+    def list(self) -> list[Path]:
+        # от старых к новым
+        return sorted(self.dir.glob(f"{NAME_PREFIX}*{NAME_SUFFIX}"), key=lambda p: (p.stat().st_mtime, p.name))
+
+    async def run(self) -> BackupResult:
+        async with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+            final = self.dir / f"{NAME_PREFIX}{stamp}{NAME_SUFFIX}"
+            n = 1
+            while final.exists():  # два бэкапа в одну секунду
+                final = self.dir / f"{NAME_PREFIX}{stamp}-{n}{NAME_SUFFIX}"
+                n += 1
+            tmp = final.with_suffix(".tmp")
+
+            t0 = time.monotonic()
+            try:
+                pages, restarts = await asyncio.to_thread(_copy, self.db_path, tmp)
+                os.replace(tmp, final)
+            finally:
+                tmp.unlink(missing_ok=True)
+            result = BackupResult(final, final.stat().st_size, pages, time.monotonic() - t0, restarts)
+            self._prune()
+
+        logger.info("backup %s: %s bytes in %.1fs (restarts=%s)", final.name, result.size, result.seconds, restarts)
+        return result
+
+    def _prune(self) -> None:
+        for old in self.list()[:-self.keep]:
+            old.unlink(missing_ok=True)
+            logger.info("backup %s removed (keep=%s)", old.name, self.keep)
+
+    def _due_in(self, interval: float) -> float:
+        """Сек до следующего бэкапа: от mtime новейшей копии (нет копий — сразу)."""
+        backups = self.list()
+        if not backups:
+            return 0.0
+        return max(0.0, backups[-1].stat().st_mtime + interval - time.time())
+
+    async def loop(self, interval_hours: float) -> None:
+        """
+        Фоновая задача: бэкап раз в interval_hours. Срок считается от новейшей копии в
+        backup_dir, а не от старта — частые рестарты (деплой) не откладывают бэкап.
+        Ошибки логируем и ждём следующий цикл.
+        """
+        interval = interval_hours * 3600
+        while True:
+            await asyncio.sleep(self._due_in(interval))
+            try:
+                await self.run()
+            except Exception:
+                logger.exception("scheduled backup failed")
+                await asyncio.sleep(interval)  # копия не появилась — _due_in снова дал бы 0
@@ -0,0 +1,578 @@
+"""
+Версионные миграции схемы по PRAGMA user_version.
+
+- MIGRATIONS — упорядоченный список шагов; версия шага = номер, который запишется в user_version.
+- Каждый шаг выполняется в своей транзакции (BEGIN IMMEDIATE … COMMIT) вместе с записью версии:
+  либо шаг применился целиком, либо БД осталась на прошлой версии.
+- Актуальная БД: одно чтение PRAGMA user_version и выход.
+- Новый шаг = новая запись в конце MIGRATIONS (старые шаги не редактируем).
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+logger = logging.getLogger("form_bronze_bot.migrations")
+
+SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+
+# актуальный пересчёт counters (Repo.rebuild_counters); шаги миграций держат свою копию
+REBUILD_COUNTERS_SQL = """
+DELETE FROM counters;
+INSERT INTO counters(key, value)
+SELECT 'users', COUNT(*) FROM users
+UNION ALL SELECT 'users_notify', COUNT(*) FROM users WHERE consent=1 AND notify_enabled=1 AND unreachable_at IS NULL
+UNION ALL SELECT 'users_unreachable', COUNT(*) FROM users WHERE unreachable_at IS NOT NULL
+UNION ALL SELECT 'visit_new', COUNT(*) FROM visit_requests WHERE status='new';
+"""
+
+# пересчёт на момент v1 (до колонок доступности из v8) — шаг v1 не меняем
+_V1_REBUILD_COUNTERS_SQL = """
+DELETE FROM counters;
+INSERT INTO counters(key, value)
+SELECT 'users', COUNT(*) FROM users
+UNION ALL SELECT 'users_notify', COUNT(*) FROM users WHERE consent=1 AND notify_enabled=1
+UNION ALL SELECT 'visit_new', COUNT(*) FROM visit_requests WHERE status='new'
+UNION ALL SELECT 'collections', COUNT(*) FROM collections
+UNION ALL SELECT 'collections_active', COUNT(*) FROM collections WHERE is_active=1
+UNION ALL SELECT 'sculptures_new', COUNT(*) FROM sculptures WHERE published_at IS NOT NULL
+UNION ALL SELECT 'sculptures_featured', COUNT(*) FROM sculptures WHERE is_featured=1
+UNION ALL
+SELECT 'collection_sculptures:' || c.id, COUNT(s.id)
+FROM collections c LEFT JOIN sculptures s ON s.collection_id = c.id
+GROUP BY c.id;
+"""
+
+Progress = Callable[[str, int, int], None]
+StepFn = Callable[[aiosqlite.Connection, Progress], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: StepFn
+
+
+def split_sql(script: str) -> list[str]:
+    """Режет SQL-скрипт на отдельные statements (триггеры с BEGIN…END не ломает)."""
+    out: list[str] = []
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmt = buf.strip()
+            if stmt and stmt != ";":
+                out.append(stmt)
+            buf = ""
+    if buf.strip():
+        out.append(buf.strip())
+    return out
+
+
+async def exec_script(conn: aiosqlite.Connection, script: str) -> None:
+    """executescript() внутри уже открытой транзакции (он сам делает COMMIT — нам нельзя)."""
+    for stmt in split_sql(script):
+        await conn.execute(stmt)
+
+
+async def table_columns(conn: aiosqlite.Connection, table: str) -> set[str]:
+    cur = await conn.execute(f"PRAGMA table_info({table})")
+    return {r[1] for r in await cur.fetchall()}
+
+
+async def backfill(
+    conn: aiosqlite.Connection,
+    progress: Progress,
+    label: str,
+    table: str,
+    sql: str,
+    batch: int = 5000,
+) -> None:
+    """
+    Бэкфилл больших таблиц пачками по rowid с отчётом о прогрессе.
+    sql должен содержать `rowid BETWEEN ? AND ?` (получит границы пачки).
+    Границы берутся keyset-ом по реальным строкам (rowid может быть разреженным —
+    например users.telegram_id), в пачке ровно batch строк.
+    Вся работа остаётся в транзакции шага — пачки только для прогресса и памяти.
+    """
+    cur = await conn.execute(f"SELECT COUNT(*), MIN(rowid), MAX(rowid) FROM {table}")
+    total, lo, hi = await cur.fetchone()
+    if not total:
+        progress(label, 0, 0)
+        return
+    done = 0
+    start = lo
+    while start is not None:
+        cur = await conn.execute(
+            f"SELECT rowid FROM {table} WHERE rowid >= ? ORDER BY rowid LIMIT 1 OFFSET ?",
+            (start, batch - 1),
+        )
+        row = await cur.fetchone()
+        end = row[0] if row else hi
+        await conn.execute(sql, (start, end))
+        done = min(done + batch, total)
+        progress(label, done, total)
+        if end >= hi:
+            break
+        cur = await conn.execute(f"SELECT MIN(rowid) FROM {table} WHERE rowid > ?", (end,))
+        (start,) = await cur.fetchone()
+
+
+def _log_progress(label: str, done: int, total: int) -> None:
+    pct = 100 if not total else done * 100 // total
+    logger.info("migration backfill %s: %s/%s (%s%%)", label, done, total, pct)
+
+
+# ---------------- шаги ----------------
+
+async def _v1_baseline(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """
+    Всё, что раньше делал init_schema на каждом старте:
+    schema.sql (IF NOT EXISTS) + ALTER для старых БД + пересчёт counters.
+    """
+    # старые БД: колонки дизайнера нужны до индекса idx_users_designer_interest из schema.sql
+    cols = await table_columns(conn, "users")
+    if cols:
+        if "designer_interest" not in cols:
+            await conn.execute("ALTER TABLE users ADD COLUMN designer_interest INTEGER DEFAULT 0")
+        if "designer_interest_at" not in cols:
+            await conn.execute("ALTER TABLE users ADD COLUMN designer_interest_at TEXT NULL")
+
+    await exec_script(conn, SCHEMA_PATH.read_text(encoding="utf-8"))
+    await exec_script(conn, _V1_REBUILD_COUNTERS_SQL)
+
+
+_V2_CARD_SQL = """
+ALTER TABLE sculptures ADD COLUMN photo_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE sculptures ADD COLUMN cover_file_id TEXT NULL;
+
+CREATE TRIGGER trg_photos_card_ins AFTER INSERT ON sculpture_photos BEGIN
+  UPDATE sculptures
+  SET photo_count = photo_count + 1,
+      cover_file_id = (SELECT p.file_id FROM sculpture_photos p WHERE p.sculpture_id = NEW.sculpture_id
+                       ORDER BY p.sort_order, p.id LIMIT 1)
+  WHERE id = NEW.sculpture_id;
+END;
+
+CREATE TRIGGER trg_photos_card_del AFTER DELETE ON sculpture_photos BEGIN
+  UPDATE sculptures
+  SET photo_count = photo_count - 1,
+      cover_file_id = (SELECT p.file_id FROM sculpture_photos p WHERE p.sculpture_id = OLD.sculpture_id
+                       ORDER BY p.sort_order, p.id LIMIT 1)
+  WHERE id = OLD.sculpture_id;
+END;
+
+CREATE TRIGGER trg_photos_card_upd AFTER UPDATE OF sculpture_id, file_id, sort_order ON sculpture_photos BEGIN
+  UPDATE sculptures
+  SET photo_count = photo_count - (OLD.sculpture_id <> NEW.sculpture_id),
+      cover_file_id = (SELECT p.file_id FROM sculpture_photos p WHERE p.sculpture_id = OLD.sculpture_id
+                       ORDER BY p.sort_order, p.id LIMIT 1)
+  WHERE id = OLD.sculpture_id;
+  UPDATE sculptures
+  SET photo_count = photo_count + (OLD.sculpture_id <> NEW.sculpture_id),
+      cover_file_id = (SELECT p.file_id FROM sculpture_photos p WHERE p.sculpture_id = NEW.sculpture_id
+                       ORDER BY p.sort_order, p.id LIMIT 1)
+  WHERE id = NEW.sculpture_id;
+END;
+"""
+
+
+async def _v2_sculpture_card(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Денормализация для карточки: photo_count + cover_file_id (первое фото) в sculptures."""
+    await exec_script(conn, _V2_CARD_SQL)
+    await backfill(
+        conn, progress, "sculptures.photo_count/cover_file_id", "sculptures",
+        """
+        UPDATE sculptures
+        SET photo_count = (SELECT COUNT(*) FROM sculpture_photos p WHERE p.sculpture_id = sculptures.id),
+            cover_file_id = (SELECT p.file_id FROM sculpture_photos p WHERE p.sculpture_id = sculptures.id
+                             ORDER BY p.sort_order, p.id LIMIT 1)
+        WHERE rowid BETWEEN ? AND ?
+        """,
+    )
+
+
+# события -> +1 в stats_daily / stats_hourly (метрика, разрез)
+_V3_ROLLUP_BUMP = """
+  INSERT INTO stats_daily(metric, day, dim, value) VALUES ({metric}, strftime('%Y-%m-%d', 'now'), {dim}, 1)
+  ON CONFLICT(metric, day, dim) DO UPDATE SET value = value + 1;
+  INSERT INTO stats_hourly(metric, hour, dim, value) VALUES ({metric}, strftime('%Y-%m-%dT%H', 'now'), {dim}, 1)
+  ON CONFLICT(metric, hour, dim) DO UPDATE SET value = value + 1;"""
+
+
+def _bump(metric: str, dim: str = "''") -> str:
+    return _V3_ROLLUP_BUMP.format(metric=f"'{metric}'", dim=f"COALESCE({dim}, '')")
+
+
+_V3_ROLLUPS_SQL = f"""
+CREATE TABLE stats_daily (
+  metric TEXT NOT NULL,
+  day TEXT NOT NULL,          -- YYYY-MM-DD (UTC)
+  dim TEXT NOT NULL DEFAULT '',
+  value INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (metric, day, dim)
+) WITHOUT ROWID;
+
+CREATE TABLE stats_hourly (
+  metric TEXT NOT NULL,
+  hour TEXT NOT NULL,         -- YYYY-MM-DDTHH (UTC)
+  dim TEXT NOT NULL DEFAULT '',
+  value INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (metric, hour, dim)
+) WITHOUT ROWID;
+
+CREATE TRIGGER trg_users_rollup_signup AFTER INSERT ON users BEGIN{_bump("signup")}
+END;
+
+CREATE TRIGGER trg_users_rollup_consent AFTER UPDATE OF consent ON users
+WHEN NEW.consent = 1 AND COALESCE(OLD.consent, 0) <> 1
+BEGIN{_bump("consent")}
+END;
+
+CREATE TRIGGER trg_users_rollup_notify_on AFTER UPDATE OF notify_enabled ON users
+WHEN NEW.notify_enabled = 1 AND COALESCE(OLD.notify_enabled, 0) <> 1
+BEGIN{_bump("notify_on")}
+END;
+
+CREATE TRIGGER trg_users_rollup_notify_off AFTER UPDATE OF notify_enabled ON users
+WHEN COALESCE(NEW.notify_enabled, 0) <> 1 AND OLD.notify_enabled = 1
+BEGIN{_bump("notify_off")}
+END;
+
+CREATE TRIGGER trg_users_rollup_designer AFTER UPDATE OF designer_interest ON users
+WHEN NEW.designer_interest = 1 AND COALESCE(OLD.designer_interest, 0) <> 1
+BEGIN{_bump("designer")}
+END;
+
+CREATE TRIGGER trg_visit_rollup AFTER INSERT ON visit_requests BEGIN{_bump("visit", "NEW.city")}{_bump("visit_method", "NEW.contact_method")}
+END;
+"""
+
+# история из уже накопленных данных (по *_at колонкам)
+_V3_BACKFILL = [
+    ("users", "signup", "created_at", "''", "1"),
+    ("users", "consent", "consent_at", "''", "consent = 1"),
+    ("users", "notify_on", "notify_consent_at", "''", "notify_enabled = 1"),
+    ("users", "designer", "designer_interest_at", "''", "designer_interest = 1"),
+    ("visit_requests", "visit", "created_at", "COALESCE(city, '')", "1"),
+    ("visit_requests", "visit_method", "created_at", "COALESCE(contact_method, '')", "1"),
+]
+
+
+async def _v3_stats_rollups(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Дневные/часовые агрегаты событий для /admin статистики (ведутся триггерами)."""
+    await exec_script(conn, _V3_ROLLUPS_SQL)
+    for table, metric, ts_col, dim, cond in _V3_BACKFILL:
+        for target, bucket, width in (("stats_daily", "day", 10), ("stats_hourly", "hour", 13)):
+            await backfill(
+                conn, progress, f"{target}.{metric}", table,
+                f"""
+                INSERT INTO {target}(metric, {bucket}, dim, value)
+                SELECT '{metric}', substr({ts_col}, 1, {width}), {dim}, COUNT(*)
+                FROM {table}
+                WHERE rowid BETWEEN ? AND ? AND {ts_col} IS NOT NULL AND {cond}
+                GROUP BY 2, 3
+                ON CONFLICT(metric, {bucket}, dim) DO UPDATE SET value = value + excluded.value
+                """,
+            )
+
+
+_V4_IMPORT_LEDGER_SQL = """
+CREATE TABLE IF NOT EXISTS import_ledger (
+  item_key TEXT PRIMARY KEY,
+  sculpture_id INTEGER NOT NULL,
+  source TEXT,
+  imported_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+async def _v4_import_ledger(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Журнал массового импорта: item_key уже загруженных строк манифеста (см. app/catalog_import.py)."""
+    await exec_script(conn, _V4_IMPORT_LEDGER_SQL)
+
+
+_V5_LEGACY_IMPORT_SQL = """
+CREATE TABLE IF NOT EXISTS legacy_import_state (
+  source TEXT PRIMARY KEY,
+  last_id INTEGER NOT NULL DEFAULT 0,
+  rows INTEGER NOT NULL DEFAULT 0,
+  inserted INTEGER NOT NULL DEFAULT 0,
+  filled INTEGER NOT NULL DEFAULT 0,
+  conflicts INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT
+) WITHOUT ROWID;
+"""
+
+
+async def _v5_legacy_import_state(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Курсор переноса пользователей из старой БД (см. app/legacy_import.py)."""
+    await exec_script(conn, _V5_LEGACY_IMPORT_SQL)
+
+
+# external-content FTS5: текст хранится только в sculptures/collections, индекс ведут триггеры.
+# rank = bm25 с весами колонок (название важнее описания); prefix — быстрый поиск по началу слова.
+_V6_FTS_SQL = """
+CREATE VIRTUAL TABLE sculptures_fts USING fts5(
+  title, artist, material, description_short, description_full,
+  content='sculptures', content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+INSERT INTO sculptures_fts(sculptures_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 3.0, 1.0, 0.5)');
+
+CREATE VIRTUAL TABLE collections_fts USING fts5(
+  title, short_desc,
+  content='collections', content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+INSERT INTO collections_fts(collections_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)');
+
+CREATE TRIGGER trg_sculptures_fts_ins AFTER INSERT ON sculptures BEGIN
+  INSERT INTO sculptures_fts(rowid, title, artist, material, description_short, description_full)
+  VALUES (NEW.id, NEW.title, NEW.artist, NEW.material, NEW.description_short, NEW.description_full);
+END;
+
+CREATE TRIGGER trg_sculptures_fts_del AFTER DELETE ON sculptures BEGIN
+  INSERT INTO sculptures_fts(sculptures_fts, rowid, title, artist, material, description_short, description_full)
+  VALUES ('delete', OLD.id, OLD.title, OLD.artist, OLD.material, OLD.description_short, OLD.description_full);
+END;
+
+-- только текстовые колонки: photo_count/cover_file_id (триггеры фото) индекс не трогают
+CREATE TRIGGER trg_sculptures_fts_upd
+AFTER UPDATE OF title, artist, material, description_short, description_full ON sculptures BEGIN
+  INSERT INTO sculptures_fts(sculptures_fts, rowid, title, artist, material, description_short, description_full)
+  VALUES ('delete', OLD.id, OLD.title, OLD.artist, OLD.material, OLD.description_short, OLD.description_full);
+  INSERT INTO sculptures_fts(rowid, title, artist, material, description_short, description_full)
+  VALUES (NEW.id, NEW.title, NEW.artist, NEW.material, NEW.description_short, NEW.description_full);
+END;
+
+CREATE TRIGGER trg_collections_fts_ins AFTER INSERT ON collections BEGIN
+  INSERT INTO collections_fts(rowid, title, short_desc) VALUES (NEW.id, NEW.title, NEW.short_desc);
+END;
+
+CREATE TRIGGER trg_collections_fts_del AFTER DELETE ON collections BEGIN
+  INSERT INTO collections_fts(collections_fts, rowid, title, short_desc) VALUES ('delete', OLD.id, OLD.title, OLD.short_desc);
+END;
+
+CREATE TRIGGER trg_collections_fts_upd AFTER UPDATE OF title, short_desc ON collections BEGIN
+  INSERT INTO collections_fts(collections_fts, rowid, title, short_desc) VALUES ('delete', OLD.id, OLD.title, OLD.short_desc);
+  INSERT INTO collections_fts(rowid, title, short_desc) VALUES (NEW.id, NEW.title, NEW.short_desc);
+END;
+
+INSERT INTO sculptures_fts(sculptures_fts) VALUES('rebuild');
+INSERT INTO collections_fts(collections_fts) VALUES('rebuild');
+"""
+
+
+async def _v6_catalog_fts(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Полнотекстовый поиск по каталогу (FTS5, external content + триггеры)."""
+    await exec_script(conn, _V6_FTS_SQL)
+
+
+# рассылки: задание + журнал доставки по получателю (см. app/broadcast.py).
+# broadcast_deliveries.status — индекс в DELIVERY_STATUSES (0 = ещё не отправляли).
+_V7_BROADCAST_JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+  id INTEGER PRIMARY KEY,
+  audience TEXT NOT NULL,
+  src_chat_id INTEGER NOT NULL,
+  src_msg_id INTEGER NOT NULL,
+  link_text TEXT NULL,
+  link_url TEXT NULL,
+  admin_id INTEGER NULL,
+  status TEXT NOT NULL DEFAULT 'queued',
+  total INTEGER NOT NULL DEFAULT 0,
+  sent INTEGER NOT NULL DEFAULT 0,
+  failed INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL,
+  started_at TEXT NULL,
+  finished_at TEXT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status, id);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+  job_id INTEGER NOT NULL,
+  telegram_id INTEGER NOT NULL,
+  status INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (job_id, telegram_id)
+) WITHOUT ROWID;
+"""
+
+
+async def _v7_broadcast_jobs(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Персистентные задания рассылки + журнал доставки (возобновление после рестарта)."""
+    await exec_script(conn, _V7_BROADCAST_JOBS_SQL)
+
+
+# доступность пользователя: рассылка/Nav получили blocked / deactivated / not_found.
+# Недоступные выпадают из аудитории (частичный индекс) и из counters.users_notify;
+# ensure_user_row (пользователь снова написал боту) сбрасывает отметку.
+_USERS_NOTIFY = "({r}.consent = 1 AND {r}.notify_enabled = 1 AND {r}.unreachable_at IS NULL)"
+_NEW_NOTIFY = _USERS_NOTIFY.format(r="NEW")
+_OLD_NOTIFY = _USERS_NOTIFY.format(r="OLD")
+
+_V8_REACHABILITY_SQL = f"""
+ALTER TABLE users ADD COLUMN unreachable_at TEXT NULL;
+ALTER TABLE users ADD COLUMN unreachable_reason TEXT NULL;
+
+DROP INDEX IF EXISTS idx_users_notify;
+CREATE INDEX idx_users_audience ON users(consent, notify_enabled, role) WHERE unreachable_at IS NULL;
+
+DROP TRIGGER IF EXISTS trg_users_counters_ins;
+DROP TRIGGER IF EXISTS trg_users_counters_del;
+DROP TRIGGER IF EXISTS trg_users_counters_upd;
+
+CREATE TRIGGER trg_users_counters_ins AFTER INSERT ON users BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('users', 1), ('users_notify', {_NEW_NOTIFY}), ('users_unreachable', NEW.unreachable_at IS NOT NULL)
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER trg_users_counters_del AFTER DELETE ON users BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'users';
+  UPDATE counters SET value = value - {_OLD_NOTIFY} WHERE key = 'users_notify';
+  UPDATE counters SET value = value - (OLD.unreachable_at IS NOT NULL) WHERE key = 'users_unreachable';
+END;
+
+CREATE TRIGGER trg_users_counters_upd AFTER UPDATE OF consent, notify_enabled, unreachable_at ON users
+WHEN {_OLD_NOTIFY} <> {_NEW_NOTIFY} OR (OLD.unreachable_at IS NULL) <> (NEW.unreachable_at IS NULL)
+BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('users_notify', {_NEW_NOTIFY} - {_OLD_NOTIFY}),
+         ('users_unreachable', (NEW.unreachable_at IS NOT NULL) - (OLD.unreachable_at IS NOT NULL))
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER trg_users_rollup_unreachable AFTER UPDATE OF unreachable_at ON users
+WHEN NEW.unreachable_at IS NOT NULL AND OLD.unreachable_at IS NULL
+BEGIN{_bump("unreachable", "NEW.unreachable_reason")}
+END;
+
+INSERT INTO counters(key, value) VALUES ('users_unreachable', 0) ON CONFLICT(key) DO NOTHING;
+"""
+
+
+async def _v8_reachability(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """users.unreachable_at/_reason + аудитория рассылки только из доступных."""
+    await exec_script(conn, _V8_REACHABILITY_SQL)
+
+
+# ключ идемпотентности задания рассылки: повторная отправка того же поста в окне — не новое задание
+_V9_BROADCAST_IDEM_SQL = """
+ALTER TABLE broadcast_jobs ADD COLUMN idem_key TEXT NULL;
+CREATE INDEX idx_broadcast_jobs_idem ON broadcast_jobs(idem_key, created_at);
+"""
+
+
+async def _v9_broadcast_idem(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """broadcast_jobs.idem_key (дедупликация двойных нажатий)."""
+    await exec_script(conn, _V9_BROADCAST_IDEM_SQL)
+
+
+# исходящие уведомления админам: пишутся в одной транзакции с заявкой/профилем,
+# отправляет фоновый AdminNotifier (app.notify) с повторами — at-least-once
+_V10_ADMIN_OUTBOX_SQL = """
+CREATE TABLE IF NOT EXISTS admin_outbox (
+  id INTEGER PRIMARY KEY,
+  kind TEXT NOT NULL,                       -- visit / phone / designer
+  payload TEXT NOT NULL,                    -- JSON app.notify.Notice
+  status TEXT NOT NULL DEFAULT 'pending',   -- pending / sent / dead
+  attempts INTEGER NOT NULL DEFAULT 0,
+  done_targets TEXT NOT NULL DEFAULT '',    -- chat_id через запятую: кому уже доставлено
+  next_at TEXT NOT NULL,
+  last_error TEXT NULL,
+  created_at TEXT NOT NULL,
+  finished_at TEXT NULL
+);
+CREATE INDEX idx_admin_outbox_due ON admin_outbox(next_at) WHERE status = 'pending';
+CREATE INDEX idx_admin_outbox_finished ON admin_outbox(finished_at) WHERE status <> 'pending';
+"""
+
+
+async def _v10_admin_outbox(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Очередь уведомлений админам (outbox)."""
+    await exec_script(conn, _V10_ADMIN_OUTBOX_SQL)
+
+
+# счётчики каталога (collections*, sculptures_*, collection_sculptures:<id>) читали только
+# страницы каталога, а они теперь идут из снимка в памяти (app.catalog): триггеры — лишняя работа на
+# каждой записи в sculptures / collections. Остаются users*, visit_new (/admin).
+_V11_DROP_CATALOG_COUNTERS_SQL = """
+DROP TRIGGER IF EXISTS trg_collections_counters_ins;
+DROP TRIGGER IF EXISTS trg_collections_counters_del;
+DROP TRIGGER IF EXISTS trg_collections_counters_upd;
+DROP TRIGGER IF EXISTS trg_sculptures_counters_ins;
+DROP TRIGGER IF EXISTS trg_sculptures_counters_del;
+DROP TRIGGER IF EXISTS trg_sculptures_counters_upd;
+DELETE FROM counters
+WHERE key IN ('collections', 'collections_active', 'sculptures_new', 'sculptures_featured')
+   OR key GLOB 'collection_sculptures:*';
+"""
+
+
+async def _v11_drop_catalog_counters(conn: aiosqlite.Connection, progress: Progress) -> None:
+    """Убирает неиспользуемые счётчики каталога и их триггеры."""
+    await exec_script(conn, _V11_DROP_CATALOG_COUNTERS_SQL)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline schema + counters", _v1_baseline),
+    Migration(2, "sculpture card: photo_count + cover_file_id", _v2_sculpture_card),
+    Migration(3, "stats rollups (daily/hourly)", _v3_stats_rollups),
+    Migration(4, "catalog import ledger", _v4_import_ledger),
+    Migration(5, "legacy users import state", _v5_legacy_import_state),
+    Migration(6, "catalog full-text search (fts5)", _v6_catalog_fts),
+    Migration(7, "broadcast jobs + delivery ledger", _v7_broadcast_jobs),
+    Migration(8, "users reachability + audience index", _v8_reachability),
+    Migration(9, "broadcast job idempotency key", _v9_broadcast_idem),
+    Migration(10, "admin notifications outbox", _v10_admin_outbox),
+    Migration(11, "drop catalog counters", _v11_drop_catalog_counters),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def require_latest(conn: aiosqlite.Connection) -> int:
+    """
+    Только проверка (пробные прогоны импорта на соединении mode=ro): схема не последняя —
+    RuntimeError, миграции здесь не запускаются.
+    """
+    cur = await conn.execute("PRAGMA user_version")
+    (current,) = await cur.fetchone()
+    if current < LATEST_VERSION:
+        raise RuntimeError(
+            f"схема БД v{current}, нужна v{LATEST_VERSION}: пробный прогон БД не меняет — "
+            "сначала запустите бота или импорт без --dry-run (они применят миграции)"
+        )
+    return current
+
+
+async def migrate(conn: aiosqlite.Connection, progress: Progress = _log_progress) -> int:
+    """Применяет недостающие шаги. Возвращает итоговую версию схемы."""
+    cur = await conn.execute("PRAGMA user_version")
+    (current,) = await cur.fetchone()
+    if current >= LATEST_VERSION:
+        return current
+
+    for m in MIGRATIONS:
+        if m.version <= current:
+            continue
+        logger.info("migration v%s: %s", m.version, m.name)
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            await m.apply(conn, progress)
+            await conn.execute(f"PRAGMA user_version={m.version}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.exception("migration v%s failed, schema stays at v%s", m.version, current)
+            raise
+        current = m.version
+
+    return current
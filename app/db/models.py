@@ -0,0 +1,123 @@
+"""
+Компактные модели строк БД: dataclass(slots=True) — без __dict__ на каждый объект.
+
+Строки приходят из sqlite3 обычными кортежами (row_factory не задан),
+поэтому SELECT строится из полей модели (columns()) и строка раскладывается
+позиционно: Model(*row). Порядок полей = порядок колонок в SELECT.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+
+
+SCULPTURE_STATUSES = ("in_expo", "available", "sold", "on_request")
+# broadcast_deliveries.status хранит индекс в этом кортеже (0 — ещё не отправляли)
+DELIVERY_STATUSES = ("pending", "sent", "blocked", "deactivated", "not_found", "bad_request", "transient", "error")
+
+
+def columns(model: type, alias: str | None = None) -> str:
+    """Список колонок для SELECT в порядке полей модели (опционально с алиасом таблицы)."""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(f"{prefix}{f.name}" for f in fields(model))
+
+
+@dataclass(slots=True)
+class User:
+    telegram_id: int
+    consent: int
+    consent_at: str | None
+    notify_enabled: int
+    notify_consent_at: str | None
+    name: str | None
+    email: str | None
+    role: str | None
+    phone: str | None
+    city: str | None
+    designer_interest: int | None  # ✅ интерес к сотрудничеству (дизайнер)
+    designer_interest_at: str | None  # ✅ когда нажал "Сотрудничать"
+    created_at: str | None
+    updated_at: str | None
+    unreachable_at: str | None  # ✅ рассылка/Nav получили blocked / deactivated / not_found
+    unreachable_reason: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class Collection:
+    id: int
+    title: str
+    short_desc: str | None
+    cover_photo_file_id: str | None
+    is_active: int | None
+    sort_order: int | None
+
+
+@dataclass(frozen=True, slots=True)
+class Sculpture:
+    """Поля карточки. description_full и служебные *_at сюда не входят."""
+    id: int
+    collection_id: int
+    title: str
+    artist: str | None
+    year: str | None
+    material: str | None
+    dimensions: str | None
+    description_short: str | None
+    status: str | None
+    is_featured: int | None
+    published_at: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class SculptureItem:
+    """Строка списка (кнопка): только id и название."""
+    id: int
+    title: str
+
+
+@dataclass(frozen=True, slots=True)
+class SculptureCard(Sculpture):
+    """Sculpture + то, что нужно экрану карточки (см. Repo.get_sculpture_card)."""
+    photo_count: int
+    file_id: str | None  # фото №photo_idx
+    viewer_registered: int
+
+
+@dataclass(frozen=True, slots=True)
+class Photo:
+    id: int
+    sculpture_id: int
+    file_id: str
+    sort_order: int | None
+
+
+@dataclass(slots=True)
+class BroadcastJob:
+    id: int
+    audience: str
+    src_chat_id: int
+    src_msg_id: int
+    link_text: str | None
+    link_url: str | None
+    admin_id: int | None
+    status: str  # queued / running / paused / halted / cancelled / done
+    total: int
+    sent: int
+    failed: int
+    created_at: str
+    started_at: str | None
+    finished_at: str | None
+    idem_key: str | None
+
+
+@dataclass(slots=True)
+class OutboxItem:
+    id: int
+    kind: str
+    payload: str
+    status: str  # pending / sent / dead
+    attempts: int
+    done_targets: str
+    next_at: str
+    last_error: str | None
+    created_at: str
+    finished_at: str | None
@@ -0,0 +1,280 @@
+"""
+Регрессия планов запросов: EXPLAIN QUERY PLAN для каждого SQL, который выполняет Repo
+(и воркер рассылки app.broadcast.BroadcastWorker) на заполненной БД.
+
+Падает (exit code 1), если где-то:
+- полный проход по таблице (SCAN <table> без индекса);
+- сортировка во временном B-tree (USE TEMP B-TREE);
+- публичный метод Repo не вызван сценарием (новый метод → добавь его в _scenario);
+- воркер рассылки отправил одно задание одному получателю больше одного раза (волны).
+
+Запуск:  python -m app.db.plan_check
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from app.db.repo import Repo
+
+# служебные методы — не про запросы пользователей
+SKIP_METHODS = {"connect", "close", "init_schema", "rebuild_counters", "wal_checkpoint", "optimize"}
+
+# массовые выгрузки / редкое обслуживание: полный проход — ожидаемое поведение
+# (без сортировки во временном B-tree)
+FULL_SCAN_OK = {"load_catalog", "prune_stats_hourly"}
+
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+TEMP_BTREE_RE = re.compile(r"USE TEMP B-TREE")
+
+
+class _RecordingConn:
+    """Прокси над aiosqlite.Connection: запоминает (sql, params) и выполняет как обычно."""
+
+    def __init__(self, conn, log: list[tuple[str, tuple | dict, str | None]], current: list[str]):
+        self._conn = conn
+        self._log = log
+        self._current = current  # стек вызванных методов Repo
+
+    def _method(self) -> str | None:
+        return self._current[-1] if self._current else None
+
+    async def execute(self, sql, params=()):
+        self._log.append((sql, params if isinstance(params, dict) else tuple(params), self._method()))
+        return await self._conn.execute(sql, params)
+
+    async def executemany(self, sql, seq):
+        seq = list(seq)
+        if seq:
+            self._log.append((sql, tuple(seq[0]), self._method()))
+        return await self._conn.executemany(sql, seq)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _FakeBot:
+    """copy_message считает отправки: (получатель, message_id поста) — у заданий разные посты."""
+
+    def __init__(self) -> None:
+        self.sent: Counter[tuple[int, int]] = Counter()
+
+    async def copy_message(self, **kwargs):
+        self.sent[kwargs["chat_id"], kwargs["message_id"]] += 1
+        return None
+
+
+async def _populate(repo: Repo, rnd: random.Random) -> None:
+    """Реалистичное распределение: мало избранного/новинок, много пользователей."""
+    c = repo._c()
+    now = "2026-01-01T00:00:00+00:00"
+    roles = ["collector", "dealer", "author", "interest", None]
+    await c.executemany(
+        """
+        INSERT INTO users(telegram_id, consent, notify_enabled, name, email, role, city,
+                          designer_interest, created_at, updated_at)
+        VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                100_000 + i, int(rnd.random() < 0.8), int(rnd.random() < 0.6), f"u{i}", f"u{i}@x.io",
+                rnd.choice(roles), rnd.choice(["spb", "moscow", None]), int(rnd.random() < 0.05), now, now,
+            )
+            for i in range(5000)
+        ],
+    )
+    await c.executemany(
+        """
+        INSERT INTO visit_requests(telegram_id, city, contact_method, contact_value, status, created_at)
+        VALUES(?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (100_000 + rnd.randrange(5000), "spb", "tg", "x", "new" if rnd.random() < 0.1 else "done", now)
+            for _ in range(2000)
+        ],
+    )
+    await c.executemany(
+        "INSERT INTO collections(title, is_active, sort_order, created_at, updated_at) VALUES(?, ?, ?, ?, ?)",
+        [(f"col{i}", int(rnd.random() < 0.9), rnd.randrange(10), now, now) for i in range(60)],
+    )
+    await c.executemany(
+        """
+        INSERT INTO sculptures(collection_id, title, status, is_featured, published_at, created_at, updated_at)
+        VALUES(?, ?, 'in_expo', ?, ?, ?, ?)
+        """,
+        [
+            (
+                1 + rnd.randrange(60), f"s{i}", int(rnd.random() < 0.05),
+                f"2025-{1 + rnd.randrange(12):02d}-01" if rnd.random() < 0.2 else None, now, now,
+            )
+            for i in range(3000)
+        ],
+    )
+    await c.executemany(
+        "INSERT INTO sculpture_photos(sculpture_id, file_id, sort_order) VALUES(?, ?, ?)",
+        [(1 + i // 4, f"file{i}", i % 4) for i in range(12_000)],
+    )
+    await c.commit()
+    await repo.rebuild_counters()
+    await c.execute("ANALYZE")
+    await c.commit()
+
+
+async def _scenario(repo: Repo) -> list[str]:
+    """Вызывает каждый публичный метод Repo (и воркер рассылки) хотя бы раз. Возвращает проблемы рассылки."""
+    from app.broadcast import BroadcastEngine, BroadcastWorker
+    from app.segments import SegmentIndex
+
+    segments = SegmentIndex(repo)
+    repo.on_users_changed = segments.on_users_changed
+    await segments.rebuild()
+
+    tid = 100_001
+    await repo.ensure_user_row(tid)
+    await repo.get_user(tid)
+    await repo.set_consent(tid, consent=True, enable_notify=True)
+    await repo.update_profile(tid, name="N", email="n@x.io", role="collector")
+    await repo.toggle_notify(tid)
+    await repo.set_designer_interest(tid, True, outbox=("designer", "{}"))
+    await repo.create_visit_request(tid, "spb", "tg", "@n", outbox=("visit", "{}"))
+    await repo.update_profile(tid, outbox=("phone", "{}"), phone="+7")
+    await repo.next_outbox_at()
+    items = await repo.due_outbox("9999", 20)
+    await repo.due_outbox("9999", 20, "visit", ("2000", 1))
+    await repo.postpone_outbox([i.id for i in items], "2000")
+    for item in items:
+        await repo.update_outbox(item.id, "sent", 1, "", item.next_at, None)
+    await repo.prune_outbox("9999")
+    await repo.stats()
+    await repo.stats_rollup_daily(("signup", "visit"), "2025-01-01")
+    await repo.stats_rollup_hourly(("signup", "visit"), "2025-01-01T00")
+    await repo.prune_stats_hourly("2025-01-01T00")
+
+    cid = await repo.add_collection("C", None, None, 5)
+    await repo.list_collections(active_only=True, limit=8, offset=8)
+    await repo.list_collections(active_only=False, limit=50, offset=0)
+    await repo.get_collection(cid)
+
+    sid = await repo.add_sculpture(cid, title="S", is_featured=1, published_at="2026-02-01")
+    await repo.add_sculpture_photo(sid, "f", 0)
+    await repo.get_sculpture(sid)
+    await repo.list_sculpture_photos(7)
+    await repo.get_sculpture_card(7, 0, tid)
+    await repo.get_sculpture_card(7, 3, tid)
+    await repo.load_catalog()
+    await repo.search_sculptures("s1", limit=8, offset=8)
+    await repo.search_collections("col")
+
+    bot = _FakeBot()
+    worker = BroadcastWorker(bot, repo, BroadcastEngine(rate=1e6))
+    for msg_id, audience in enumerate(("all", "collector", "collector"), 1):
+        await repo.create_broadcast_job(audience, 1, msg_id, None, None, None, f"k:{audience}", 3600)
+    # индекс сегментов: изменённые строки перечитываются get_segment_rows, получатели — без SQL по users
+    expr = "collector | dealer & city:spb & !designer"
+    await repo.create_broadcast_job(expr, 1, 4, None, None, None, None, 0, await segments.resolve(expr))
+    # задания короткие (меньше FLUSH_ROWS на волну, быстрее FLUSH_EVERY): волны не должны
+    # повторять получателей предыдущих
+    while job := await repo.next_broadcast_job():
+        await worker.run_job(job)
+    await repo.get_broadcast_job(1)
+    problems = [
+        f"рассылка: пост {msg_id} отправлен {uid} {n} раз(а)" for (uid, msg_id), n in bot.sent.items() if n > 1
+    ]
+
+    await repo.mark_unreachable(tid, "blocked")
+    await repo.ensure_user_row(tid)
+    await repo.delete_user(100_002)
+    return problems
+
+
+def _public_methods() -> set[str]:
+    return {
+        name
+        for name, fn in inspect.getmembers(Repo, inspect.iscoroutinefunction)
+        if not name.startswith("_") and name not in SKIP_METHODS
+    }
+
+
+def _check_plans(db_path: str, log: list[tuple[str, tuple | dict, str | None]]) -> list[str]:
+    problems: list[str] = []
+    seen: set[str] = set()
+    conn = sqlite3.connect(db_path)
+    try:
+        for sql, params, method in log:
+            key = " ".join(sql.split())
+            if key in seen:
+                continue
+            seen.add(key)
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            for row in rows:
+                detail = row[-1]
+                full_scan = FULL_SCAN_RE.match(detail) and method not in FULL_SCAN_OK
+                if full_scan or TEMP_BTREE_RE.search(detail):
+                    problems.append(f"{detail}\n    in: {key}")
+    finally:
+        conn.close()
+    return problems
+
+
+async def run() -> list[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "plan_check.sqlite")
+        repo = Repo(db_path)
+        await repo.connect()
+        try:
+            await repo.init_schema()
+            await _populate(repo, random.Random(42))
+
+            log: list[tuple[str, tuple | dict, str | None]] = []
+            called: set[str] = set()
+            current: list[str] = []
+            for name in _public_methods():
+                orig = getattr(repo, name)
+
+                def _wrap(fn=orig, n=name):
+                    async def inner(*a, **kw):
+                        called.add(n)
+                        current.append(n)
+                        try:
+                            return await fn(*a, **kw)
+                        finally:
+                            current.pop()
+                    return inner
+
+                setattr(repo, name, _wrap())
+
+            real_conn = repo.conn
+            repo.conn = _RecordingConn(real_conn, log, current)
+            try:
+                sends = await _scenario(repo)
+            finally:
+                repo.conn = real_conn
+
+            problems = _check_plans(db_path, log) + sends[:10]
+            for name in sorted(_public_methods() - called):
+                problems.append(f"Repo.{name} не покрыт сценарием plan_check")
+            return problems
+        finally:
+            await repo.close()
+
+
+def main() -> int:
+    problems = asyncio.run(run())
+    if problems:
+        print("Query plan regressions:")
+        for p in problems:
+            print(f"  - {p}")
+        return 1
+    print("OK: no full scans / temp b-trees")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
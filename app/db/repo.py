@@ -1,45 +1,119 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from datetime import datetime, timezone
-from pathlib import Path
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Iterable, Sequence
+
 import aiosqlite
 
+from app.config import DbProfile
+from app.db.migrations import REBUILD_COUNTERS_SQL, migrate
+from app.db.models import (
+    DELIVERY_STATUSES,
+    BroadcastJob,
+    Collection,
+    OutboxItem,
+    Photo,
+    Sculpture,
+    SculptureCard,
+    SculptureItem,
+    User,
+    columns,
+)
+from app.db.tuning import apply_profile
+
+
+FTS_MAX_TOKENS = 6
+AUDIENCE_CHUNK = 500  # telegram_id за один запрос (сегменты, журнал рассылки)
+
+_FTS_TOKEN_RE = re.compile(r"\w+")
+
+
+# SELECT-списки в порядке полей моделей (строка -> Model(*row))
+USER_COLS = columns(User)
+COLLECTION_COLS = columns(Collection)
+SCULPTURE_COLS = columns(Sculpture)
+PHOTO_COLS = columns(Photo)
+_CARD_COLS = columns(Sculpture, "s")
+_SEARCH_COLLECTION_COLS = columns(Collection, "c")
+BROADCAST_JOB_COLS = columns(BroadcastJob)
+OUTBOX_COLS = columns(OutboxItem)
+
+_DELIVERY_SENT = DELIVERY_STATUSES.index("sent")
+UNREACHABLE_REASONS = ("blocked", "deactivated", "not_found")
+_DELIVERY_UNREACHABLE = {DELIVERY_STATUSES.index(r): r for r in UNREACHABLE_REASONS}
+
+# подписчик рассылки; unreachable_at IS NULL — условие частичного индекса idx_users_audience (v8)
+AUDIENCE_WHERE = "consent=1 AND notify_enabled=1 AND unreachable_at IS NULL"
+# строка users для SegmentIndex: (telegram_id, подписчик, role, city, designer_interest)
+SEGMENT_COLS = f"telegram_id, ({AUDIENCE_WHERE}), role, city, designer_interest"
+
 
 def utcnow_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
-@dataclass
-class User:
-    telegram_id: int
-    consent: int
-    consent_at: str | None
-    notify_enabled: int
-    notify_consent_at: str | None
-    name: str | None
-    email: str | None
-    role: str | None
-    phone: str | None
-    city: str | None
-    designer_interest: int | None  # ✅ новое поле (может быть None если старая БД)
-    designer_interest_at: str | None  # ✅ когда нажал "Сотрудничать"
-    created_at: str | None
-    updated_at: str | None
+def fts_query(text: str) -> str | None:
+    """Ввод пользователя -> FTS5 MATCH: каждое слово — префикс, все слова обязательны."""
+    tokens = _FTS_TOKEN_RE.findall(text.lower())[:FTS_MAX_TOKENS]
+    if sum(len(t) for t in tokens) < 2:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+_MARK_UNREACHABLE_SQL = (
+    "UPDATE users SET unreachable_at=?, unreachable_reason=? WHERE telegram_id=? AND unreachable_at IS NULL"
+)
 
 
 class Repo:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, profile: DbProfile | None = None, read_only: bool = False):
         self.db_path = db_path
+        self.profile = profile or DbProfile()
+        # read_only: отдельное соединение только для чтения (inline-поиск) —
+        # не делит очередь запросов aiosqlite с соединением, которое обслуживает чаты
+        self.read_only = read_only
         self.conn: aiosqlite.Connection | None = None
+        # проверка idem_key + создание задания рассылки — без чужих запросов между ними
+        self._broadcast_lock = asyncio.Lock()
+        # ✅ хук после записи в users (SegmentIndex.on_users_changed): telegram_id изменённых строк
+        self.on_users_changed: Callable[[Iterable[int]], None] | None = None
+        # ✅ хук после записи в admin_outbox (AdminNotifier.wake)
+        self.on_outbox: Callable[[], None] | None = None
+
+    def _users_changed(self, *telegram_ids: int) -> None:
+        if self.on_users_changed and telegram_ids:
+            self.on_users_changed(telegram_ids)
+
+    async def _add_outbox(self, outbox: tuple[str, str] | None) -> None:
+        """Уведомление админам (kind, payload JSON) — в текущую транзакцию, до commit вызывающего."""
+        if outbox is None:
+            return
+        now = utcnow_iso()
+        await self._c().execute(
+            "INSERT INTO admin_outbox(kind, payload, next_at, created_at) VALUES(?, ?, ?, ?)",
+            (*outbox, now, now),
+        )
+
+    def _outbox_added(self, outbox: tuple[str, str] | None) -> None:
+        if outbox is not None and self.on_outbox:
+            self.on_outbox()
 
     async def connect(self) -> None:
-        self.conn = await aiosqlite.connect(self.db_path)
-        self.conn.row_factory = aiosqlite.Row
-        await self.conn.execute("PRAGMA foreign_keys=ON;")
+        # row_factory не задаём: строки — обычные кортежи, модели собираются позиционно
+        if self.read_only:
+            self.conn = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        else:
+            self.conn = await aiosqlite.connect(self.db_path)
+        await apply_profile(self.conn, self.profile, self.read_only)
 
     async def close(self) -> None:
         if self.conn:
+            try:
+                await self.conn.execute("PRAGMA optimize;")
+            except aiosqlite.Error:
+                pass
             await self.conn.close()
             self.conn = None
 
@@ -48,31 +122,36 @@ class Repo:
             raise RuntimeError("DB not connected")
         return self.conn
 
-    async def init_schema(self, schema_path: str) -> None:
+    async def init_schema(self) -> None:
         """
-        1) Создаёт таблицы из schema.sql (CREATE TABLE IF NOT EXISTS)
-        2) Делает миграции для существующей БД (ALTER TABLE если колонок нет)
+        Приводит схему к последней версии (PRAGMA user_version, см. migrations.py).
+        На актуальной БД — одно чтение pragma.
         """
-        sql = Path(schema_path).read_text(encoding="utf-8")
-        await self._c().executescript(sql)
-        await self._c().commit()
-        await self._apply_migrations()
-
-    async def _apply_migrations(self) -> None:
-        # --- users: designer_interest + designer_interest_at ---
-        cols = await self._table_columns("users")
-
-        if "designer_interest" not in cols:
-            await self._c().execute("ALTER TABLE users ADD COLUMN designer_interest INTEGER DEFAULT 0")
-        if "designer_interest_at" not in cols:
-            await self._c().execute("ALTER TABLE users ADD COLUMN designer_interest_at TEXT NULL")
+        await migrate(self._c())
 
+    async def rebuild_counters(self) -> None:
+        """
+        Пересчитывает counters с нуля (полные COUNT(*)).
+        Дальше значения поддерживают триггеры.
+        """
+        await self._c().executescript(f"BEGIN;\n{REBUILD_COUNTERS_SQL}\nCOMMIT;")
+
+    # --------- обслуживание (app/db/tuning.py: Maintenance) ---------
+    async def wal_checkpoint(self, mode: str = "PASSIVE") -> tuple[int, int, int]:
+        """(busy, страниц в WAL, перенесено в БД)."""
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(mode)
+        cur = await self._c().execute(f"PRAGMA wal_checkpoint({mode});")
+        return tuple(await cur.fetchone())
+
+    async def optimize(self) -> None:
+        await self._c().execute("PRAGMA optimize;")
+
+    async def prune_stats_hourly(self, before_hour: str) -> int:
+        """Удаляет часовые агрегаты старше before_hour (YYYY-MM-DDTHH). Дневные не трогаем."""
+        cur = await self._c().execute("DELETE FROM stats_hourly WHERE hour < ?", (before_hour,))
         await self._c().commit()
-
-    async def _table_columns(self, table: str) -> set[str]:
-        cur = await self._c().execute(f"PRAGMA table_info({table})")
-        rows = await cur.fetchall()
-        return {r["name"] for r in rows}
+        return cur.rowcount
 
     async def ensure_user_row(self, telegram_id: int) -> None:
         now = utcnow_iso()
@@ -80,25 +159,19 @@ class Repo:
             """
             INSERT INTO users(telegram_id, created_at, updated_at)
             VALUES(?, ?, ?)
-            ON CONFLICT(telegram_id) DO UPDATE SET updated_at=excluded.updated_at
+            ON CONFLICT(telegram_id) DO UPDATE SET
+              updated_at=excluded.updated_at,
+              unreachable_at=NULL, unreachable_reason=NULL  -- снова пишет боту -> доступен
             """,
             (telegram_id, now, now),
         )
         await self._c().commit()
+        self._users_changed(telegram_id)
 
     async def get_user(self, telegram_id: int) -> User | None:
-        cur = await self._c().execute("SELECT * FROM users WHERE telegram_id=?", (telegram_id,))
+        cur = await self._c().execute(f"SELECT {USER_COLS} FROM users WHERE telegram_id=?", (telegram_id,))
         row = await cur.fetchone()
-        if not row:
-            return None
-
-        d = dict(row)
-
-        # На старых БД этих полей может не быть (до миграции)
-        d.setdefault("designer_interest", 0)
-        d.setdefault("designer_interest_at", None)
-
-        return User(**d)
+        return User(*row) if row else None
 
     async def set_consent(self, telegram_id: int, consent: bool, enable_notify: bool) -> None:
         now = utcnow_iso()
@@ -126,8 +199,10 @@ class Repo:
                 (now, telegram_id),
             )
         await self._c().commit()
+        self._users_changed(telegram_id)
 
-    async def update_profile(self, telegram_id: int, **fields) -> None:
+    async def update_profile(self, telegram_id: int, outbox: tuple[str, str] | None = None, **fields) -> None:
+        """outbox — уведомление админам (app.notify.Notice.row()), пишется в той же транзакции."""
         await self.ensure_user_row(telegram_id)
         fields["updated_at"] = utcnow_iso()
         keys = list(fields.keys())
@@ -137,7 +212,10 @@ class Repo:
             f"UPDATE users SET {set_sql} WHERE telegram_id=?",
             (*vals, telegram_id),
         )
+        await self._add_outbox(outbox)
         await self._c().commit()
+        self._users_changed(telegram_id)
+        self._outbox_added(outbox)
 
     async def toggle_notify(self, telegram_id: int) -> int:
         u = await self.get_user(telegram_id)
@@ -157,14 +235,16 @@ class Repo:
             (new_val, now, now, telegram_id),
         )
         await self._c().commit()
+        self._users_changed(telegram_id)
         return new_val
 
     async def delete_user(self, telegram_id: int) -> None:
         await self._c().execute("DELETE FROM users WHERE telegram_id=?", (telegram_id,))
         await self._c().commit()
+        self._users_changed(telegram_id)
 
     # ✅ ДИЗАЙНЕР: отметка интереса к сотрудничеству
-    async def set_designer_interest(self, telegram_id: int, interested: bool) -> None:
+    async def set_designer_interest(self, telegram_id: int, interested: bool, outbox: tuple[str, str] | None = None) -> None:
         await self.ensure_user_row(telegram_id)
         now = utcnow_iso()
         await self._c().execute(
@@ -177,7 +257,10 @@ class Repo:
             """,
             (1 if interested else 0, now if interested else None, now, telegram_id),
         )
+        await self._add_outbox(outbox)
         await self._c().commit()
+        self._users_changed(telegram_id)
+        self._outbox_added(outbox)
 
     # --------- Visit requests ---------
     async def create_visit_request(
@@ -188,10 +271,12 @@ class Repo:
         contact_value: str | None,
         name_snapshot: str | None = None,   # ✅ теперь НЕ обязательно
         role_snapshot: str | None = None,   # ✅ теперь НЕ обязательно
+        outbox: tuple[str, str] | None = None,
     ) -> None:
         """
         Чтобы меню не падало, snapshots теперь optional.
         Если не передали — попробуем взять из users.
+        outbox — уведомление админам, пишется в той же транзакции, что и заявка.
         """
         if name_snapshot is None or role_snapshot is None:
             u = await self.get_user(telegram_id)
@@ -212,19 +297,281 @@ class Repo:
             """,
             (telegram_id, name_snapshot, role_snapshot, city, contact_method, contact_value, now),
         )
+        await self._add_outbox(outbox)
         await self._c().commit()
+        self._outbox_added(outbox)
 
     async def stats(self) -> dict:
-        cur1 = await self._c().execute("SELECT COUNT(*) as c FROM users")
-        users_count = (await cur1.fetchone())["c"]
+        cur = await self._c().execute(
+            "SELECT key, value FROM counters WHERE key IN ('users', 'users_notify', 'users_unreachable', 'visit_new')"
+        )
+        c = dict(await cur.fetchall())
+        return {
+            "users": c.get("users", 0),
+            "notify": c.get("users_notify", 0),
+            "unreachable": c.get("users_unreachable", 0),
+            "visit_new": c.get("visit_new", 0),
+        }
 
-        cur2 = await self._c().execute("SELECT COUNT(*) as c FROM users WHERE consent=1 AND notify_enabled=1")
-        notify_count = (await cur2.fetchone())["c"]
+    # --------- Аудитория рассылки ---------
+    async def _iter_keyset(self, sql: str, params: tuple, chunk: int) -> AsyncIterator[int]:
+        """Постранично по возрастанию ключа: sql заканчивается на `key > ? ORDER BY key LIMIT ?`."""
+        last = -1 << 63
+        while True:
+            cur = await self._c().execute(sql, (*params, last, chunk))
+            rows = await cur.fetchall()
+            for (key,) in rows:
+                yield key
+            if len(rows) < chunk:
+                return
+            last = rows[-1][0]
+
+    async def iter_segment_rows(self, chunk: int = AUDIENCE_CHUNK) -> AsyncIterator[tuple]:
+        """Все строки users в виде SEGMENT_COLS по возрастанию telegram_id (keyset-страницы)."""
+        last = -1 << 63
+        while True:
+            cur = await self._c().execute(
+                f"SELECT {SEGMENT_COLS} FROM users WHERE telegram_id > ? ORDER BY telegram_id LIMIT ?",
+                (last, chunk),
+            )
+            rows = await cur.fetchall()
+            for row in rows:
+                yield row
+            if len(rows) < chunk:
+                return
+            last = rows[-1][0]
+
+    async def get_segment_rows(self, telegram_ids: Sequence[int]) -> list[tuple]:
+        """SEGMENT_COLS для указанных id (удалённых в ответе нет)."""
+        out: list[tuple] = []
+        for i in range(0, len(telegram_ids), AUDIENCE_CHUNK):
+            part = telegram_ids[i:i + AUDIENCE_CHUNK]
+            marks = ", ".join("?" * len(part))
+            cur = await self._c().execute(f"SELECT {SEGMENT_COLS} FROM users WHERE telegram_id IN ({marks})", tuple(part))
+            out += await cur.fetchall()
+        return out
+
+    # --------- Задания рассылки (broadcast_jobs / broadcast_deliveries, миграция v7) ---------
+    async def create_broadcast_job(
+        self,
+        audience: str,
+        src_chat_id: int,
+        src_msg_id: int,
+        link_text: str | None,
+        link_url: str | None,
+        admin_id: int | None,
+        idem_key: str | None = None,
+        dedup_window_s: int = 0,
+        recipients: Iterable[int] | None = None,
+    ) -> tuple[BroadcastJob, bool]:
+        """
+        Задание + снимок аудитории в журнал доставки (одна транзакция).
+        recipients — готовый список получателей (SegmentIndex.resolve); без него аудитория
+        ("all" или роль) выбирается SQL по users.
+        Если за последние dedup_window_s сек уже есть задание с тем же idem_key —
+        возвращает его и False (новое не создаётся).
+        """
+        async with self._broadcast_lock:
+            if idem_key is not None and dedup_window_s > 0:
+                since = datetime.now(timezone.utc) - timedelta(seconds=dedup_window_s)
+                since = since.replace(microsecond=0).isoformat()
+                cur = await self._c().execute(
+                    f"""
+                    SELECT {BROADCAST_JOB_COLS} FROM broadcast_jobs
+                    WHERE idem_key=? AND created_at >= ?
+                    ORDER BY created_at DESC LIMIT 1
+                    """,
+                    (idem_key, since),
+                )
+                row = await cur.fetchone()
+                if row:
+                    return BroadcastJob(*row), False
+            job_id = await self._insert_broadcast_job(
+                audience, src_chat_id, src_msg_id, link_text, link_url, admin_id, idem_key, recipients
+            )
+        return await self.get_broadcast_job(job_id), True
 
-        cur3 = await self._c().execute("SELECT COUNT(*) as c FROM visit_requests WHERE status='new'")
-        vr_new = (await cur3.fetchone())["c"]
+    async def _insert_broadcast_job(
+        self,
+        audience: str,
+        src_chat_id: int,
+        src_msg_id: int,
+        link_text: str | None,
+        link_url: str | None,
+        admin_id: int | None,
+        idem_key: str | None,
+        recipients: Iterable[int] | None,
+    ) -> int:
+        now = utcnow_iso()
+        c = self._c()
+        cur = await c.execute(
+            """
+            INSERT INTO broadcast_jobs(audience, src_chat_id, src_msg_id, link_text, link_url, admin_id, idem_key, created_at)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (audience, src_chat_id, src_msg_id, link_text, link_url, admin_id, idem_key, now),
+        )
+        job_id = cur.lastrowid
+        if recipients is not None:
+            cur = await c.executemany(
+                "INSERT INTO broadcast_deliveries(job_id, telegram_id) VALUES(?, ?)",
+                ((job_id, tid) for tid in recipients),
+            )
+        else:
+            q = f"INSERT INTO broadcast_deliveries(job_id, telegram_id) SELECT ?, telegram_id FROM users WHERE {AUDIENCE_WHERE}"
+            params: tuple = (job_id,)
+            if audience != "all":
+                q += " AND role=?"
+                params += (audience,)
+            cur = await c.execute(q, params)
+        await c.execute("UPDATE broadcast_jobs SET total=? WHERE id=?", (cur.rowcount, job_id))
+        await c.commit()
+        return job_id
+
+    async def get_broadcast_job(self, job_id: int) -> BroadcastJob | None:
+        cur = await self._c().execute(f"SELECT {BROADCAST_JOB_COLS} FROM broadcast_jobs WHERE id=?", (job_id,))
+        row = await cur.fetchone()
+        return BroadcastJob(*row) if row else None
 
-        return {"users": users_count, "notify": notify_count, "visit_new": vr_new}
+    async def next_broadcast_job(self) -> BroadcastJob | None:
+        """Сначала прерванное рестартом (running), потом очередь — по порядку создания."""
+        for status in ("running", "queued"):
+            cur = await self._c().execute(
+                f"SELECT {BROADCAST_JOB_COLS} FROM broadcast_jobs WHERE status=? ORDER BY id LIMIT 1", (status,)
+            )
+            row = await cur.fetchone()
+            if row:
+                return BroadcastJob(*row)
+        return None
+
+    async def set_broadcast_job_status(self, job_id: int, status: str) -> None:
+        now = utcnow_iso()
+        await self._c().execute(
+            """
+            UPDATE broadcast_jobs
+            SET status=?,
+                started_at=CASE WHEN ?='running' THEN COALESCE(started_at, ?) ELSE started_at END,
+                finished_at=CASE WHEN ? IN ('done', 'cancelled') THEN ? ELSE finished_at END
+            WHERE id=?
+            """,
+            (status, status, now, status, now, job_id),
+        )
+        await self._c().commit()
+
+    async def iter_broadcast_pending(self, job_id: int, chunk: int = AUDIENCE_CHUNK) -> AsyncIterator[int]:
+        """Получатели задания, которым ещё не отправляли (status=0), по PK журнала."""
+        q = (
+            "SELECT telegram_id FROM broadcast_deliveries WHERE job_id=? AND status=0"
+            " AND telegram_id > ? ORDER BY telegram_id LIMIT ?"
+        )
+        async for telegram_id in self._iter_keyset(q, (job_id,), chunk):
+            yield telegram_id
+
+    async def record_deliveries(self, job_id: int, results: list[tuple[int, int]]) -> None:
+        """
+        Итоги пачки: [(telegram_id, индекс в DELIVERY_STATUSES)]. Пишем только поверх status=0,
+        счётчики задания растут на число реально изменённых строк (повтор пачки безопасен).
+        """
+        c = self._c()
+        sent_rows = [(code, job_id, tid) for tid, code in results if code == _DELIVERY_SENT]
+        fail_rows = [(code, job_id, tid) for tid, code in results if code != _DELIVERY_SENT]
+        q = "UPDATE broadcast_deliveries SET status=? WHERE job_id=? AND telegram_id=? AND status=0"
+        sent = failed = 0
+        if sent_rows:
+            sent = (await c.executemany(q, sent_rows)).rowcount
+        if fail_rows:
+            failed = (await c.executemany(q, fail_rows)).rowcount
+        await c.execute("UPDATE broadcast_jobs SET sent=sent+?, failed=failed+? WHERE id=?", (sent, failed, job_id))
+        # blocked / deactivated / not_found -> пользователь выпадает из следующих аудиторий
+        now = utcnow_iso()
+        unreachable = [(now, _DELIVERY_UNREACHABLE[code], tid) for tid, code in results if code in _DELIVERY_UNREACHABLE]
+        if unreachable:
+            await c.executemany(_MARK_UNREACHABLE_SQL, unreachable)
+        await c.commit()
+        self._users_changed(*(tid for _, _, tid in unreachable))
+
+    async def mark_unreachable(self, telegram_id: int, reason: str) -> None:
+        """Бот не может писать пользователю (reason из UNREACHABLE_REASONS)."""
+        await self._c().execute(_MARK_UNREACHABLE_SQL, (utcnow_iso(), reason, telegram_id))
+        await self._c().commit()
+        self._users_changed(telegram_id)
+
+    # --------- Уведомления админам (admin_outbox, миграция v10) ---------
+    async def due_outbox(
+        self, now: str, limit: int, kind: str | None = None, after: tuple[str, int] | None = None
+    ) -> list[OutboxItem]:
+        """
+        pending-уведомления, которым пора (next_at <= now), по (next_at, id).
+        kind — только этого вида; after — (next_at, id) последнего с прошлой страницы.
+        """
+        where, params = "status='pending' AND next_at <= ?", [now]
+        if kind is not None:
+            where += " AND kind=?"
+            params.append(kind)
+        if after is not None:
+            where += " AND (next_at, id) > (?, ?)"
+            params += after
+        cur = await self._c().execute(
+            f"SELECT {OUTBOX_COLS} FROM admin_outbox WHERE {where} ORDER BY next_at, id LIMIT ?",
+            (*params, limit),
+        )
+        return [OutboxItem(*row) for row in await cur.fetchall()]
+
+    async def next_outbox_at(self) -> str | None:
+        """Ближайший next_at среди pending (None — очередь пуста)."""
+        cur = await self._c().execute("SELECT min(next_at) FROM admin_outbox WHERE status='pending'")
+        (next_at,) = await cur.fetchone()
+        return next_at
+
+    async def update_outbox(
+        self, item_id: int, status: str, attempts: int, done_targets: str, next_at: str, last_error: str | None
+    ) -> None:
+        """Итог попытки: sent / dead (finished_at = сейчас) или pending с новым next_at."""
+        finished_at = None if status == "pending" else utcnow_iso()
+        await self._c().execute(
+            """
+            UPDATE admin_outbox
+            SET status=?, attempts=?, done_targets=?, next_at=?, last_error=?, finished_at=?
+            WHERE id=?
+            """,
+            (status, attempts, done_targets, next_at, last_error, finished_at, item_id),
+        )
+        await self._c().commit()
+
+    async def postpone_outbox(self, item_ids: list[int], next_at: str) -> None:
+        """Отложить pending-уведомления до next_at (сворачивание всплеска, не попытка)."""
+        marks = ", ".join("?" * len(item_ids))
+        await self._c().execute(
+            f"UPDATE admin_outbox SET next_at=? WHERE id IN ({marks}) AND status='pending'", (next_at, *item_ids)
+        )
+        await self._c().commit()
+
+    async def prune_outbox(self, before: str) -> int:
+        """Удаляет отправленные/мёртвые уведомления, завершённые раньше before."""
+        cur = await self._c().execute(
+            "DELETE FROM admin_outbox WHERE status <> 'pending' AND finished_at < ?", (before,)
+        )
+        await self._c().commit()
+        return cur.rowcount
+
+    # --------- Stats rollups (stats_daily / stats_hourly, ведут триггеры) ---------
+    async def stats_rollup_daily(self, metrics: tuple[str, ...], since_day: str) -> list[tuple[str, str, str, int]]:
+        """(metric, day, dim, value) начиная с since_day (YYYY-MM-DD). Диапазон по PK — O(дней)."""
+        marks = ", ".join("?" * len(metrics))
+        cur = await self._c().execute(
+            f"SELECT metric, day, dim, value FROM stats_daily WHERE metric IN ({marks}) AND day >= ?",
+            (*metrics, since_day),
+        )
+        return await cur.fetchall()
+
+    async def stats_rollup_hourly(self, metrics: tuple[str, ...], since_hour: str) -> list[tuple[str, str, str, int]]:
+        """(metric, hour, dim, value) начиная с since_hour (YYYY-MM-DDTHH)."""
+        marks = ", ".join("?" * len(metrics))
+        cur = await self._c().execute(
+            f"SELECT metric, hour, dim, value FROM stats_hourly WHERE metric IN ({marks}) AND hour >= ?",
+            (*metrics, since_hour),
+        )
+        return await cur.fetchall()
 
     # --------- Collections / Sculptures ----------
     async def add_collection(self, title: str, short_desc: str | None, cover_file_id: str | None, sort_order: int) -> int:
@@ -239,14 +586,12 @@ class Repo:
         await self._c().commit()
         return cur.lastrowid
 
-    async def list_collections(self, active_only: bool = True, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
+    async def list_collections(self, active_only: bool = True, limit: int = 10, offset: int = 0) -> list[Collection]:
+        """Страница коллекций (выбор коллекции в админке; витрина — из снимка catalog.snap)."""
         where = "WHERE is_active=1" if active_only else ""
-        cur_cnt = await self._c().execute(f"SELECT COUNT(*) as c FROM collections {where}")
-        total = (await cur_cnt.fetchone())["c"]
-
         cur = await self._c().execute(
             f"""
-            SELECT * FROM collections
+            SELECT {COLLECTION_COLS} FROM collections
             {where}
             ORDER BY sort_order DESC, id DESC
             LIMIT ? OFFSET ?
@@ -254,12 +599,12 @@ class Repo:
             (limit, offset),
         )
         rows = await cur.fetchall()
-        return [dict(r) for r in rows], total
+        return [Collection(*r) for r in rows]
 
-    async def get_collection(self, collection_id: int) -> dict | None:
-        cur = await self._c().execute("SELECT * FROM collections WHERE id=?", (collection_id,))
+    async def get_collection(self, collection_id: int) -> Collection | None:
+        cur = await self._c().execute(f"SELECT {COLLECTION_COLS} FROM collections WHERE id=?", (collection_id,))
         row = await cur.fetchone()
-        return dict(row) if row else None
+        return Collection(*row) if row else None
 
     async def add_sculpture(self, collection_id: int, **fields) -> int:
         now = utcnow_iso()
@@ -303,70 +648,93 @@ class Repo:
         )
         await self._c().commit()
 
-    async def list_sculptures_by_collection(self, collection_id: int, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
-        cur_cnt = await self._c().execute(
-            "SELECT COUNT(*) as c FROM sculptures WHERE collection_id=?",
-            (collection_id,),
-        )
-        total = (await cur_cnt.fetchone())["c"]
-
-        cur = await self._c().execute(
-            """
-            SELECT * FROM sculptures
-            WHERE collection_id=?
-            ORDER BY id DESC
-            LIMIT ? OFFSET ?
-            """,
-            (collection_id, limit, offset),
-        )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows], total
-
-    async def get_sculpture(self, sculpture_id: int) -> dict | None:
-        cur = await self._c().execute("SELECT * FROM sculptures WHERE id=?", (sculpture_id,))
+    async def get_sculpture(self, sculpture_id: int) -> Sculpture | None:
+        cur = await self._c().execute(f"SELECT {SCULPTURE_COLS} FROM sculptures WHERE id=?", (sculpture_id,))
         row = await cur.fetchone()
-        return dict(row) if row else None
+        return Sculpture(*row) if row else None
 
-    async def list_sculpture_photos(self, sculpture_id: int) -> list[dict]:
+    async def list_sculpture_photos(self, sculpture_id: int) -> list[Photo]:
         cur = await self._c().execute(
-            "SELECT * FROM sculpture_photos WHERE sculpture_id=? ORDER BY sort_order ASC, id ASC",
+            f"SELECT {PHOTO_COLS} FROM sculpture_photos WHERE sculpture_id=? ORDER BY sort_order ASC, id ASC",
             (sculpture_id,),
         )
         rows = await cur.fetchall()
-        return [dict(r) for r in rows]
+        return [Photo(*r) for r in rows]
 
-    async def list_new_sculptures(self, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
-        cur_cnt = await self._c().execute(
-            "SELECT COUNT(*) as c FROM sculptures WHERE published_at IS NOT NULL"
+    async def get_sculpture_card(self, sculpture_id: int, photo_idx: int, viewer_id: int) -> SculptureCard | None:
+        """
+        Карточка скульптуры одним запросом:
+        поля скульптуры + photo_count + file_id (фото №photo_idx) + viewer_registered.
+        Фото №0 — денормализованная обложка, иначе один шаг по idx_photos_sculpture_sort.
+        """
+        cur = await self._c().execute(
+            f"""
+            SELECT {_CARD_COLS}, s.photo_count,
+                   CASE WHEN :idx = 0 THEN s.cover_file_id ELSE (
+                       SELECT p.file_id FROM sculpture_photos p
+                       WHERE p.sculpture_id = s.id
+                       ORDER BY p.sort_order, p.id
+                       LIMIT 1 OFFSET :idx
+                   ) END AS file_id,
+                   EXISTS(
+                       SELECT 1 FROM users u
+                       WHERE u.telegram_id = :viewer AND u.consent = 1
+                         AND COALESCE(u.name, '') <> '' AND COALESCE(u.email, '') <> ''
+                         AND COALESCE(u.role, '') <> ''
+                   ) AS viewer_registered
+            FROM sculptures s
+            WHERE s.id = :sid
+            """,
+            {"sid": sculpture_id, "idx": max(0, photo_idx), "viewer": viewer_id},
         )
-        total = (await cur_cnt.fetchone())["c"]
+        row = await cur.fetchone()
+        return SculptureCard(*row) if row else None
+
+    # --------- Поиск по каталогу (FTS5, миграция v6) ---------
+    async def search_sculptures(self, query: str, limit: int = 10, offset: int = 0) -> tuple[list[SculptureItem], int]:
+        """Ранжированный префиксный поиск (bm25: название > автор > материал > описания)."""
+        match = fts_query(query)
+        if not match:
+            return [], 0
+        cur = await self._c().execute("SELECT COUNT(*) FROM sculptures_fts WHERE sculptures_fts MATCH ?", (match,))
+        (total,) = await cur.fetchone()
+        if not total:
+            return [], 0
+        cur = await self._c().execute(
+            "SELECT rowid, title FROM sculptures_fts WHERE sculptures_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (match, limit, offset),
+        )
+        return [SculptureItem(*r) for r in await cur.fetchall()], total
 
+    async def search_collections(self, query: str, limit: int = 3) -> list[Collection]:
+        match = fts_query(query)
+        if not match:
+            return []
         cur = await self._c().execute(
-            """
-            SELECT * FROM sculptures
-            WHERE published_at IS NOT NULL
-            ORDER BY published_at DESC
-            LIMIT ? OFFSET ?
+            f"""
+            SELECT {_SEARCH_COLLECTION_COLS}
+            FROM collections_fts f JOIN collections c ON c.id = f.rowid
+            WHERE collections_fts MATCH ? AND c.is_active = 1
+            ORDER BY f.rank
+            LIMIT ?
             """,
-            (limit, offset),
+            (match, limit),
         )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows], total
+        return [Collection(*r) for r in await cur.fetchall()]
 
-    async def list_featured_sculptures(self, limit: int = 10, offset: int = 0) -> tuple[list[dict], int]:
-        cur_cnt = await self._c().execute(
-            "SELECT COUNT(*) as c FROM sculptures WHERE is_featured=1"
-        )
-        total = (await cur_cnt.fetchone())["c"]
+    async def load_catalog(self) -> tuple[list[Collection], list[Sculpture], list[tuple[int, str]]]:
+        """
+        Весь каталог для CatalogSnapshot: коллекции, скульптуры (без description_full)
+        и пары (sculpture_id, file_id) в порядке показа.
+        """
+        cur = await self._c().execute(f"SELECT {COLLECTION_COLS} FROM collections")
+        collections = [Collection(*r) for r in await cur.fetchall()]
+
+        cur = await self._c().execute(f"SELECT {SCULPTURE_COLS} FROM sculptures")
+        sculptures = [Sculpture(*r) for r in await cur.fetchall()]
 
         cur = await self._c().execute(
-            """
-            SELECT * FROM sculptures
-            WHERE is_featured=1
-            ORDER BY id DESC
-            LIMIT ? OFFSET ?
-            """,
-            (limit, offset),
+            "SELECT sculpture_id, file_id FROM sculpture_photos ORDER BY sculpture_id, sort_order, id"
         )
-        rows = await cur.fetchall()
-        return [dict(r) for r in rows], total
+        photos = await cur.fetchall()
+        return collections, sculptures, photos
@@ -1,5 +1,5 @@
-PRAGMA journal_mode=WAL;
-PRAGMA foreign_keys=ON;
+-- Базовая схема (миграция v1, см. app/db/migrations.py).
+-- Дальнейшие изменения схемы — только новыми шагами в MIGRATIONS, этот файл не трогаем.
 
 CREATE TABLE IF NOT EXISTS users (
   telegram_id INTEGER PRIMARY KEY,
@@ -73,8 +73,111 @@ CREATE TABLE IF NOT EXISTS sculpture_photos (
 );
 
 CREATE INDEX IF NOT EXISTS idx_sculptures_collection ON sculptures(collection_id);
-CREATE INDEX IF NOT EXISTS idx_photos_sculpture ON sculpture_photos(sculpture_id);
 CREATE INDEX IF NOT EXISTS idx_users_notify ON users(consent, notify_enabled, role);
 
 -- ✅ быстрый поиск дизайнеров
 CREATE INDEX IF NOT EXISTS idx_users_designer_interest ON users(designer_interest, designer_interest_at);
+
+-- индексы под горячие запросы (list_* / stats / рассылка)
+CREATE INDEX IF NOT EXISTS idx_sculptures_published ON sculptures(published_at);
+CREATE INDEX IF NOT EXISTS idx_sculptures_featured ON sculptures(is_featured);
+CREATE INDEX IF NOT EXISTS idx_visit_requests_status ON visit_requests(status);
+CREATE INDEX IF NOT EXISTS idx_visit_requests_user ON visit_requests(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_collections_active_sort ON collections(is_active, sort_order, id);
+CREATE INDEX IF NOT EXISTS idx_collections_sort ON collections(sort_order, id);
+-- покрывающий: порядок фото + file_id без захода в таблицу
+CREATE INDEX IF NOT EXISTS idx_photos_sculpture_sort ON sculpture_photos(sculpture_id, sort_order, id, file_id);
+DROP INDEX IF EXISTS idx_photos_sculpture;
+
+-- ✅ счётчики (вместо COUNT(*) на каждой странице), ведутся триггерами
+-- ключи: users, users_notify, visit_new, collections, collections_active,
+--        sculptures_new, sculptures_featured, collection_sculptures:<id>
+CREATE TABLE IF NOT EXISTS counters (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- users
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_ins AFTER INSERT ON users BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('users', 1), ('users_notify', NEW.consent = 1 AND NEW.notify_enabled = 1)
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_del AFTER DELETE ON users BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'users';
+  UPDATE counters SET value = value - (OLD.consent = 1 AND OLD.notify_enabled = 1) WHERE key = 'users_notify';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_users_counters_upd AFTER UPDATE OF consent, notify_enabled ON users
+WHEN (OLD.consent = 1 AND OLD.notify_enabled = 1) <> (NEW.consent = 1 AND NEW.notify_enabled = 1)
+BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('users_notify', (NEW.consent = 1 AND NEW.notify_enabled = 1) - (OLD.consent = 1 AND OLD.notify_enabled = 1))
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+-- visit_requests
+CREATE TRIGGER IF NOT EXISTS trg_visit_counters_ins AFTER INSERT ON visit_requests
+WHEN NEW.status = 'new'
+BEGIN
+  INSERT INTO counters(key, value) VALUES ('visit_new', 1)
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_visit_counters_del AFTER DELETE ON visit_requests
+WHEN OLD.status = 'new'
+BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'visit_new';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_visit_counters_upd AFTER UPDATE OF status ON visit_requests
+WHEN (OLD.status = 'new') <> (NEW.status = 'new')
+BEGIN
+  INSERT INTO counters(key, value) VALUES ('visit_new', (NEW.status = 'new') - (OLD.status = 'new'))
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+-- collections
+CREATE TRIGGER IF NOT EXISTS trg_collections_counters_ins AFTER INSERT ON collections BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('collections', 1), ('collections_active', NEW.is_active = 1), ('collection_sculptures:' || NEW.id, 0)
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_collections_counters_del AFTER DELETE ON collections BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'collections';
+  UPDATE counters SET value = value - (OLD.is_active = 1) WHERE key = 'collections_active';
+  DELETE FROM counters WHERE key = 'collection_sculptures:' || OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_collections_counters_upd AFTER UPDATE OF is_active ON collections
+WHEN (OLD.is_active = 1) <> (NEW.is_active = 1)
+BEGIN
+  INSERT INTO counters(key, value) VALUES ('collections_active', (NEW.is_active = 1) - (OLD.is_active = 1))
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+-- sculptures
+CREATE TRIGGER IF NOT EXISTS trg_sculptures_counters_ins AFTER INSERT ON sculptures BEGIN
+  INSERT INTO counters(key, value)
+  VALUES ('collection_sculptures:' || NEW.collection_id, 1),
+         ('sculptures_new', NEW.published_at IS NOT NULL),
+         ('sculptures_featured', NEW.is_featured = 1)
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sculptures_counters_del AFTER DELETE ON sculptures BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'collection_sculptures:' || OLD.collection_id;
+  UPDATE counters SET value = value - (OLD.published_at IS NOT NULL) WHERE key = 'sculptures_new';
+  UPDATE counters SET value = value - (OLD.is_featured = 1) WHERE key = 'sculptures_featured';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sculptures_counters_upd AFTER UPDATE OF collection_id, published_at, is_featured ON sculptures BEGIN
+  UPDATE counters SET value = value - 1 WHERE key = 'collection_sculptures:' || OLD.collection_id;
+  INSERT INTO counters(key, value)
+  VALUES ('collection_sculptures:' || NEW.collection_id, 1),
+         ('sculptures_new', (NEW.published_at IS NOT NULL) - (OLD.published_at IS NOT NULL)),
+         ('sculptures_featured', (NEW.is_featured = 1) - (OLD.is_featured = 1))
+  ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
@@ -0,0 +1,131 @@
+"""
+Настройка соединений SQLite и фоновое обслуживание БД.
+
+- profile_pragmas() / apply_profile(): один PRAGMA-профиль (Config.db_profile) на каждое
+  соединение — Repo, импорт каталога, утилиты.
+- Maintenance: фоновая задача на соединении Repo:
+  * PASSIVE checkpoint каждые MAINTENANCE_INTERVAL секунд (не ждёт читателей/писателей);
+  * TRUNCATE, когда WAL вырос больше journal_size_limit и PASSIVE перенёс всё
+    (значит, держащих старый снимок читателей нет и усечение мгновенное);
+  * PRAGMA optimize раз в OPTIMIZE_EVERY (и при закрытии Repo);
+  * предупреждение, если WAL больше wal_alarm_mb (не чаще раза в ALARM_EVERY);
+  * чистка stats_hourly старше HOURLY_KEEP_DAYS (тренды 24ч читают только свежие часы)
+    и отправленных уведомлений admin_outbox старше OUTBOX_KEEP_DAYS.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+import aiosqlite
+
+from app.config import DbProfile
+
+if TYPE_CHECKING:
+    from app.db.repo import Repo
+
+logger = logging.getLogger("form_bronze_bot.db")
+
+MAINTENANCE_INTERVAL = 60      # сек
+OPTIMIZE_EVERY = 6 * 3600      # сек
+ALARM_EVERY = 3600             # сек между повторными предупреждениями
+HOURLY_KEEP_DAYS = 14
+OUTBOX_KEEP_DAYS = 30
+
+_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORE = {"DEFAULT", "FILE", "MEMORY"}
+
+MB = 1024 * 1024
+
+
+_WRITE_PRAGMAS = ("journal_mode", "wal_autocheckpoint", "journal_size_limit")
+
+
+def profile_pragmas(profile: DbProfile, read_only: bool = False) -> list[str]:
+    """
+    PRAGMA-строки профиля. Значения из окружения — только из белых списков / int.
+    read_only: без PRAGMA, которые пишут в БД или относятся к WAL пишущего соединения.
+    """
+    if profile.synchronous not in _SYNCHRONOUS:
+        raise ValueError(f"DB_SYNCHRONOUS={profile.synchronous!r}: нужно одно из {sorted(_SYNCHRONOUS)}")
+    if profile.temp_store not in _TEMP_STORE:
+        raise ValueError(f"DB_TEMP_STORE={profile.temp_store!r}: нужно одно из {sorted(_TEMP_STORE)}")
+    pragmas = [
+        f"PRAGMA busy_timeout={int(profile.busy_timeout_ms)};",
+        "PRAGMA journal_mode=WAL;",
+        f"PRAGMA synchronous={profile.synchronous};",
+        f"PRAGMA cache_size=-{int(profile.cache_size_kib)};",
+        f"PRAGMA mmap_size={int(profile.mmap_size_mb) * MB};",
+        f"PRAGMA temp_store={profile.temp_store};",
+        f"PRAGMA wal_autocheckpoint={int(profile.wal_autocheckpoint)};",
+        f"PRAGMA journal_size_limit={int(profile.journal_size_limit_mb) * MB};",
+        "PRAGMA foreign_keys=ON;",
+    ]
+    if read_only:
+        pragmas = [p for p in pragmas if not p.startswith(tuple(f"PRAGMA {w}=" for w in _WRITE_PRAGMAS))]
+    return pragmas
+
+
+async def apply_profile(conn: aiosqlite.Connection, profile: DbProfile, read_only: bool = False) -> None:
+    for sql in profile_pragmas(profile, read_only):
+        await conn.execute(sql)
+
+
+def wal_size(db_path: str) -> int:
+    try:
+        return os.path.getsize(f"{db_path}-wal")
+    except OSError:
+        return 0
+
+
+class Maintenance:
+    """Фоновое обслуживание БД (см. docstring модуля). alarm — куда слать предупреждения."""
+
+    def __init__(self, repo: "Repo", alarm: Callable[[str], Awaitable[None]] | None = None) -> None:
+        self.repo = repo
+        self.profile = repo.profile
+        self.alarm = alarm
+        self._last_optimize = time.monotonic()
+        self._last_alarm: float | None = None
+
+    async def tick(self) -> None:
+        repo = self.repo
+        size = wal_size(repo.db_path)
+
+        busy, log_pages, done_pages = await repo.wal_checkpoint("PASSIVE")
+        if size > self.profile.journal_size_limit_mb * MB and not busy and log_pages == done_pages:
+            await repo.wal_checkpoint("TRUNCATE")
+            logger.info("wal checkpoint TRUNCATE: wal was %.1f MB", size / MB)
+            size = wal_size(repo.db_path)
+
+        if size > self.profile.wal_alarm_mb * MB:
+            msg = (
+                f"⚠️ WAL {size / MB:.0f} МБ (> {self.profile.wal_alarm_mb} МБ): checkpoint не успевает, "
+                f"перенесено {done_pages}/{log_pages} стр. — возможно, долгий читатель."
+            )
+            logger.warning(msg)
+            now = time.monotonic()
+            if self.alarm and (self._last_alarm is None or now - self._last_alarm >= ALARM_EVERY):
+                self._last_alarm = now
+                await self.alarm(msg)
+
+        if time.monotonic() - self._last_optimize >= OPTIMIZE_EVERY:
+            self._last_optimize = time.monotonic()
+            await repo.optimize()
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=HOURLY_KEEP_DAYS)).strftime("%Y-%m-%dT%H")
+            pruned = await repo.prune_stats_hourly(cutoff)
+            outbox_cutoff = (datetime.now(timezone.utc) - timedelta(days=OUTBOX_KEEP_DAYS)).replace(microsecond=0).isoformat()
+            pruned_outbox = await repo.prune_outbox(outbox_cutoff)
+            logger.info("db optimize done, pruned: stats_hourly %s rows, admin_outbox %s rows", pruned, pruned_outbox)
+
+    async def loop(self) -> None:
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("db maintenance failed")
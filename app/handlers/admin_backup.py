@@ -0,0 +1,21 @@
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+
+from app.db.backup import Backups
+
+router = Router()
+
+
+@router.message(Command("backup"))
+async def cmd_backup(message: Message, backups: Backups, admin_ids: set[int]):
+    if message.from_user.id not in admin_ids:
+        return
+    await message.answer("Делаю бэкап…")
+    try:
+        result = await backups.run()
+    except Exception as e:
+        await message.answer(f"Бэкап не удался: {e}")
+        return
+    kept = ", ".join(p.name for p in backups.list())
+    await message.answer(f"{result.text()}\n\nХранятся: {kept}")
@@ -1,4 +1,4 @@
-from aiogram import Router, F, Bot
+from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -6,7 +6,9 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
 from app import texts
+from app.broadcast import DEDUP_WINDOW, BroadcastWorker, idempotency_key
 from app.db.repo import Repo
+from app.segments import ALL, ROLES, SegmentIndex, canonical
 
 router = Router()
 
@@ -23,87 +25,121 @@ def _is_admin(user_id: int, admin_ids: set[int]) -> bool:
     return user_id in admin_ids
 
 
-async def _send_broadcast(
-    bot: Bot,
+async def _audience_markup(segments: SegmentIndex):
+    """Кнопки аудиторий с текущим числом получателей (из индекса сегментов, без SQL)."""
+    sizes = await segments.sizes()
+    kb = InlineKeyboardBuilder()
+    for a in (ALL, *ROLES):
+        kb.button(text=f"{a} · {sizes[a]}", callback_data=f"bc:aud:{a}")
+    kb.button(text="🎯 Свой сегмент", callback_data="bc:aud:custom")
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+async def _set_audience(bot: Bot, chat_id: int, state: FSMContext, segments: SegmentIndex, audience: str) -> None:
+    """Превью аудитории; пустую не принимаем, остаёмся на выборе. ValueError — из resolve (город без пользователей)."""
+    n = await segments.count(audience)
+    if not n:
+        await bot.send_message(chat_id, f"Аудитория «{audience}»: получателей нет. Выберите другую.")
+        return
+    await state.update_data(audience=audience)
+    await state.set_state(Broadcast.post)
+    await bot.send_message(chat_id, f"Аудитория «{audience}»: {n} получателей.\n\n{texts.BROADCAST_SEND_PROMPT}")
+
+
+async def _enqueue_broadcast(
     repo: Repo,
+    broadcasts: BroadcastWorker,
+    segments: SegmentIndex,
+    admin_id: int,
     audience: str,
     src_chat_id: int,
     src_msg_id: int,
     link_text: str | None,
     link_url: str | None,
-):
-    q = "SELECT telegram_id FROM users WHERE consent=1 AND notify_enabled=1"
-    params: list = []
-    if audience != "all":
-        q += " AND role=?"
-        params.append(audience)
-
-    cur = await repo._c().execute(q, params)
-    rows = await cur.fetchall()
-    user_ids = [r["telegram_id"] for r in rows]
-
-    kb = InlineKeyboardBuilder()
-    if link_text and link_url:
-        kb.button(text=link_text, url=link_url)
-    kb.button(text="🏠 Главное меню", callback_data="menu:main")
-    kb.adjust(1)
-    markup = kb.as_markup()
-
-    ok = 0
-    fail = 0
-    for uid in user_ids:
-        try:
-            await bot.copy_message(
-                chat_id=uid,
-                from_chat_id=src_chat_id,
-                message_id=src_msg_id,
-                reply_markup=markup,
-            )
-            ok += 1
-        except Exception:
-            fail += 1
-            continue
-    return ok, fail
+    idem_key: str | None = None,
+) -> str:
+    """
+    ✅ Рассылка — задание в БД (аудитория снимается сразу), шлёт фоновый BroadcastWorker:
+    хендлер не ждёт отправки, после рестарта задание продолжится. Возвращает текст для админа.
+    ✅ idem_key (по умолчанию — исходное сообщение + аудитория): повтор в DEDUP_WINDOW
+    не создаёт второе задание, а показывает уже существующее.
+    ✅ получатели — из индекса сегментов (audience — выражение, см. app.segments).
+    """
+    if idem_key is None:
+        idem_key = idempotency_key(src_chat_id, src_msg_id, audience, link_url)
+    try:
+        recipients = await segments.resolve(audience)
+    except ValueError as e:  # город аудитории опустел после превью
+        return f"Аудитория «{audience}»: {e} — рассылка не создана."
+    if not recipients:
+        return f"Аудитория «{audience}»: получателей нет — рассылка не создана."
+    job, created = await repo.create_broadcast_job(
+        audience, src_chat_id, src_msg_id, link_text, link_url, admin_id, idem_key, DEDUP_WINDOW, recipients
+    )
+    if not created:
+        return (
+            f"Эта рассылка уже создана: #{job.id} ({job.status}), "
+            f"отправлено {job.sent} из {job.total}. Повторно не отправляем."
+        )
+    broadcasts.wake()
+    return f"Рассылка #{job.id} поставлена в очередь: получателей {job.total}. Прогресс — отдельным сообщением."
 
 
 @router.message(Command("broadcast"))
-async def broadcast_cmd(message: Message, admin_ids: set[int], state: FSMContext):
+async def broadcast_cmd(message: Message, admin_ids: set[int], state: FSMContext, segments: SegmentIndex):
     if not _is_admin(message.from_user.id, admin_ids):
         return
     await state.set_state(Broadcast.audience)
-    kb = InlineKeyboardBuilder()
-    for a in ["all", "collector", "dealer", "author", "interest"]:
-        kb.button(text=a, callback_data=f"bc:aud:{a}")
-    kb.adjust(2)
-    await message.answer(texts.BROADCAST_AUDIENCE_TEXT, reply_markup=kb.as_markup())
+    await message.answer(texts.BROADCAST_AUDIENCE_TEXT, reply_markup=await _audience_markup(segments))
+
+
+@router.message(Command("segments_refresh"))
+async def cmd_segments_refresh(message: Message, admin_ids: set[int], segments: SegmentIndex):
+    # после записи в users другим процессом (python -m app.legacy_import) — перестроить индекс сегментов
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    await segments.rebuild()
+    sizes = await segments.sizes()
+    await message.answer("Сегменты обновлены: " + ", ".join(f"{k} {v}" for k, v in sizes.items()) + ".")
 
 
 @router.callback_query(F.data == "admin:broadcast")
-async def broadcast_from_panel(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+async def broadcast_from_panel(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, segments: SegmentIndex):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
     await state.set_state(Broadcast.audience)
-    kb = InlineKeyboardBuilder()
-    for a in ["all", "collector", "dealer", "author", "interest"]:
-        kb.button(text=a, callback_data=f"bc:aud:{a}")
-    kb.adjust(2)
-    await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_AUDIENCE_TEXT, reply_markup=kb.as_markup())
+    await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_AUDIENCE_TEXT, reply_markup=await _audience_markup(segments))
     await cb.answer()
 
 
 @router.callback_query(F.data.startswith("bc:aud:"))
-async def bc_audience(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+async def bc_audience(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, segments: SegmentIndex):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
     aud = cb.data.split(":")[2]
-    await state.update_data(audience=aud)
-    await state.set_state(Broadcast.post)
-    await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_SEND_PROMPT)
+    if aud == "custom":
+        await state.set_state(Broadcast.audience)
+        await cb.bot.send_message(cb.from_user.id, texts.BROADCAST_SEGMENT_PROMPT)
+    else:
+        await _set_audience(cb.bot, cb.from_user.id, state, segments, aud)
     await cb.answer()
 
 
+# ✅ своё выражение сегментов: превью числа получателей до отправки поста
+@router.message(Broadcast.audience)
+async def bc_audience_expr(message: Message, admin_ids: set[int], state: FSMContext, segments: SegmentIndex):
+    if not _is_admin(message.from_user.id, admin_ids):
+        return
+    try:
+        audience = canonical(message.text or "")
+        await _set_audience(message.bot, message.chat.id, state, segments, audience)
+    except ValueError as e:
+        await message.answer(f"Не понял выражение: {e}.\n\n{texts.BROADCAST_SEGMENT_PROMPT}")
+
+
 @router.message(Broadcast.post)
 async def bc_post(message: Message, admin_ids: set[int], state: FSMContext):
     if not _is_admin(message.from_user.id, admin_ids):
@@ -118,19 +154,25 @@ async def bc_post(message: Message, admin_ids: set[int], state: FSMContext):
 
 
 @router.callback_query(F.data == "bc:link:no")
-async def bc_no_link(cb: CallbackQuery, admin_ids: set[int], state: FSMContext, repo: Repo):
+async def bc_no_link(
+    cb: CallbackQuery, admin_ids: set[int], state: FSMContext, repo: Repo, broadcasts: BroadcastWorker, segments: SegmentIndex
+):
     if not _is_admin(cb.from_user.id, admin_ids):
         await cb.answer()
         return
+    # ✅ данные забираем и сразу чистим состояние: второе нажатие «Нет» увидит пустое FSM
     data = await state.get_data()
-    ok, fail = await _send_broadcast(
-        cb.bot, repo,
+    await state.clear()
+    if "src_msg_id" not in data:
+        await cb.answer("Рассылка уже создана.")
+        return
+    text = await _enqueue_broadcast(
+        repo, broadcasts, segments, cb.from_user.id,
         data["audience"],
         data["src_chat_id"], data["src_msg_id"],
         None, None
     )
-    await state.clear()
-    await cb.bot.send_message(cb.from_user.id, f"{texts.BROADCAST_DONE_TEXT}\nУспешно: {ok} / Ошибок: {fail}")
+    await cb.bot.send_message(cb.from_user.id, text)
     await cb.answer()
 
 
@@ -158,19 +200,35 @@ async def bc_link_text(message: Message, admin_ids: set[int], state: FSMContext)
 
 
 @router.message(Broadcast.link_url)
-async def bc_link_url(message: Message, admin_ids: set[int], state: FSMContext, repo: Repo):
+async def bc_link_url(
+    message: Message, admin_ids: set[int], state: FSMContext, repo: Repo, broadcasts: BroadcastWorker, segments: SegmentIndex
+):
     if not _is_admin(message.from_user.id, admin_ids):
         return
     url = (message.text or "").strip()
     if not (url.startswith("http://") or url.startswith("https://")):
         await message.answer("URL должен начинаться с http:// или https://")
         return
+    # ✅ как в bc_no_link: второе сообщение с URL, пришедшее одновременно, увидит пустое FSM
     data = await state.get_data()
-    ok, fail = await _send_broadcast(
-        message.bot, repo,
+    await state.clear()
+    if "src_msg_id" not in data:
+        await message.answer("Рассылка уже создана.")
+        return
+    text = await _enqueue_broadcast(
+        repo, broadcasts, segments, message.from_user.id,
         data["audience"],
         data["src_chat_id"], data["src_msg_id"],
         data.get("link_text"), url
     )
-    await state.clear()
-    await message.answer(f"{texts.BROADCAST_DONE_TEXT}\nУспешно: {ok} / Ошибок: {fail}")
+    await message.answer(text)
+
+
+# ✅ кнопки под сообщением с прогрессом: bcj:pause|resume|cancel:<job_id>
+@router.callback_query(F.data.startswith("bcj:"))
+async def bc_job_control(cb: CallbackQuery, admin_ids: set[int], broadcasts: BroadcastWorker):
+    if not _is_admin(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    _, action, job_id = cb.data.split(":")
+    await cb.answer(await broadcasts.control(int(job_id), action) or None)
@@ -1,3 +1,6 @@
+import tempfile
+from pathlib import Path
+
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
@@ -5,7 +8,13 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
+from app.broadcast import BroadcastWorker
+from app.catalog import Catalog
+from app.catalog_import import SUFFIXES, import_manifest
+from app.db.models import SCULPTURE_STATUSES
 from app.db.repo import Repo, utcnow_iso
+from app.segments import SegmentIndex
+from app.utils.albums import AlbumCollector
 
 router = Router()
 
@@ -32,7 +41,17 @@ class AddSculpture(StatesGroup):
     ask_broadcast = State()
 
 
-STATUSES = ["in_expo", "available", "sold", "on_request"]
+class ImportCatalog(StatesGroup):
+    file = State()
+    confirm = State()
+
+
+STATUSES = SCULPTURE_STATUSES
+IMPORT_MAX_BYTES = 20 * 1024 * 1024  # лимит скачивания файлов ботом (Bot API)
+MAX_PHOTOS = 6
+
+# ✅ альбом приходит пачкой сообщений — собираем его целиком: одна запись в FSM и один ответ
+_albums = AlbumCollector()
 
 
 def _admin_only(user_id: int, admin_ids: set[int]) -> bool:
@@ -79,21 +98,27 @@ async def add_collection_desc(message: Message, admin_ids: set[int], state: FSMC
 async def add_collection_cover(message: Message, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    cover = None
+    album = await _albums.collect(message)
+    if album is None:
+        return  # часть альбома — ответит первая часть
+    photos = [m.photo[-1].file_id for m in album if m.photo]
+    note = ""
     if message.text and message.text.strip() == "-":
         cover = None
-    elif message.photo:
-        cover = message.photo[-1].file_id
+    elif photos:
+        cover = photos[0]
+        if len(album) > 1:
+            note = "Из альбома взята первая фотография.\n"
     else:
         await message.answer("Пришлите фото или '-'")
         return
     await state.update_data(cover=cover)
     await state.set_state(AddCollection.sort_order)
-    await message.answer("Введите sort_order (целое число, например 0):")
+    await message.answer(f"{note}Введите sort_order (целое число, например 0):")
 
 
 @router.message(AddCollection.sort_order)
-async def add_collection_sort(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
+async def add_collection_sort(message: Message, repo: Repo, catalog: Catalog, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
     raw = (message.text or "").strip()
@@ -109,6 +134,7 @@ async def add_collection_sort(message: Message, repo: Repo, admin_ids: set[int],
         cover_file_id=data.get("cover"),
         sort_order=so,
     )
+    await catalog.refresh()
     await state.clear()
     await message.answer(f"Коллекция добавлена. ID={cid}")
 
@@ -118,14 +144,14 @@ async def start_add_sculpture(cb: CallbackQuery, repo: Repo, admin_ids: set[int]
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
-    items, _ = await repo.list_collections(active_only=False, limit=50, offset=0)
+    items = await repo.list_collections(active_only=False, limit=50, offset=0)
     if not items:
         await cb.bot.send_message(cb.from_user.id, "Нет коллекций. Сначала добавь коллекцию.")
         await cb.answer()
         return
     kb = InlineKeyboardBuilder()
     for c in items:
-        kb.button(text=c["title"], callback_data=f"adm:sc:col:{c['id']}")
+        kb.button(text=c.title, callback_data=f"adm:sc:col:{c.id}")
     kb.adjust(1)
     await state.set_state(AddSculpture.choose_collection)
     await cb.bot.send_message(cb.from_user.id, "Выберите коллекцию:", reply_markup=kb.as_markup())
@@ -142,7 +168,11 @@ async def choose_collection(cb: CallbackQuery, admin_ids: set[int], state: FSMCo
     await state.set_state(AddSculpture.photos)
     kb = InlineKeyboardBuilder()
     kb.button(text="✅ Готово", callback_data="adm:sc:photos_done")
-    await cb.bot.send_message(cb.from_user.id, "Отправьте 1–6 фото по одному. Затем нажмите ✅ Готово.", reply_markup=kb.as_markup())
+    await cb.bot.send_message(
+        cb.from_user.id,
+        f"Отправьте 1–{MAX_PHOTOS} фото (по одному или альбомом). Затем нажмите ✅ Готово.",
+        reply_markup=kb.as_markup(),
+    )
     await cb.answer()
 
 
@@ -150,17 +180,29 @@ async def choose_collection(cb: CallbackQuery, admin_ids: set[int], state: FSMCo
 async def collect_photos(message: Message, admin_ids: set[int], state: FSMContext):
     if not _admin_only(message.from_user.id, admin_ids):
         return
-    if not message.photo:
+    album = await _albums.collect(message)
+    if album is None:
+        return  # часть альбома — ответит первая часть
+    new = [m.photo[-1].file_id for m in album if m.photo]
+    if not new:
         await message.answer("Нужно фото. Отправь фото или нажми ✅ Готово.")
         return
     data = await state.get_data()
     photos = data.get("photos", [])
-    if len(photos) >= 6:
-        await message.answer("Максимум 6 фото. Нажми ✅ Готово.")
+    room = MAX_PHOTOS - len(photos)
+    if room <= 0:
+        await message.answer(f"Максимум {MAX_PHOTOS} фото. Нажми ✅ Готово.")
         return
-    photos.append(message.photo[-1].file_id)
+    photos = [*photos, *new[:room]]
     await state.update_data(photos=photos)
-    await message.answer(f"Ок, фото добавлено ({len(photos)}/6).")
+    if len(album) == 1:
+        text = f"Ок, фото добавлено ({len(photos)}/{MAX_PHOTOS})."
+    else:
+        text = f"Ок, из альбома добавлено фото: {min(len(new), room)} ({len(photos)}/{MAX_PHOTOS})."
+    skipped = len(album) - min(len(new), room)
+    if skipped:
+        text += f" Не вошло: {skipped} (только фото, максимум {MAX_PHOTOS})."
+    await message.answer(text)
 
 
 @router.callback_query(F.data == "adm:sc:photos_done")
@@ -300,12 +342,25 @@ async def sc_feat(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("adm:sc:bc:"))
-async def sc_finish(cb: CallbackQuery, repo: Repo, admin_ids: set[int], state: FSMContext):
+async def sc_finish(
+    cb: CallbackQuery,
+    repo: Repo,
+    catalog: Catalog,
+    broadcasts: BroadcastWorker,
+    segments: SegmentIndex,
+    admin_ids: set[int],
+    state: FSMContext,
+):
     if not _admin_only(cb.from_user.id, admin_ids):
         await cb.answer()
         return
     do_bc = cb.data.endswith("yes")
+    # ✅ данные забираем и сразу чистим состояние: двойное нажатие не создаст вторую скульптуру/рассылку
     data = await state.get_data()
+    await state.clear()
+    if "photos" not in data:
+        await cb.answer("Уже сохранено.")
+        return
 
     sid = await repo.add_sculpture(
         collection_id=int(data["collection_id"]),
@@ -324,14 +379,97 @@ async def sc_finish(cb: CallbackQuery, repo: Repo, admin_ids: set[int], state: F
     for i, fid in enumerate(data["photos"]):
         await repo.add_sculpture_photo(sid, fid, i)
 
-    await state.clear()
+    await catalog.refresh()
     await cb.bot.send_message(cb.from_user.id, f"Скульптура добавлена. ID={sid}")
 
     if do_bc:
         # простая рассылка: фото1 + title
-        from app.handlers.admin_broadcast import _send_broadcast
+        from app.handlers.admin_broadcast import _enqueue_broadcast
         tmp = await cb.bot.send_photo(cb.from_user.id, photo=data["photos"][0], caption=f"Новая работа:\n{data['title']}")
-        ok, fail = await _send_broadcast(cb.bot, repo, "all", cb.from_user.id, tmp.message_id, None, None)
-        await cb.bot.send_message(cb.from_user.id, f"Разослано подписчикам. Успешно: {ok} / Ошибок: {fail}")
+        text = await _enqueue_broadcast(
+            repo, broadcasts, segments, cb.from_user.id, "all", cb.from_user.id, tmp.message_id, None, None,
+            idem_key=f"sculpture:{sid}",
+        )
+        await cb.bot.send_message(cb.from_user.id, text)
+
+    await cb.answer()
 
+
+# --------- Массовый импорт каталога (CSV / JSONL / JSON) ---------
+async def _run_import(bot, repo: Repo, file_id: str, name: str, dry_run: bool):
+    # файл во временный каталог (потоковый разбор идёт с диска) и сразу удалить
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"manifest{Path(name).suffix.lower()}"
+        await bot.download(file_id, destination=path)
+        return await import_manifest(repo.db_path, path, dry_run=dry_run, source=name, profile=repo.profile)
+
+
+@router.callback_query(F.data == "admin:import_catalog")
+async def start_import_catalog(cb: CallbackQuery, admin_ids: set[int], state: FSMContext):
+    if not _admin_only(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    await state.set_state(ImportCatalog.file)
+    await cb.bot.send_message(
+        cb.from_user.id,
+        "Пришлите манифест файлом (.csv / .jsonl / .json).\n"
+        "Колонки: collection, title, photos (file_id через |), artist, material, year, dimensions, "
+        "description_short, status, featured, published_at, key.\n"
+        "Сначала будет пробный прогон с отчётом.",
+    )
     await cb.answer()
+
+
+@router.message(ImportCatalog.file)
+async def import_catalog_file(message: Message, repo: Repo, admin_ids: set[int], state: FSMContext):
+    if not _admin_only(message.from_user.id, admin_ids):
+        return
+    doc = message.document
+    if not doc or Path(doc.file_name or "").suffix.lower() not in SUFFIXES:
+        await message.answer("Нужен файл .csv / .jsonl / .json")
+        return
+    if (doc.file_size or 0) > IMPORT_MAX_BYTES:
+        await message.answer("Файл больше 20 МБ — загрузите через CLI: python -m app.catalog_import")
+        return
+
+    report = await _run_import(message.bot, repo, doc.file_id, doc.file_name, dry_run=True)
+    if report.aborted or not report.imported:
+        await state.clear()
+        await message.answer(report.text())
+        return
+
+    await state.update_data(import_file_id=doc.file_id, import_name=doc.file_name)
+    await state.set_state(ImportCatalog.confirm)
+    kb = InlineKeyboardBuilder()
+    kb.button(text=f"✅ Импортировать ({report.imported})", callback_data="adm:imp:yes")
+    kb.button(text="Отмена", callback_data="adm:imp:no")
+    kb.adjust(1)
+    await message.answer(report.text(), reply_markup=kb.as_markup())
+
+
+@router.callback_query(ImportCatalog.confirm, F.data.startswith("adm:imp:"))
+async def import_catalog_confirm(cb: CallbackQuery, repo: Repo, catalog: Catalog, admin_ids: set[int], state: FSMContext):
+    if not _admin_only(cb.from_user.id, admin_ids):
+        await cb.answer()
+        return
+    data = await state.get_data()
+    await state.clear()
+    if cb.data.endswith("no"):
+        await cb.bot.send_message(cb.from_user.id, "Импорт отменён.")
+        await cb.answer()
+        return
+
+    await cb.answer("Импортирую…")
+    report = await _run_import(cb.bot, repo, data["import_file_id"], data["import_name"], dry_run=False)
+    if report.imported:
+        await catalog.refresh()
+    await cb.bot.send_message(cb.from_user.id, report.text())
+
+
+@router.message(Command("catalog_refresh"))
+async def cmd_catalog_refresh(message: Message, catalog: Catalog, admin_ids: set[int]):
+    # после импорта через CLI (другой процесс) — перечитать снимок каталога
+    if not _admin_only(message.from_user.id, admin_ids):
+        return
+    snap = await catalog.refresh()
+    await message.answer(f"Каталог обновлён: коллекций {len(snap.collections)}, работ {len(snap.sculptures)}.")
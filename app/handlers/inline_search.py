@@ -0,0 +1,149 @@
+"""
+Inline-режим: @bot <запрос> в любом чате -> карточки скульптур фотографиями.
+
+- Поиск — Repo.search_sculptures (FTS5) на отдельном read-only соединении (search_repo),
+  соединение Repo для чатов не занимается.
+- Фото/название/автор — из снимка каталога (catalog.snap), без БД. Скульптуры без фото
+  пропускаем: InlineQueryResultCachedPhoto нужен file_id.
+- Пустой запрос — «Избранное» из снимка.
+- Кэш ответов: (запрос, offset) -> id на TTL; ответы не персональные, поэтому Telegram
+  тоже кэширует их на CACHE_TIME для всех пользователей.
+- Дебаунс: клиент шлёт запрос на каждую букву — ждём DEBOUNCE и отвечаем только на
+  последний запрос пользователя. Если более короткий запрос уже ничего не нашёл,
+  его продолжение (все слова — префиксы) тоже пустое — отвечаем без БД.
+- Кнопка под результатом — deep link в бота: /start s_<id> открывает sculpture:<id>:0.
+"""
+from __future__ import annotations
+
+import asyncio
+import html
+import time
+
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultCachedPhoto
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from app.catalog import Catalog
+from app.db.models import Sculpture
+from app.db.repo import Repo, fts_query
+
+router = Router()
+
+PAGE = 20                # результатов за ответ (Telegram допускает до 50)
+DEBOUNCE = 0.35          # сек
+CACHE_TTL = 120          # сек, кэш в процессе
+CACHE_TIME = 300         # сек, подсказка Telegram (cache_time)
+CACHE_MAX = 1024         # записей в кэше
+DEEP_LINK_PREFIX = "s_"  # /start s_<sculpture_id>
+
+
+class InlineSearch:
+    """Кэш inline-ответов + дебаунс по пользователю."""
+
+    def __init__(self, repo: Repo, catalog: Catalog) -> None:
+        self.repo = repo  # read-only соединение
+        self.catalog = catalog
+        # (match, offset) -> (expires_at, ids, total)
+        self._cache: dict[tuple[str, int], tuple[float, tuple[int, ...], int]] = {}
+        self._empty: dict[str, float] = {}  # match без результатов -> expires_at
+        self._latest: dict[int, str] = {}   # user_id -> id последнего inline-запроса
+
+    def _get(self, key: tuple[str, int]) -> tuple[tuple[int, ...], int] | None:
+        hit = self._cache.get(key)
+        if hit is None:
+            return None
+        if hit[0] < time.monotonic():
+            del self._cache[key]
+            return None
+        return hit[1], hit[2]
+
+    def _put(self, key: tuple[str, int], ids: tuple[int, ...], total: int) -> None:
+        if len(self._cache) >= CACHE_MAX:
+            self._cache.pop(next(iter(self._cache)))  # самая старая запись
+        expires = time.monotonic() + CACHE_TTL
+        self._cache[key] = (expires, ids, total)
+        if not total:
+            if len(self._empty) >= CACHE_MAX:
+                self._empty.pop(next(iter(self._empty)))
+            self._empty[key[0]] = expires
+
+    def _known_empty(self, match: str) -> bool:
+        """Есть ли в кэше пустой результат для запроса, продолжением которого является match."""
+        now = time.monotonic()
+        tokens = match.split(" ")
+        for prev, expires in self._empty.items():
+            if expires < now:
+                continue
+            prev_tokens = prev.split(" ")
+            if len(prev_tokens) > len(tokens):
+                continue
+            # '"брон"*' -> 'брон': каждое прежнее слово — префикс соответствующего нового
+            if all(t[1:-2].startswith(p[1:-2]) for p, t in zip(prev_tokens, tokens)):
+                return True
+        return False
+
+    async def debounce(self, user_id: int, query_id: str) -> bool:
+        """True — это всё ещё последний запрос пользователя и на него нужно ответить."""
+        self._latest[user_id] = query_id
+        await asyncio.sleep(DEBOUNCE)
+        if self._latest.get(user_id) != query_id:
+            return False
+        del self._latest[user_id]
+        return True
+
+    async def find(self, query: str, offset: int) -> tuple[list[Sculpture], int]:
+        snap = self.catalog.snap
+        match = fts_query(query)
+        if match is None:
+            return snap.featured_page(limit=PAGE, offset=offset)
+
+        key = (match, offset)
+        hit = self._get(key)
+        if hit is None:
+            if self._known_empty(match):
+                hit = ((), 0)
+            else:
+                items, total = await self.repo.search_sculptures(query, limit=PAGE, offset=offset)
+                hit = (tuple(s.id for s in items), total)
+            self._put(key, *hit)
+        ids, total = hit
+        # снимок мог обновиться после индексации — берём только то, что в нём есть
+        return [snap.sculptures[i] for i in ids if i in snap.sculptures], total
+
+
+def _result(s: Sculpture, file_id: str, bot_username: str) -> InlineQueryResultCachedPhoto:
+    meta = " · ".join(x for x in (s.artist, s.year, s.material) if x)
+    caption = f"<b>{html.escape(s.title)}</b>"
+    if meta:
+        caption += f"\n{html.escape(meta)}"
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Подробнее", url=f"https://t.me/{bot_username}?start={DEEP_LINK_PREFIX}{s.id}")
+    return InlineQueryResultCachedPhoto(
+        id=str(s.id),
+        photo_file_id=file_id,
+        title=s.title,
+        description=meta or None,
+        caption=caption,
+        parse_mode="HTML",
+        reply_markup=kb.as_markup(),
+    )
+
+
+@router.inline_query()
+async def on_inline_query(inline: InlineQuery, inline_search: InlineSearch):
+    if not await inline_search.debounce(inline.from_user.id, inline.id):
+        return  # пользователь уже допечатал — ответим на следующий запрос
+
+    offset = int(inline.offset) if inline.offset.isdigit() else 0
+    items, total = await inline_search.find(inline.query, offset)
+
+    me = await inline.bot.me()
+    snap = inline_search.catalog.snap
+    results = []
+    for s in items:
+        photos = snap.sculpture_photos(s.id)
+        if photos:
+            results.append(_result(s, photos[0], me.username))
+
+    next_offset = str(offset + PAGE) if offset + PAGE < total else ""
+    await inline.answer(results, cache_time=CACHE_TIME, is_personal=False, next_offset=next_offset)
@@ -5,6 +5,7 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from app import texts, media
 from app.navigation import Nav, Screen
 from app.db.repo import Repo
+from app.notify import DESIGNER, Notice, tg_username
 
 router = Router()
 
@@ -21,14 +22,6 @@ def _p(name: str, fallback: str = "PLACEHOLDER") -> str:
     return getattr(media, name, fallback)
 
 
-async def _send_to_admins(bot, admin_ids: set[int], text: str) -> None:
-    for aid in admin_ids:
-        try:
-            await bot.send_message(aid, text, disable_web_page_preview=True)
-        except Exception:
-            pass
-
-
 def register_screens(nav: Nav, repo: Repo):
     async def screen_designer(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
@@ -63,7 +56,7 @@ async def open_designer(cb: CallbackQuery, nav: Nav):
 
 
 @router.callback_query(F.data == "designer:apply")
-async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav, admin_ids: set[int]):
+async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav):
     await cb.answer()  # ✅ сразу
 
     # гарантируем строку пользователя
@@ -77,31 +70,20 @@ async def designer_apply(cb: CallbackQuery, repo: Repo, nav: Nav, admin_ids: set
         await nav.show_screen(cb.bot, cb.from_user.id, "settings:guest", remove_reply_keyboard=True)
         return
 
-    # фиксируем интерес (если метод есть)
-    try:
-        if hasattr(repo, "set_designer_interest"):
-            await repo.set_designer_interest(cb.from_user.id, True)
-    except Exception:
-        pass
-
-    # данные (телефон НЕ обязателен)
-    name = getattr(u, "name", None) or "—"
-    email = getattr(u, "email", None) or "—"
-    role = getattr(u, "role", None) or "—"
-    phone = getattr(u, "phone", None) or "—"
-    username = f"@{cb.from_user.username}" if cb.from_user.username else "—"
-
-    admin_text = (
-        "🎨 <b>Заявка на сотрудничество (дизайнер)</b>\n\n"
-        f"<b>Имя:</b> {name}\n"
-        f"<b>Email:</b> {email}\n"
-        f"<b>Роль:</b> {role}\n"
-        f"<b>Телефон:</b> {phone}\n"
-        f"<b>Username:</b> {username}\n"
-        f"<b>Профиль:</b> tg://user?id={cb.from_user.id}"
+    # ✅ интерес + уведомление админам (outbox) одной транзакцией; шлёт фоновый AdminNotifier
+    notice = Notice(
+        DESIGNER,
+        "🎨 Заявка на сотрудничество (дизайнер)",
+        (
+            ("Имя", u.name or "—"),
+            ("Email", u.email or "—"),
+            ("Роль", u.role or "—"),
+            ("Телефон", u.phone or "—"),  # телефон НЕ обязателен
+            ("Username", tg_username(cb.from_user)),
+        ),
+        cb.from_user.id,
     )
-
-    await _send_to_admins(cb.bot, admin_ids, admin_text)
+    await repo.set_designer_interest(cb.from_user.id, True, outbox=notice.row())
 
     thanks = _t("DESIGNER_THANKS_TEXT", "Спасибо! Заявка принята. Мы свяжемся с вами в ближайшее время.")
     await cb.bot.send_message(cb.from_user.id, thanks, disable_web_page_preview=True)
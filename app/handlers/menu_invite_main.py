@@ -9,6 +9,7 @@ from aiogram.fsm.state import StatesGroup, State
 from app import texts, media
 from app.db.repo import Repo
 from app.navigation import Nav, Screen
+from app.notify import PHONE, VISIT, Notice, tg_username
 
 router = Router()
 
@@ -52,18 +53,31 @@ def _city_address(city: str) -> str:
     return default.get(city, "Адрес")
 
 
-async def _notify_admins(bot, admin_ids: set[int], text: str):
-    for aid in admin_ids:
-        try:
-            await bot.send_message(aid, text, disable_web_page_preview=True)
-        except Exception:
-            pass
+def _phone_notice(u, from_user, title: str, phone: str) -> Notice:
+    return Notice(
+        PHONE,
+        title,
+        (
+            ("Имя", u.name if u and u.name else "—"),
+            ("Роль", u.role if u and u.role else "—"),
+            ("Телефон", phone),
+            ("Username", tg_username(from_user)),
+        ),
+        from_user.id,
+    )
 
 
 async def _create_visit_request(repo: Repo, telegram_id: int, city: str, method: str, value: str | None):
+    """✅ Заявка + уведомление админам (outbox) одной транзакцией; шлёт фоновый AdminNotifier."""
     u = await repo.get_user(telegram_id)
     name_snapshot = u.name if u and u.name else None
     role_snapshot = u.role if u and u.role else None
+    notice = Notice(
+        VISIT,
+        "🏙 Новая заявка на визит",
+        (("Город", city), ("Метод", method), ("Контакт", value or "—")),
+        telegram_id,
+    )
 
     return await repo.create_visit_request(
         telegram_id=telegram_id,
@@ -72,6 +86,7 @@ async def _create_visit_request(repo: Repo, telegram_id: int, city: str, method:
         city=city,
         contact_method=method,
         contact_value=value,
+        outbox=notice.row(),
     )
 
 
@@ -257,33 +272,22 @@ async def invite_phone_manual(cb: CallbackQuery, nav: Nav, state: FSMContext):
 # ----- INVITE (Свяжитесь со мной) -----
 
 @router.message(InvitePhone.wait_contact, F.contact)
-async def got_contact(message: Message, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def got_contact(message: Message, repo: Repo, nav: Nav, state: FSMContext):
     phone = message.contact.phone_number if message.contact else None
     if not phone:
         await message.answer("Не удалось прочитать номер. Попробуйте ещё раз или введите вручную.")
         return
 
-    await repo.update_profile(message.from_user.id, phone=phone)
-    await state.clear()
-
     u = await repo.get_user(message.from_user.id)
-    name = (u.name if u and u.name else "—")
-    role = (u.role if u and u.role else "—")
-    username = f"@{message.from_user.username}" if message.from_user.username else "—"
-
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "📲 Запрос связи (телефон)\n"
-        f"Имя: {name}\nРоль: {role}\nТелефон: {phone}\nUsername: {username}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
+    notice = _phone_notice(u, message.from_user, "📲 Запрос связи (телефон)", phone)
+    await repo.update_profile(message.from_user.id, outbox=notice.row(), phone=phone)
+    await state.clear()
 
     await nav.show_screen(message.bot, message.from_user.id, "invite:phone_saved", remove_reply_keyboard=True)
 
 
 @router.message(InvitePhone.wait_manual)
-async def got_manual_phone(message: Message, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def got_manual_phone(message: Message, repo: Repo, nav: Nav, state: FSMContext):
     if not message.text:
         await message.answer("Отправьте номер текстом (например: +7 999 123-45-67).")
         return
@@ -293,21 +297,10 @@ async def got_manual_phone(message: Message, repo: Repo, nav: Nav, state: FSMCon
         await message.answer("Похоже, номер введён некорректно. Пример: +7 999 123-45-67")
         return
 
-    await repo.update_profile(message.from_user.id, phone=raw)
-    await state.clear()
-
     u = await repo.get_user(message.from_user.id)
-    name = (u.name if u and u.name else "—")
-    role = (u.role if u and u.role else "—")
-    username = f"@{message.from_user.username}" if message.from_user.username else "—"
-
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "📲 Запрос связи (номер вручную)\n"
-        f"Имя: {name}\nРоль: {role}\nТелефон: {raw}\nUsername: {username}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
+    notice = _phone_notice(u, message.from_user, "📲 Запрос связи (номер вручную)", raw)
+    await repo.update_profile(message.from_user.id, outbox=notice.row(), phone=raw)
+    await state.clear()
 
     await nav.show_screen(message.bot, message.from_user.id, "invite:phone_saved", remove_reply_keyboard=True)
 
@@ -326,7 +319,7 @@ async def pick_city(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
 
 
 @router.callback_query(F.data == "visit_method:tg")
-async def method_tg(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def method_tg(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
     await cb.answer()
     data = await state.get_data()
     city = data.get("visit_city")
@@ -339,20 +332,12 @@ async def method_tg(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext,
 
     await _create_visit_request(repo, cb.from_user.id, city, "tg", value)
 
-    await _notify_admins(
-        cb.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: tg\nКонтакт: {value}\n"
-        f"Профиль: tg://user?id={cb.from_user.id}",
-    )
-
     await state.clear()
     await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
 
 
 @router.callback_query(F.data == "visit_method:email")
-async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
     await cb.answer()
     data = await state.get_data()
     city = data.get("visit_city")
@@ -364,14 +349,6 @@ async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
     if u and u.email:
         await _create_visit_request(repo, cb.from_user.id, city, "email", u.email)
 
-        await _notify_admins(
-            cb.bot,
-            admin_ids,
-            "🏙 Новая заявка на визит\n"
-            f"Город: {city}\nМетод: email\nКонтакт: {u.email}\n"
-            f"Профиль: tg://user?id={cb.from_user.id}",
-        )
-
         await state.clear()
         await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
     else:
@@ -380,7 +357,7 @@ async def method_email(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
 
 
 @router.message(VisitFlow.wait_email)
-async def got_visit_email(message: Message, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def got_visit_email(message: Message, repo: Repo, nav: Nav, state: FSMContext):
     data = await state.get_data()
     city = data.get("visit_city")
 
@@ -397,20 +374,12 @@ async def got_visit_email(message: Message, repo: Repo, nav: Nav, state: FSMCont
     await repo.update_profile(message.from_user.id, email=email)
     await _create_visit_request(repo, message.from_user.id, city, "email", email)
 
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: email\nКонтакт: {email}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
-
     await state.clear()
     await nav.show_screen(message.bot, message.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
 
 
 @router.callback_query(F.data == "visit_method:phone")
-async def method_phone(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def method_phone(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContext):
     await cb.answer()
     data = await state.get_data()
     city = data.get("visit_city")
@@ -422,14 +391,6 @@ async def method_phone(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
     if u and u.phone:
         await _create_visit_request(repo, cb.from_user.id, city, "phone", u.phone)
 
-        await _notify_admins(
-            cb.bot,
-            admin_ids,
-            "🏙 Новая заявка на визит\n"
-            f"Город: {city}\nМетод: phone\nКонтакт: {u.phone}\n"
-            f"Профиль: tg://user?id={cb.from_user.id}",
-        )
-
         await state.clear()
         await nav.show_screen(cb.bot, cb.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
         return
@@ -440,7 +401,7 @@ async def method_phone(cb: CallbackQuery, repo: Repo, nav: Nav, state: FSMContex
 
 
 @router.message(VisitFlow.wait_phone_contact, F.contact)
-async def got_visit_phone_contact(message: Message, repo: Repo, nav: Nav, state: FSMContext, admin_ids: set[int]):
+async def got_visit_phone_contact(message: Message, repo: Repo, nav: Nav, state: FSMContext):
     data = await state.get_data()
     city = data.get("visit_city")
 
@@ -457,13 +418,5 @@ async def got_visit_phone_contact(message: Message, repo: Repo, nav: Nav, state:
     await repo.update_profile(message.from_user.id, phone=phone)
     await _create_visit_request(repo, message.from_user.id, city, "phone", phone)
 
-    await _notify_admins(
-        message.bot,
-        admin_ids,
-        "🏙 Новая заявка на визит\n"
-        f"Город: {city}\nМетод: phone\nКонтакт: {phone}\n"
-        f"Профиль: tg://user?id={message.from_user.id}",
-    )
-
     await state.clear()
     await nav.show_screen(message.bot, message.from_user.id, "invite:visit_done", ctx={"city": city}, remove_reply_keyboard=True)
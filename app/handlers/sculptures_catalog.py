@@ -1,22 +1,34 @@
+import html
+
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app import texts, media
+from app.catalog import Catalog
 from app.navigation import Nav, Screen
 from app.db.repo import Repo
 
 router = Router()
 
 PAGE_SIZE = 8
+SEARCH_QUERY_MAX = 100
+
 
+class CatalogSearch(StatesGroup):
+    query = State()
 
-def register_screens(nav: Nav, repo: Repo):
+
+def register_screens(nav: Nav, repo: Repo, catalog: Catalog):
+    # ✅ каталог читаем из снимка в памяти (catalog.snap), БД — только для пользователя
     async def sculptures_home(chat_id: int, ctx: dict) -> Screen:
         kb = InlineKeyboardBuilder()
         kb.button(text="📚 Коллекции", callback_data="sculptures:collections:0")
         kb.button(text="✨ Новые работы", callback_data="sculptures:new:0")
         kb.button(text="🔥 Избранные", callback_data="sculptures:featured:0")
+        kb.button(text="🔎 Поиск", callback_data="sculptures:search")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
         return Screen(
@@ -27,7 +39,7 @@ def register_screens(nav: Nav, repo: Repo):
 
     async def collections_page(chat_id: int, ctx: dict) -> Screen:
         offset = int(ctx["screen_id"].split(":")[1])
-        items, total = await repo.list_collections(active_only=True, limit=PAGE_SIZE, offset=offset)
+        items, total = catalog.snap.collections_page(active_only=True, limit=PAGE_SIZE, offset=offset)
 
         kb = InlineKeyboardBuilder()
         if not items:
@@ -37,7 +49,7 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text=texts.COLLECTIONS_EMPTY_TEXT, inline=kb.as_markup())
 
         for c in items:
-            kb.button(text=c["title"], callback_data=f"collection:{c['id']}:0")
+            kb.button(text=c.title, callback_data=f"collection:{c.id}:0")
 
         if offset > 0:
             kb.button(text="◀️", callback_data=f"sculptures:collections:{max(0, offset - PAGE_SIZE)}")
@@ -54,20 +66,21 @@ def register_screens(nav: Nav, repo: Repo):
         collection_id = int(collection_id)
         offset = int(offset)
 
-        col = await repo.get_collection(collection_id)
-        items, total = await repo.list_sculptures_by_collection(collection_id, limit=PAGE_SIZE, offset=offset)
+        snap = catalog.snap
+        col = snap.collections.get(collection_id)
+        items, total = snap.sculptures_page(collection_id, limit=PAGE_SIZE, offset=offset)
 
         kb = InlineKeyboardBuilder()
 
-        title = col["title"] if col else "Коллекция"
+        title = col.title if col else "Коллекция"
 
         desc = ""
-        if col and col.get("short_desc"):
-            desc = (col["short_desc"] or "").strip()
+        if col and col.short_desc:
+            desc = col.short_desc.strip()
             if desc == "-":
                 desc = ""
 
-        cover = col.get("cover_photo_file_id") if col else None
+        cover = col.cover_photo_file_id if col else None
 
         header_parts = [title]
         if desc:
@@ -85,7 +98,7 @@ def register_screens(nav: Nav, repo: Repo):
             )
 
         for s in items:
-            kb.button(text=s["title"], callback_data=f"sculpture:{s['id']}:0")
+            kb.button(text=s.title, callback_data=f"sculpture:{s.id}:0")
 
         if offset > 0:
             kb.button(text="◀️", callback_data=f"collection:{collection_id}:{max(0, offset - PAGE_SIZE)}")
@@ -107,9 +120,26 @@ def register_screens(nav: Nav, repo: Repo):
         sid = int(sid)
         pidx = int(pidx)
 
-        s = await repo.get_sculpture(sid)
-        photos = await repo.list_sculpture_photos(sid)
-        file_id = photos[pidx]["file_id"] if photos and 0 <= pidx < len(photos) else None
+        snap = catalog.snap
+        s = snap.sculptures.get(sid)
+        if s is not None:
+            photos = snap.sculpture_photos(sid)
+            photo_count = len(photos)
+            file_id = photos[pidx] if 0 <= pidx < photo_count else None
+            u = await repo.get_user(chat_id)
+            viewer_registered = bool(u and u.consent == 1 and u.name and u.email and u.role)
+        else:
+            # снимок ещё не обновился (только что добавили) — один запрос карточки из БД
+            s = await repo.get_sculpture_card(sid, pidx, viewer_id=chat_id)
+            if not s:
+                kb = InlineKeyboardBuilder()
+                kb.button(text="⬅️ Назад", callback_data="nav:back")
+                kb.button(text="🏠 Главное меню", callback_data="menu:main")
+                kb.adjust(2)
+                return Screen(text="Работа не найдена.", inline=kb.as_markup())
+            photo_count = s.photo_count
+            file_id = s.file_id if 0 <= pidx < photo_count else None
+            viewer_registered = bool(s.viewer_registered)
 
         status_map = {
             "in_expo": "В экспозиции",
@@ -119,32 +149,29 @@ def register_screens(nav: Nav, repo: Repo):
         }
 
         info = []
-        info.append(s["title"])
+        info.append(s.title)
         meta = []
-        if s.get("artist"):
-            meta.append(f"Автор: {s['artist']}")
-        if s.get("material"):
-            meta.append(f"Материал: {s['material']}")
-        if s.get("year"):
-            meta.append(f"Год: {s['year']}")
-        if s.get("dimensions"):
-            meta.append(f"Размер: {s['dimensions']}")
-        meta.append(f"Статус: {status_map.get(s.get('status'), s.get('status'))}")
+        if s.artist:
+            meta.append(f"Автор: {s.artist}")
+        if s.material:
+            meta.append(f"Материал: {s.material}")
+        if s.year:
+            meta.append(f"Год: {s.year}")
+        if s.dimensions:
+            meta.append(f"Размер: {s.dimensions}")
+        meta.append(f"Статус: {status_map.get(s.status, s.status)}")
         info.append("\n".join(meta))
-        if s.get("description_short"):
-            info.append(s["description_short"])
+        if s.description_short:
+            info.append(s.description_short)
 
         text = "\n\n".join(info)
 
         kb = InlineKeyboardBuilder()
-        if photos and len(photos) > 1:
-            next_idx = (pidx + 1) % len(photos)
+        if photo_count > 1:
+            next_idx = (pidx + 1) % photo_count
             kb.button(text="🖼 Следующее фото", callback_data=f"sculpture_photo_next:{sid}:{next_idx}")
 
-        u = await repo.get_user(chat_id)
-        is_registered = bool(u and u.consent == 1 and u.name and u.email and u.role)
-
-        if is_registered:
+        if viewer_registered:
             kb.button(text="👤 Свяжитесь со мной", callback_data="invite:me")
             kb.button(text="🏙 Визит в городе", callback_data="invite:city")
         else:
@@ -159,7 +186,7 @@ def register_screens(nav: Nav, repo: Repo):
 
     async def new_feed(chat_id: int, ctx: dict) -> Screen:
         offset = int(ctx["screen_id"].split(":")[1])
-        items, total = await repo.list_new_sculptures(limit=1, offset=offset)
+        items, total = catalog.snap.new_page(limit=1, offset=offset)
 
         kb = InlineKeyboardBuilder()
         if not items:
@@ -169,19 +196,19 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text="Пока нет новых работ.", inline=kb.as_markup())
 
         s = items[0]
-        kb.button(text="Подробнее", callback_data=f"sculpture:{s['id']}:0")
+        kb.button(text="Подробнее", callback_data=f"sculpture:{s.id}:0")
         if offset + 1 < total:
             kb.button(text="Следующая", callback_data=f"sculptures:new:{offset+1}")
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
-        text = f"Новая работа:\n{s['title']}"
+        text = f"Новая работа:\n{s.title}"
         return Screen(text=text, inline=kb.as_markup())
 
     async def featured_feed(chat_id: int, ctx: dict) -> Screen:
         offset = int(ctx["screen_id"].split(":")[1])
-        items, total = await repo.list_featured_sculptures(limit=1, offset=offset)
+        items, total = catalog.snap.featured_page(limit=1, offset=offset)
 
         kb = InlineKeyboardBuilder()
         if not items:
@@ -191,22 +218,60 @@ def register_screens(nav: Nav, repo: Repo):
             return Screen(text="Пока нет избранных работ.", inline=kb.as_markup())
 
         s = items[0]
-        kb.button(text="Подробнее", callback_data=f"sculpture:{s['id']}:0")
+        kb.button(text="Подробнее", callback_data=f"sculpture:{s.id}:0")
         if offset + 1 < total:
             kb.button(text="Следующая", callback_data=f"sculptures:featured:{offset+1}")
         kb.button(text="⬅️ Назад", callback_data="nav:back")
         kb.button(text="🏠 Главное меню", callback_data="menu:main")
         kb.adjust(1)
 
-        text = f"Избранное:\n{s['title']}"
+        text = f"Избранное:\n{s.title}"
         return Screen(text=text, inline=kb.as_markup())
 
+    async def search_prompt(chat_id: int, ctx: dict) -> Screen:
+        kb = InlineKeyboardBuilder()
+        kb.button(text="⬅️ Назад", callback_data="nav:back")
+        kb.button(text="🏠 Главное меню", callback_data="menu:main")
+        kb.adjust(2)
+        return Screen(text="Напишите название работы, автора или материал:", inline=kb.as_markup())
+
+    async def search_results(chat_id: int, ctx: dict) -> Screen:
+        # screen_id = search:<offset>:<запрос> — «Назад» перерисует ту же выдачу
+        _, offset, query = ctx["screen_id"].split(":", 2)
+        offset = int(offset)
+        items, total = await repo.search_sculptures(query, limit=PAGE_SIZE, offset=offset)
+        collections = await repo.search_collections(query) if offset == 0 else []
+
+        kb = InlineKeyboardBuilder()
+        for c in collections:
+            kb.button(text=f"📚 {c.title}", callback_data=f"collection:{c.id}:0")
+        for s in items:
+            kb.button(text=s.title, callback_data=f"sculpture:{s.id}:0")
+
+        if offset > 0:
+            kb.button(text="◀️", callback_data=f"sculptures:search:{max(0, offset - PAGE_SIZE)}")
+        if offset + PAGE_SIZE < total:
+            kb.button(text="▶️", callback_data=f"sculptures:search:{offset + PAGE_SIZE}")
+
+        kb.button(text="🔎 Новый поиск", callback_data="sculptures:search")
+        kb.button(text="⬅️ Назад", callback_data="nav:back")
+        kb.button(text="🏠 Главное меню", callback_data="menu:main")
+        kb.adjust(1)
+
+        head = f"Поиск: «{html.escape(query)}»"
+        if not items and not collections:
+            return Screen(text=f"{head}\n\nНичего не нашлось. Попробуйте другое слово.", inline=kb.as_markup())
+        found = f"Работ: {total}" if total else "Работ не найдено"
+        return Screen(text=f"{head}\n{found}", inline=kb.as_markup())
+
     nav.register("sculptures_home", sculptures_home)
     nav.register("sculptures_collections", collections_page)
     nav.register("collection", collection_sculptures)
     nav.register("sculpture", sculpture_card)
     nav.register("new", new_feed)
     nav.register("featured", featured_feed)
+    nav.register("search_prompt", search_prompt)
+    nav.register("search", search_results)
 
 
 @router.callback_query(F.data == "menu:sculptures")
@@ -257,6 +322,35 @@ async def open_featured_feed(cb: CallbackQuery, nav: Nav):
     await nav.show_screen(cb.bot, cb.from_user.id, f"featured:{offset}", remove_reply_keyboard=True)
 
 
+@router.callback_query(F.data == "sculptures:search")
+async def open_search(cb: CallbackQuery, nav: Nav, state: FSMContext):
+    await cb.answer()  # ✅ СРАЗУ
+    await state.set_state(CatalogSearch.query)
+    await nav.show_screen(cb.bot, cb.from_user.id, "search_prompt", remove_reply_keyboard=True)
+
+
+# ✅ запрос — в данных FSM (в callback_data не влезает: лимит 64 байта)
+@router.callback_query(F.data.startswith("sculptures:search:"))
+async def open_search_page(cb: CallbackQuery, nav: Nav, state: FSMContext):
+    await cb.answer()  # ✅ СРАЗУ
+    offset = cb.data.split(":")[2]
+    query = (await state.get_data()).get("search_query")
+    if query is None:
+        # данные сброшены (рестарт, другой сценарий) — просим запрос заново
+        await state.set_state(CatalogSearch.query)
+        await nav.show_screen(cb.bot, cb.from_user.id, "search_prompt", remove_reply_keyboard=True)
+        return
+    await nav.show_screen(cb.bot, cb.from_user.id, f"search:{offset}:{query}", remove_reply_keyboard=True)
+
+
+@router.message(CatalogSearch.query, F.text, ~F.text.startswith("/"))
+async def on_search_query(message: Message, nav: Nav, state: FSMContext):
+    query = message.text.strip()[:SEARCH_QUERY_MAX]
+    await state.set_state(None)
+    await state.update_data(search_query=query)
+    await nav.show_screen(message.bot, message.chat.id, f"search:0:{query}", remove_reply_keyboard=True)
+
+
 @router.callback_query(F.data == "guest:need_register")
 async def guest_need_register(cb: CallbackQuery, nav: Nav):
     await cb.answer("Нужна регистрация")  # ✅ СРАЗУ (и текстом)
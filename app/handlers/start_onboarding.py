@@ -14,6 +14,7 @@ from app.navigation import Nav, Screen
 router = Router()
 
 EMAIL_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
+SCULPTURE_LINK_RE = re.compile(r"^/start(?:@\w+)?\s+s_(\d+)$")  # ✅ deep link из inline-режима
 PHONE_DIGITS_RE = re.compile(r"\d+")
 
 
@@ -129,6 +130,14 @@ async def _open_start_screen(message: Message, repo: Repo, nav: Nav, state: FSMC
     u = await repo.get_user(telegram_id)
 
     nav.clear(telegram_id)
+
+    # ✅ /start s_<id> (кнопка под inline-результатом): сразу карточка, «Назад» — в меню
+    m = SCULPTURE_LINK_RE.match((message.text or "").strip())
+    if m:
+        nav.push(telegram_id, "menu:registered" if _is_registered(u) else "menu:guest")
+        await nav.show_screen(message.bot, telegram_id, f"sculpture:{m.group(1)}:0", remove_reply_keyboard=True)
+        return
+
     if _is_registered(u):
         await nav.show_screen(message.bot, telegram_id, "menu:registered", remove_reply_keyboard=True)
     else:
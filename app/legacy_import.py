@@ -0,0 +1,353 @@
+"""
+Перенос пользователей из БД старого бота (work-file/botbot0-46.py) в users.
+
+Старая БД бывает двух видов — определяем по колонкам users:
+- legacy: user_id, name, gmail, represents (по-русски), phone, city, tg_notifications, consent;
+- ранняя версия этого бота: telegram_id, consent, notify_enabled, email, role, ...
+
+Как работает:
+- Старая БД открывается только на чтение, строки читаются пачками по ключу
+  (WHERE pk > last ORDER BY pk LIMIT batch) — в памяти одна пачка.
+- Каждая пачка — одна транзакция (BEGIN IMMEDIATE) в рабочей БД: бот продолжает работать,
+  писатели ждут максимум одну короткую пачку.
+- Новые telegram_id вставляются целиком. У существующих с consent=1 заполняются только
+  пустые поля профиля (что человек ввёл в новом боте — не трогаем). Существующих без
+  согласия пропускаем: персональные данные без согласия не переносим.
+- Расхождения (поле заполнено и там и там, но по-разному; неизвестная роль) — в отчёт.
+- Курсор (last_id) пишется в legacy_import_state в той же транзакции: повторный запуск
+  продолжает с места остановки, полный перезапуск (--restart) безопасен — операции идемпотентны.
+- Перенос — не регистрация: вставки не попадают в сегодняшние signup в stats_*
+  (снимаем их и, если известна дата, кладём в день created_at).
+
+Бот (аудитории рассылки, app.segments) увидит новых пользователей после /segments_refresh
+(или рестарта / плановой перестройки).
+
+Запуск:  python -m app.legacy_import data/old_bot.sqlite [--dry-run] [--db PATH] [--conflicts out.csv]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiosqlite
+
+from app.config import DbProfile, load_db_profile
+from app.db.migrations import migrate, require_latest, table_columns
+from app.db.models import User
+from app.db.repo import USER_COLS, utcnow_iso
+from app.db.tuning import apply_profile
+
+logger = logging.getLogger("form_bronze_bot.legacy_import")
+
+BATCH_ROWS = 1000
+MAX_CONFLICTS_SHOWN = 20
+
+# represents (старый бот) -> role
+ROLE_MAP = {
+    "коллекционер": "collector",
+    "арт-диллер": "dealer",
+    "арт-дилер": "dealer",
+    "автор": "author",
+    "просто": "interest",
+}
+ROLES = {"collector", "dealer", "author", "interest"}
+
+# старый бот хранил город по-русски
+CITY_MAP = {"спб": "spb", "москва": "moscow", "ереван": "yerevan", "дубай": "dubai"}
+
+# поля профиля, которые дозаполняем у существующих пользователей
+FILL_FIELDS = ("name", "email", "role", "phone", "city")
+
+# (колонка в рабочей users, колонка в legacy-схеме)
+_LEGACY_SELECT = (
+    ("telegram_id", "user_id"),
+    ("consent", "consent"),
+    ("consent_at", None),
+    ("notify_enabled", "tg_notifications"),
+    ("notify_consent_at", None),
+    ("name", "name"),
+    ("email", "gmail"),
+    ("role", "represents"),
+    ("phone", "phone"),
+    ("city", "city"),
+    ("created_at", None),
+)
+
+
+@dataclass
+class LegacyReport:
+    source: str
+    shape: str
+    dry_run: bool
+    rows: int = 0
+    inserted: int = 0
+    filled: int = 0           # существующим дописали пустые поля
+    unchanged: int = 0
+    skipped_no_consent: int = 0
+    conflicts: list[tuple[int, str, str, str]] = field(default_factory=list)  # (id, поле, новое, старое)
+    resumed_from: int = 0
+
+    def text(self) -> str:
+        verb = "Будет" if self.dry_run else "Итого"
+        out = [
+            f"Перенос пользователей: {self.source} ({self.shape})" + (" — пробный прогон" if self.dry_run else ""),
+        ]
+        if self.resumed_from:
+            out.append(f"Продолжение с telegram_id > {self.resumed_from}")
+        out.append(
+            f"{verb}: строк {self.rows} · новых {self.inserted} · дозаполнено {self.filled}"
+            f" · без изменений {self.unchanged} · пропущено (нет согласия) {self.skipped_no_consent}"
+            f" · расхождений {len(self.conflicts)}"
+        )
+        for tid, name, new, old in self.conflicts[:MAX_CONFLICTS_SHOWN]:
+            out.append(f"  {tid}: {name}: оставили {new!r}, в старой БД {old!r}")
+        if len(self.conflicts) > MAX_CONFLICTS_SHOWN:
+            out.append(f"  … и ещё {len(self.conflicts) - MAX_CONFLICTS_SHOWN} (--conflicts file.csv)")
+        if not self.dry_run and (self.inserted or self.filled):
+            out.append("В аудиториях рассылки бота — после /segments_refresh (или рестарта).")
+        return "\n".join(out)
+
+
+def _norm(v) -> str | None:
+    if v is None:
+        return None
+    v = str(v).strip()
+    return v or None
+
+
+def _map_row(row: tuple, report: LegacyReport, now: str) -> tuple:
+    """Строка старой БД -> значения колонок рабочей users (в порядке _LEGACY_SELECT)."""
+    tid, consent, consent_at, notify, notify_at, name, email, role, phone, city, created_at = row
+    consent = 1 if consent else 0
+    notify = 1 if (notify and consent) else 0  # рассылка только при согласии
+
+    role_raw = _norm(role)
+    role = ROLE_MAP.get(role_raw.lower(), role_raw.lower()) if role_raw else None
+    if role and role not in ROLES:
+        report.conflicts.append((tid, "role", "—", role_raw))
+        role = None
+
+    city = _norm(city)
+    if city:
+        city = CITY_MAP.get(city.lower(), city)
+
+    return (
+        tid, consent, consent_at or (now if consent else None), notify, notify_at or (now if notify else None),
+        _norm(name), _norm(email), role, _norm(phone), city, created_at,
+    )
+
+
+async def _detect(legacy: aiosqlite.Connection) -> tuple[str, str, str]:
+    """(shape, pk, SELECT-список) по колонкам users старой БД."""
+    cols = await table_columns(legacy, "users")
+    if "user_id" in cols:
+        shape, pk, pairs = "legacy", "user_id", [(dst, src) for dst, src in _LEGACY_SELECT]
+    elif "telegram_id" in cols:
+        shape, pk, pairs = "telegram_id", "telegram_id", [(dst, dst) for dst, _ in _LEGACY_SELECT]
+    else:
+        raise ValueError("в старой БД нет users(user_id | telegram_id)")
+    select = ", ".join(src if src and src in cols else "NULL" for _, src in pairs)
+    return shape, pk, select
+
+
+async def _apply_batch(
+    conn: aiosqlite.Connection,
+    rows: list[tuple],
+    report: LegacyReport,
+    source: str,
+    last_id: int,
+) -> None:
+    """Одна пачка — одна транзакция: вставки, дозаполнение, поправка stats, курсор (dry_run — только подсчёт)."""
+    now = utcnow_iso()
+    if not report.dry_run:
+        await conn.execute("BEGIN IMMEDIATE")
+    try:
+        marks = ", ".join("?" * len(rows))
+        cur = await conn.execute(
+            f"SELECT {USER_COLS} FROM users WHERE telegram_id IN ({marks})", [r[0] for r in rows]
+        )
+        existing = {u.telegram_id: u for u in (User(*r) for r in await cur.fetchall())}
+
+        inserts: list[tuple] = []
+        fills: list[tuple] = []
+        for r in rows:
+            u = existing.get(r[0])
+            if u is None:
+                inserts.append(r)
+                continue
+            if u.consent != 1:
+                report.skipped_no_consent += 1
+                continue
+            legacy = dict(zip(("name", "email", "role", "phone", "city"), r[5:10]))
+            fill = {}
+            for name in FILL_FIELDS:
+                new, old = getattr(u, name), legacy[name]
+                if old is None:
+                    continue
+                if new is None:
+                    fill[name] = old
+                elif str(new) != str(old):
+                    report.conflicts.append((u.telegram_id, name, new, old))
+            if fill:
+                fills.append((*(fill.get(n) for n in FILL_FIELDS), now, u.telegram_id))
+            else:
+                report.unchanged += 1
+
+        if not report.dry_run:
+            if inserts:
+                await conn.executemany(
+                    """
+                    INSERT INTO users(telegram_id, consent, consent_at, notify_enabled, notify_consent_at,
+                                      name, email, role, phone, city, created_at, updated_at)
+                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, ?), ?)
+                    """,
+                    [(*r, now, now) for r in inserts],
+                )
+                await _move_signups(conn, inserts)
+            if fills:
+                # COALESCE: поле могли заполнить в боте между чтением и записью — не перетираем
+                await conn.executemany(
+                    """
+                    UPDATE users SET
+                        name = COALESCE(name, ?), email = COALESCE(email, ?), role = COALESCE(role, ?),
+                        phone = COALESCE(phone, ?), city = COALESCE(city, ?), updated_at = ?
+                    WHERE telegram_id = ?
+                    """,
+                    fills,
+                )
+            await conn.execute(
+                """
+                INSERT INTO legacy_import_state(source, last_id, rows, inserted, filled, conflicts, updated_at)
+                VALUES(?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET
+                    last_id = excluded.last_id,
+                    rows = rows + excluded.rows,
+                    inserted = inserted + excluded.inserted,
+                    filled = filled + excluded.filled,
+                    conflicts = excluded.conflicts,
+                    updated_at = excluded.updated_at
+                """,
+                (source, last_id, len(rows), len(inserts), len(fills), len(report.conflicts), now),
+            )
+            await conn.commit()
+    except Exception:
+        if not report.dry_run:
+            await conn.rollback()
+        raise
+
+    report.inserted += len(inserts)
+    report.filled += len(fills)
+
+
+async def _move_signups(conn: aiosqlite.Connection, inserts: list[tuple]) -> None:
+    """Триггер посчитал вставки как signup «сейчас»: снимаем, а известные даты кладём в свой день/час."""
+    n = len(inserts)
+    await conn.execute(
+        "UPDATE stats_daily SET value = value - ? WHERE metric = 'signup' AND day = strftime('%Y-%m-%d', 'now') AND dim = ''",
+        (n,),
+    )
+    await conn.execute(
+        "UPDATE stats_hourly SET value = value - ? WHERE metric = 'signup' AND hour = strftime('%Y-%m-%dT%H', 'now') AND dim = ''",
+        (n,),
+    )
+    created = [r[10] for r in inserts if r[10]]
+    for table, bucket, width in (("stats_daily", "day", 10), ("stats_hourly", "hour", 13)):
+        counts = Counter(ts[:width] for ts in created)
+        if counts:
+            await conn.executemany(
+                f"""
+                INSERT INTO {table}(metric, {bucket}, dim, value) VALUES('signup', ?, '', ?)
+                ON CONFLICT(metric, {bucket}, dim) DO UPDATE SET value = value + excluded.value
+                """,
+                list(counts.items()),
+            )
+
+
+async def import_legacy(
+    legacy_path: str,
+    db_path: str,
+    *,
+    dry_run: bool = False,
+    restart: bool = False,
+    batch: int = BATCH_ROWS,
+    profile: DbProfile | None = None,
+) -> LegacyReport:
+    source = str(Path(legacy_path).resolve())
+    legacy = await aiosqlite.connect(f"file:{legacy_path}?mode=ro", uri=True)
+    # пробный прогон: рабочая БД только на чтение, без миграций
+    conn = await aiosqlite.connect(f"file:{db_path}?mode=ro" if dry_run else db_path, uri=dry_run)
+    try:
+        await apply_profile(conn, profile or DbProfile(), read_only=dry_run)
+        if dry_run:
+            await require_latest(conn)
+        else:
+            await migrate(conn)
+        shape, pk, select = await _detect(legacy)
+        report = LegacyReport(source=Path(legacy_path).name, shape=shape, dry_run=dry_run)
+
+        last_id = 0
+        if not restart:
+            cur = await conn.execute("SELECT last_id FROM legacy_import_state WHERE source=?", (source,))
+            row = await cur.fetchone()
+            last_id = report.resumed_from = row[0] if row else 0
+
+        while True:
+            cur = await legacy.execute(
+                f"SELECT {select} FROM users WHERE {pk} > ? ORDER BY {pk} LIMIT ?", (last_id, batch)
+            )
+            raw = await cur.fetchall()
+            if not raw:
+                break
+            now = utcnow_iso()
+            rows = [_map_row(r, report, now) for r in raw]
+            last_id = raw[-1][0]
+            report.rows += len(rows)
+            await _apply_batch(conn, rows, report, source, last_id)
+            logger.info("legacy import %s: up to %s (%s rows)", report.source, last_id, report.rows)
+    finally:
+        await conn.close()
+        await legacy.close()
+    return report
+
+
+def write_conflicts(report: LegacyReport, path: str) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["telegram_id", "field", "kept", "legacy"])
+        w.writerows(report.conflicts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.legacy_import", description="Перенос пользователей из старой БД")
+    parser.add_argument("legacy", help="путь к БД старого бота (открывается только на чтение)")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "/data/bot.sqlite"))
+    parser.add_argument("--dry-run", action="store_true", help="посчитать, ничего не записывая")
+    parser.add_argument("--restart", action="store_true", help="начать с начала, игнорируя сохранённый курсор")
+    parser.add_argument("--batch", type=int, default=BATCH_ROWS, help="строк на транзакцию")
+    parser.add_argument("--conflicts", help="записать все расхождения в CSV")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = asyncio.run(import_legacy(
+            args.legacy, args.db,
+            dry_run=args.dry_run, restart=args.restart, batch=args.batch, profile=load_db_profile(),
+        ))
+    except RuntimeError as e:
+        print(f"Перенос не выполнен: {e}")
+        return 1
+    print(report.text())
+    if args.conflicts:
+        write_conflicts(report, args.conflicts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import asyncio
 import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.fsm.storage.memory import MemoryStorage
@@ -7,9 +9,15 @@ from aiogram.filters import StateFilter
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from app.broadcast import FAIL_LABELS, BroadcastEngine, BroadcastWorker, Rollout
+from app.catalog import Catalog
 from app.config import load_config
+from app.db.backup import Backups
+from app.db.tuning import Maintenance
 from app.db.repo import Repo
 from app.navigation import Nav, Screen
+from app.notify import AdminNotifier
+from app.segments import SegmentIndex
 from app import texts, media
 
 from app.handlers import (
@@ -24,6 +32,8 @@ from app.handlers import (
     admin_broadcast,
     admin_content,
     admin_fileid,
+    admin_backup,
+    inline_search,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -68,6 +78,93 @@ def register_core_screens(nav: Nav):
     nav.register("menu:guest", menu_guest)
 
 
+TREND_METRICS = (
+    ("signup", "Регистрации"),
+    ("consent", "Согласия"),
+    ("notify_on", "Рассылка вкл"),
+    ("notify_off", "Рассылка выкл"),
+    ("designer", "Дизайнеры"),
+    ("visit", "Заявки на визит"),
+    ("unreachable", "Недоступны"),
+)
+SPARK = "▁▂▃▄▅▆▇█"
+
+
+def _sparkline(values: list[int]) -> str:
+    top = max(values) if values else 0
+    if not top:
+        return SPARK[0] * len(values)
+    return "".join(SPARK[v * (len(SPARK) - 1) // top] for v in values)
+
+
+async def build_stats_text(repo: Repo) -> str:
+    """Счётчики + тренды из stats_daily/stats_hourly (без сканов users/visit_requests)."""
+    st = await repo.stats()
+
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    since_30 = (today - timedelta(days=29)).isoformat()
+    since_7 = (today - timedelta(days=6)).isoformat()
+    since_24h = (now - timedelta(hours=23)).strftime("%Y-%m-%dT%H")
+    last_7_days = [(today - timedelta(days=i)).isoformat() for i in range(6, -1, -1)]
+
+    metrics = tuple(m for m, _ in TREND_METRICS) + ("visit_method",)
+    daily = await repo.stats_rollup_daily(metrics, since_30)
+    hourly = await repo.stats_rollup_hourly(metrics, since_24h)
+
+    per_day: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    per_dim: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for metric, day, dim, value in daily:
+        per_day[metric][day] += value
+        if dim:
+            per_dim[metric][dim] += value
+    last_24h: dict[str, int] = defaultdict(int)
+    for metric, _, _, value in hourly:
+        last_24h[metric] += value
+
+    lines = [
+        "Статистика:",
+        f"Users: {st['users']}",
+        f"Notify enabled: {st['notify']}",
+        f"Unreachable: {st['unreachable']}",
+        f"Visit requests NEW: {st['visit_new']}",
+        "",
+        "Динамика (24ч / 7д / 30д), график — последние 7 дней:",
+    ]
+    for metric, title in TREND_METRICS:
+        days = per_day[metric]
+        d7 = sum(v for d, v in days.items() if d >= since_7)
+        d30 = sum(days.values())
+        spark = _sparkline([days.get(d, 0) for d in last_7_days])
+        lines.append(f"{title}: {last_24h[metric]} / {d7} / {d30}  {spark}")
+
+    for metric, title in (("visit", "Визиты по городам (30д)"), ("visit_method", "Способ связи (30д)")):
+        dims = sorted(per_dim[metric].items(), key=lambda kv: kv[1], reverse=True)
+        if dims:
+            lines.append(f"{title}: " + ", ".join(f"{k} {v}" for k, v in dims))
+
+    return "\n".join(lines)
+
+
+UNREACHABLE_REPORT_EVERY = 24 * 3600  # сек
+
+
+async def build_unreachable_report(repo: Repo) -> str | None:
+    """Сколько подписчиков за сутки выпало из аудитории (по причинам). None — никого."""
+    since_24h = (datetime.now(timezone.utc) - timedelta(hours=23)).strftime("%Y-%m-%dT%H")
+    per_reason: dict[str, int] = defaultdict(int)
+    for _, _, dim, value in await repo.stats_rollup_hourly(("unreachable",), since_24h):
+        per_reason[dim] += value
+    if not per_reason:
+        return None
+    st = await repo.stats()
+    reasons = ", ".join(f"{FAIL_LABELS.get(k, k)} {v}" for k, v in sorted(per_reason.items(), key=lambda kv: -kv[1]))
+    return (
+        f"Аудитория рассылки за 24ч: исключено {sum(per_reason.values())} ({reasons}).\n"
+        f"Всего недоступных: {st['unreachable']} · подписчиков: {st['notify']}"
+    )
+
+
 async def is_registered(repo: Repo, telegram_id: int) -> bool:
     u = await repo.get_user(telegram_id)
     return bool(u and u.consent == 1 and u.name and u.email and u.role)
@@ -79,11 +176,66 @@ async def main():
     bot = Bot(token=cfg.bot_token)
     dp = Dispatcher(storage=MemoryStorage())
 
-    repo = Repo(cfg.db_path)
+    repo = Repo(cfg.db_path, cfg.db_profile)
     await repo.connect()
-    await repo.init_schema("app/db/schema.sql")
+    await repo.init_schema()
+
+    catalog = Catalog(repo)
+    await catalog.refresh()
+
+    # ✅ сегменты аудитории в памяти: строятся один раз, дальше Repo сообщает об изменениях users
+    segments = SegmentIndex(repo)
+    repo.on_users_changed = segments.on_users_changed
+    await segments.rebuild()
+    segments_task = asyncio.create_task(segments.loop())
+
+    # ✅ inline-поиск читает БД своим read-only соединением
+    search_repo = Repo(cfg.db_path, cfg.db_profile, read_only=True)
+    await search_repo.connect()
+    search = inline_search.InlineSearch(search_repo, catalog)
+
+    # ✅ онлайн-бэкапы БД (по расписанию + /backup)
+    backups = Backups(cfg.db_path, cfg.backup_dir, cfg.backup_keep)
+    backup_task = None
+    if cfg.backup_interval_hours > 0:
+        backup_task = asyncio.create_task(backups.loop(cfg.backup_interval_hours))
 
-    nav = Nav()
+    # ✅ уведомления админам (заявки, телефоны, дизайнеры): хендлер пишет в admin_outbox,
+    # шлёт фоновая задача — в группу/тему вида или в личку админам; alert() — служебные
+    notifier = AdminNotifier(
+        bot, repo, cfg.admin_ids,
+        cfg.notify_window_s, cfg.notify_digest_min,
+        cfg.notify_chat_id, cfg.notify_chats, cfg.notify_topics,
+    )
+    repo.on_outbox = notifier.wake
+    notify_task = asyncio.create_task(notifier.loop())
+
+    # ✅ обслуживание БД: checkpoint WAL / optimize / предупреждения админам о росте WAL
+    maintenance_task = asyncio.create_task(Maintenance(repo, alarm=notifier.alert).loop())
+
+    # ✅ рассылки: задания в БД, один воркер/движок на процесс — общий лимит скорости и пауза RetryAfter;
+    # незавершённое до рестарта задание воркер продолжит сам
+    broadcasts = BroadcastWorker(
+        bot, repo,
+        BroadcastEngine(cfg.broadcast_rate, cfg.broadcast_workers),
+        Rollout(cfg.broadcast_canary_pct, cfg.broadcast_wave_factor, cfg.broadcast_halt_error_rate),
+    )
+    broadcast_task = asyncio.create_task(broadcasts.loop())
+
+    # ✅ недоступные пользователи (blocked / deactivated / not_found) — из Nav и рассылок
+    async def unreachable_report_loop() -> None:
+        while True:
+            await asyncio.sleep(UNREACHABLE_REPORT_EVERY)
+            try:
+                text = await build_unreachable_report(repo)
+                if text:
+                    await notifier.alert(text)
+            except Exception:
+                logger.exception("unreachable report failed")
+
+    report_task = asyncio.create_task(unreachable_report_loop())
+
+    nav = Nav(on_unreachable=repo.mark_unreachable)
 
     # screens
     start_onboarding.register_screens(nav, repo)
@@ -93,7 +245,7 @@ async def main():
     menu_contacts_guest.register_screens(nav, repo)
     menu_invite_main.register_screens(nav, repo)
     menu_settings.register_screens(nav, repo)
-    sculptures_catalog.register_screens(nav, repo)
+    sculptures_catalog.register_screens(nav, repo, catalog)
     menu_designer.register_screens(nav, repo)
 
     # routers
@@ -108,6 +260,8 @@ async def main():
     dp.include_router(admin_broadcast.router)
     dp.include_router(admin_content.router)
     dp.include_router(admin_fileid.router)
+    dp.include_router(admin_backup.router)
+    dp.include_router(inline_search.router)
 
     # ----- admin panel (/admin) + stats -----
     @dp.message(F.text == "/admin")
@@ -117,6 +271,7 @@ async def main():
         kb = InlineKeyboardBuilder()
         kb.button(text="➕ Добавить коллекцию", callback_data="admin:add_collection")
         kb.button(text="➕ Добавить скульптуру", callback_data="admin:add_sculpture")
+        kb.button(text="📥 Импорт каталога", callback_data="admin:import_catalog")
         kb.button(text="📣 Рассылка", callback_data="admin:broadcast")
         kb.button(text="📊 Статистика", callback_data="admin:stats")
         kb.adjust(1)
@@ -127,11 +282,7 @@ async def main():
         if cb.from_user.id not in admin_ids:
             await cb.answer()
             return
-        st = await repo.stats()
-        await cb.bot.send_message(
-            cb.from_user.id,
-            f"Статистика:\nUsers: {st['users']}\nNotify enabled: {st['notify']}\nVisit requests NEW: {st['visit_new']}",
-        )
+        await cb.bot.send_message(cb.from_user.id, await build_stats_text(repo))
         await cb.answer()
 
     # ------ Global callbacks: main/back ------
@@ -162,8 +313,21 @@ async def main():
         await message.answer(texts.OPEN_MENU_FALLBACK_TEXT, reply_markup=kb.as_markup())
 
     try:
-        await dp.start_polling(bot, repo=repo, nav=nav, admin_ids=cfg.admin_ids)
+        await dp.start_polling(
+            bot, repo=repo, nav=nav, catalog=catalog, backups=backups,
+            inline_search=search, broadcasts=broadcasts, segments=segments, admin_ids=cfg.admin_ids,
+        )
     finally:
+        # воркер рассылки дописывает журнал в finally — дожидаемся до закрытия Repo
+        broadcast_task.cancel()
+        notify_task.cancel()
+        await asyncio.gather(broadcast_task, notify_task, return_exceptions=True)
+        maintenance_task.cancel()
+        report_task.cancel()
+        segments_task.cancel()
+        if backup_task:
+            backup_task.cancel()
+        await search_repo.close()
         await repo.close()
 
 
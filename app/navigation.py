@@ -6,9 +6,10 @@ from typing import Callable, Awaitable, Any
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
 from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
 
+from app.broadcast import UNREACHABLE, classify
 from app.utils.safe_delete import safe_delete
 
 
@@ -26,6 +27,7 @@ class Screen:
 
 
 Renderer = Callable[[int, dict], Awaitable[Screen]]
+UnreachableHook = Callable[[int, str], Awaitable[None]]  # (chat_id, blocked/deactivated/not_found)
 
 CAPTION_LIMIT = 1000  # безопасно для caption (Telegram 1024, HTML/ссылки могут съесть лимит)
 
@@ -44,11 +46,17 @@ class Nav:
     - last message ids (может быть 1-2 сообщения: медиа + текст)
     """
 
-    def __init__(self, default_parse_mode: ParseMode = ParseMode.HTML) -> None:
+    def __init__(
+        self,
+        default_parse_mode: ParseMode = ParseMode.HTML,
+        on_unreachable: UnreachableHook | None = None,
+    ) -> None:
         self._stack: dict[int, list[str]] = {}
         self._last_ids: dict[int, list[int]] = {}
         self._renderers: dict[str, Renderer] = {}
         self._default_parse_mode: ParseMode = default_parse_mode
+        # ✅ бот заблокирован / аккаунт удалён — сообщаем наружу (Repo.mark_unreachable)
+        self._on_unreachable = on_unreachable
 
     def register(self, screen_prefix: str, renderer: Renderer) -> None:
         self._renderers[screen_prefix] = renderer
@@ -99,6 +107,7 @@ class Nav:
         Ретраи на сетевые обрывы Telegram.
         - TelegramRetryAfter: ждём сколько сказал Telegram
         - TelegramNetworkError: 3 попытки с backoff 1/2/4 сек
+        - blocked / deactivated / chat not found: on_unreachable(chat_id, причина) и дальше как было
         """
         delay = 1
         for attempt in range(3):
@@ -112,6 +121,11 @@ class Nav:
                     raise
                 await asyncio.sleep(delay)
                 delay *= 2
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                reason = classify(e)
+                if reason in UNREACHABLE and self._on_unreachable and "chat_id" in kwargs:
+                    await self._on_unreachable(kwargs["chat_id"], reason)
+                raise
 
     async def show_screen(
         self,
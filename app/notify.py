@@ -0,0 +1,336 @@
+"""
+Уведомления админам через outbox (таблица admin_outbox, миграция v10).
+
+- Хендлер не шлёт админам сам: Notice.row() передаётся в метод Repo (create_visit_request,
+  update_profile, set_designer_interest) и пишется в той же транзакции, что и заявка /
+  профиль. Путь пользователя — одна локальная запись, без ожидания Telegram.
+- AdminNotifier — фоновая задача: берёт pending-уведомления, шлёт каждому админу,
+  done_targets помнит, кому уже доставлено (повтор — только остальным). Сеть/5xx/прочее —
+  повтор с backoff до MAX_ATTEMPTS, затем status=dead; RetryAfter — вся пачка ждёт.
+  Админ заблокировал бота / чат не найден — этому адресату не повторяем.
+- Доставка at-least-once: упали между отправкой и записью итога — после рестарта
+  уведомление уйдёт ещё раз.
+- Всплески сворачиваются: первое событие вида (visit / phone / designer) уходит сразу и
+  открывает окно window сек; пришедшие в окне откладываются (next_at = конец окна) и
+  уходят вместе — все накопленные за окно: от digest_min[kind] штук — сводкой на админа
+  (по DIGEST_MAX событий в сообщении), меньше — по одному.
+  Отложенные не считаются попытками и переживают рестарт (next_at в БД).
+- Куда: у вида может быть маршрут — группа админов (chat_id) и тема форума (thread_id),
+  тогда событие — одна отправка в группу. Без маршрута — личка каждому админу.
+  Группа недоступна насовсем (бота удалили, темы нет) — это событие уходит в личку, а
+  маршрут не используется ROUTE_RETRY сек. done_targets хранит ключи адресатов:
+  «chat» / «chat/thread», «…!» — маршрут не сработал, нужна личка.
+- alert() — служебные сообщения (WAL, отчёт о недоступных) тем же маршрутом, сразу, без outbox.
+"""
+from __future__ import annotations
+
+import asyncio
+import html
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Mapping
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.broadcast import BAD_REQUEST, UNREACHABLE, classify
+from app.db.models import OutboxItem
+from app.db.repo import Repo
+
+logger = logging.getLogger("form_bronze_bot.notify")
+
+VISIT = "visit"
+PHONE = "phone"
+DESIGNER = "designer"
+SYSTEM = "system"  # alert(): предупреждения БД, отчёты
+
+OUTBOX_BATCH = 20     # уведомлений за проход (и страница при дочитке вида)
+DIGEST_MAX = 20       # событий в одном сообщении сводки (лимит текста Telegram 4096)
+MAX_ATTEMPTS = 10
+RETRY_BASE = 5        # сек, удваивается с каждой попыткой
+RETRY_MAX = 3600      # сек
+IDLE_POLL = 60        # сек: без пробуждений всё равно иногда смотрим в очередь
+ROUTE_RETRY = 3600    # сек: сколько не пробуем сломанный маршрут в группу
+NOTIFY_WINDOW = 120.0  # сек, окно сворачивания всплеска
+DIGEST_MIN = {VISIT: 3, PHONE: 3, DESIGNER: 3}  # событий вида за окно, с которых — сводка
+DIGEST_TITLES = {VISIT: "🏙 Заявки на визит", PHONE: "📲 Запросы связи", DESIGNER: "🎨 Заявки дизайнеров"}
+
+
+@dataclass(frozen=True, slots=True)
+class Notice:
+    kind: str                               # VISIT / PHONE / DESIGNER
+    title: str
+    fields: tuple[tuple[str, str], ...]     # (подпись, значение)
+    user_id: int
+
+    def row(self) -> tuple[str, str]:
+        """(kind, payload JSON) для admin_outbox."""
+        payload = {"title": self.title, "fields": self.fields, "user_id": self.user_id}
+        return self.kind, json.dumps(payload, ensure_ascii=False)
+
+    @classmethod
+    def from_item(cls, item: OutboxItem) -> "Notice":
+        p = json.loads(item.payload)
+        return cls(item.kind, p["title"], tuple((k, v) for k, v in p["fields"]), p["user_id"])
+
+    def render(self) -> str:
+        """HTML-текст уведомления (значения экранируются)."""
+        lines = [f"<b>{html.escape(self.title)}</b>"]
+        lines += [f"{html.escape(k)}: {html.escape(v or '—')}" for k, v in self.fields]
+        lines.append(f"Профиль: tg://user?id={self.user_id}")
+        return "\n".join(lines)
+
+    def line(self) -> str:
+        """Одна строка сводки: значения полей через « · » + профиль."""
+        values = [html.escape(v) for _, v in self.fields if v and v != "—"]
+        return " · ".join([*values, f"tg://user?id={self.user_id}"])
+
+
+def render_digest(kind: str, notices: list[Notice]) -> str:
+    lines = [f"<b>{html.escape(DIGEST_TITLES.get(kind, kind))}: {len(notices)}</b>"]
+    lines += [f"• {n.line()}" for n in notices]
+    return "\n".join(lines)
+
+
+def tg_username(user) -> str:
+    return f"@{user.username}" if user.username else "—"
+
+
+def _backoff(attempts: int) -> float:
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def _target(key: str) -> tuple[int, int | None]:
+    """«chat» / «chat/thread» -> (chat_id, message_thread_id)."""
+    chat, _, thread = key.partition("/")
+    return int(chat), int(thread) if thread else None
+
+
+def _iso(moment: datetime) -> str:
+    return moment.replace(microsecond=0).isoformat()
+
+
+def _at(seconds: float) -> str:
+    return _iso(datetime.now(timezone.utc) + timedelta(seconds=seconds))
+
+
+class AdminNotifier:
+    """Фоновая отправка admin_outbox (см. docstring модуля)."""
+
+    def __init__(
+        self,
+        bot: Bot,
+        repo: Repo,
+        admin_ids: set[int],
+        window: float = NOTIFY_WINDOW,
+        digest_min: Mapping[str, int] | None = None,
+        chat_id: int | None = None,
+        chats: Mapping[str, int] | None = None,
+        topics: Mapping[str, int] | None = None,
+    ) -> None:
+        """chat_id — группа админов для всех видов, chats — своя группа вида, topics — тема форума вида."""
+        self.bot = bot
+        self.repo = repo
+        self.admin_ids = admin_ids
+        self.window = window
+        self.digest_min = {**DIGEST_MIN, **(digest_min or {})}
+        self.chat_id = chat_id
+        self.chats = dict(chats or {})
+        self.topics = dict(topics or {})
+        self._window_end: dict[str, datetime] = {}  # kind -> конец текущего окна
+        self._broken: dict[str, float] = {}  # ключ маршрута -> до какого monotonic не пробуем
+        self._wake = asyncio.Event()
+
+    # --------- маршруты ---------
+    def _route(self, kind: str) -> str | None:
+        """Ключ маршрута вида в группу («chat» / «chat/thread») или None — личка админам."""
+        chat = self.chats.get(kind, self.chat_id)
+        if chat is None:
+            return None
+        thread = self.topics.get(kind)
+        return f"{chat}/{thread}" if thread else str(chat)
+
+    def _required(self, kind: str, done: set[str]) -> set[str]:
+        """Кому событие должно уйти (с учётом отката в личку)."""
+        dms = {str(aid) for aid in self.admin_ids}
+        route = self._route(kind)
+        if route is None or f"{route}!" in done:
+            return dms
+        if route in done:
+            return {route}
+        if self._broken.get(route, 0.0) > time.monotonic():
+            return dms
+        return {route}
+
+    def _route_failed(self, route: str, outcome: str) -> None:
+        if route not in self._broken:
+            logger.warning("admin notify route %s failed (%s): falling back to admin DMs", route, outcome)
+        self._broken[route] = time.monotonic() + ROUTE_RETRY
+
+    async def _send(self, key: str, text: str, parse_mode: str | None = "HTML") -> None:
+        chat_id, thread_id = _target(key)
+        await self.bot.send_message(
+            chat_id, text, message_thread_id=thread_id, parse_mode=parse_mode, disable_web_page_preview=True
+        )
+
+    async def alert(self, text: str) -> None:
+        """Служебное сообщение админам (обычный текст): маршрут SYSTEM или личка; без повторов."""
+        route = self._route(SYSTEM)
+        if route and self._broken.get(route, 0.0) <= time.monotonic():
+            try:
+                await self._send(route, text, parse_mode=None)
+                return
+            except Exception as e:
+                self._route_failed(route, classify(e))
+        for aid in sorted(self.admin_ids):
+            try:
+                await self._send(str(aid), text, parse_mode=None)
+            except Exception:
+                logger.exception("admin alert to %s failed", aid)
+
+    def wake(self) -> None:
+        """Хук Repo.on_outbox: появилось новое уведомление."""
+        self._wake.set()
+
+    async def drain(self) -> tuple[int, float]:
+        """Один проход по очереди: (обработано, пауза RetryAfter в сек или 0)."""
+        now = datetime.now(timezone.utc)
+        items = await self.repo.due_outbox(_iso(now), OUTBOX_BATCH)
+        by_kind: dict[str, list[OutboxItem]] = {}
+        for item in items:
+            by_kind.setdefault(item.kind, []).append(item)
+
+        n = len(items)
+        for kind, group in by_kind.items():
+            end = self._window_end.get(kind)
+            if end and now < end:
+                # окно этого вида ещё идёт — уйдут вместе в его конце
+                await self.repo.postpone_outbox([i.id for i in group], _iso(end))
+                continue
+            if self.window > 0:
+                self._window_end[kind] = now + timedelta(seconds=self.window)
+            if len(items) == OUTBOX_BATCH:
+                # страница полная — окно закрылось: весь накопленный вид сейчас, а не по
+                # OUTBOX_BATCH за окно
+                more = await self._due_of_kind(kind, _iso(now))
+                n += len(more) - len(group)
+                group = more
+            if len(group) >= self.digest_min.get(kind, 2):
+                batches = [group[i:i + DIGEST_MAX] for i in range(0, len(group), DIGEST_MAX)]
+            else:
+                batches = [[i] for i in group]
+            for batch in batches:
+                pause = await self._deliver(batch)
+                if pause:
+                    # лимит на бота: остальные подождут вместе с этими; окно не держим —
+                    # после паузы недоставленное уйдёт сразу, а не в конце нового окна
+                    self._window_end.pop(kind, None)
+                    return n, pause
+        return n, 0.0
+
+    async def _due_of_kind(self, kind: str, now: str) -> list[OutboxItem]:
+        """Все pending вида, которым пора, — страницами по OUTBOX_BATCH."""
+        out: list[OutboxItem] = []
+        after: tuple[str, int] | None = None
+        while True:
+            page = await self.repo.due_outbox(now, OUTBOX_BATCH, kind, after)
+            out += page
+            if len(page) < OUTBOX_BATCH:
+                return out
+            after = (page[-1].next_at, page[-1].id)
+
+    async def _deliver(self, items: list[OutboxItem]) -> float:
+        """Одно сообщение на админа: уведомление или сводка. Возвращает паузу RetryAfter (0 — не просили)."""
+        notices: dict[int, Notice] = {}
+        for item in items:
+            try:
+                notices[item.id] = Notice.from_item(item)
+            except (ValueError, KeyError, TypeError) as e:
+                await self.repo.update_outbox(item.id, "dead", item.attempts + 1, item.done_targets, item.next_at, f"payload: {e}")
+                logger.error("admin outbox #%s: bad payload: %s", item.id, e)
+        items = [i for i in items if i.id in notices]
+        done = {i.id: {x for x in i.done_targets.split(",") if x} for i in items}
+        errors: dict[int, str] = {}
+        delay: float | None = None
+        tried: set[str] = set()
+        dms = {str(aid) for aid in self.admin_ids}
+
+        # второй круг — только если маршрут в группу отказал и события ушли в личку
+        while delay is None:
+            pending = {t for i in items for t in self._required(i.kind, done[i.id]) - done[i.id]} - tried
+            if not pending:
+                break
+            for key in sorted(pending):
+                tried.add(key)
+                todo = [i for i in items if key in self._required(i.kind, done[i.id]) - done[i.id]]
+                if len(todo) == 1:
+                    text = notices[todo[0].id].render()
+                else:
+                    text = render_digest(todo[0].kind, [notices[i.id] for i in todo])
+                try:
+                    await self._send(key, text)
+                except TelegramRetryAfter as e:
+                    delay = float(e.retry_after)
+                    errors.update((i.id, f"retry_after {e.retry_after}s") for i in todo)
+                    break
+                except Exception as e:
+                    outcome = classify(e)
+                    if key not in dms and outcome in (*UNREACHABLE, BAD_REQUEST):
+                        # группа/тема недоступна — эти события в личку
+                        self._route_failed(key, outcome)
+                        for i in todo:
+                            done[i.id].add(f"{key}!")
+                        continue
+                    if outcome not in UNREACHABLE:
+                        errors.update((i.id, f"{outcome}: {e}") for i in todo)
+                        continue
+                    # админ не получит никогда (заблокировал бота) — события из-за него не держим
+                    logger.warning("admin outbox: admin %s unreachable (%s)", key, outcome)
+                for i in todo:
+                    done[i.id].add(key)
+
+        for item in items:
+            await self._finish(item, done[item.id], errors.get(item.id), delay)
+        return delay or 0.0
+
+    async def _finish(self, item: OutboxItem, done: set[str], error: str | None, delay: float | None) -> None:
+        done_targets = ",".join(sorted(done))
+        if self._required(item.kind, done) <= done:
+            await self.repo.update_outbox(item.id, "sent", item.attempts + 1, done_targets, item.next_at, None)
+            return
+        attempts = item.attempts + (0 if delay is not None else 1)  # RetryAfter — не попытка
+        if attempts >= MAX_ATTEMPTS:
+            await self.repo.update_outbox(item.id, "dead", attempts, done_targets, item.next_at, error)
+            logger.error("admin outbox #%s (%s): gave up after %s attempts: %s", item.id, item.kind, attempts, error)
+            return
+        next_at = _at(delay if delay is not None else _backoff(attempts))
+        await self.repo.update_outbox(item.id, "pending", attempts, done_targets, next_at, error)
+
+    async def _idle_timeout(self) -> float:
+        next_at = await self.repo.next_outbox_at()
+        if next_at is None:
+            return IDLE_POLL
+        wait = (datetime.fromisoformat(next_at) - datetime.now(timezone.utc)).total_seconds()
+        return min(max(wait, 0.0), IDLE_POLL)
+
+    async def loop(self) -> None:
+        while True:
+            try:
+                n, pause = await self.drain()
+                if pause:
+                    await asyncio.sleep(pause)
+                    continue
+                if n >= OUTBOX_BATCH:
+                    continue  # очередь длиннее пачки — сразу следующий проход
+                timeout = await self._idle_timeout()
+            except Exception:
+                logger.exception("admin outbox drain failed")
+                timeout = IDLE_POLL
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
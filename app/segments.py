@@ -0,0 +1,291 @@
+"""
+Сегменты аудитории рассылки в памяти: имя сегмента -> отсортированный array('q') telegram_id.
+
+- Сегменты: all (подписчики: consent=1, notify_enabled=1, доступен — как AUDIENCE_WHERE),
+  роль (collector / dealer / author / interest или role:<роль>), city:<город> (без учёта
+  регистра), designer (designer_interest=1).
+- Аудитория — выражение из сегментов: «&» — И, «|» — ИЛИ, «!» перед сегментом — НЕ.
+  Считается слева направо, без скобок: «collector | dealer & city:москва & !designer».
+  Результат всегда пересекается с all — согласие и доступность не обойти.
+  «!» внутри имени и city:<город> без единого пользователя — ValueError, а не пустая аудитория.
+- Строится одним проходом по users при старте (keyset-страницами), дальше Repo после
+  каждой записи в users зовёт on_users_changed(ids): id только помечаются, строки
+  перечитываются одним запросом перед следующим resolve()/count(). Раз в REBUILD_EVERY —
+  полная перестройка (записи в users из других процессов, например legacy_import).
+  Немного изменённых id правятся на месте (bisect), много — слиянием сегментов целиком.
+- Превью аудитории (count) и снимок получателей задания — без SQL по users.
+- И / ИЛИ / НЕ — слияние отсортированных array('q') (память — 8 байт на id, без set).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from array import array
+from bisect import bisect_left, insort
+from typing import Iterable
+
+from app.db.repo import Repo
+
+logger = logging.getLogger("form_bronze_bot.segments")
+
+REBUILD_EVERY = 6 * 3600  # сек
+FLUSH_INPLACE_MAX = 64    # изменённых id, до которых _flush правит сегменты на месте
+ALL = "all"
+DESIGNER = "designer"
+ROLES = ("collector", "dealer", "author", "interest")
+
+_OP_RE = re.compile(r"\s*([&|])\s*")
+
+
+def _city_key(city: str) -> str:
+    return "city:" + " ".join(city.split()).casefold()
+
+
+def _keys(subscribed: int, role: str | None, city: str | None, designer: int | None) -> list[str]:
+    """Сегменты, в которые входит строка users."""
+    keys = [ALL] if subscribed else []
+    if role:
+        keys.append(role)
+    if city and city.strip():
+        keys.append(_city_key(city))
+    if designer:
+        keys.append(DESIGNER)
+    return keys
+
+
+def _segment_key(name: str) -> str:
+    """Имя сегмента из выражения -> ключ индекса. ValueError — неизвестное имя."""
+    name = name.strip()
+    if "!" in name:
+        raise ValueError(f"«!» ставится только перед сегментом: {name!r}")
+    low = name.casefold()
+    if low in (ALL, DESIGNER) or low in ROLES:
+        return low
+    if low.startswith("role:") and low[5:] in ROLES:
+        return low[5:]
+    if low.startswith("city:") and name[5:].strip():
+        return _city_key(name[5:])
+    raise ValueError(f"неизвестный сегмент: {name!r}")
+
+
+def parse(expr: str) -> list[tuple[str, bool, str]]:
+    """«a & !b | c» -> [('&', False, 'a'), ('&', True, 'b'), ('|', False, 'c')]."""
+    parts = _OP_RE.split(expr.strip())
+    ops = ["&"] + parts[1::2]
+    terms = []
+    for op, term in zip(ops, parts[0::2]):
+        term = term.strip()
+        neg = term.startswith("!")
+        if neg:
+            term = term[1:]
+        terms.append((op, neg, _segment_key(term)))
+    return terms
+
+
+def canonical(expr: str) -> str:
+    """Нормальная запись выражения (её хранит broadcast_jobs.audience и ключ идемпотентности)."""
+    out = ""
+    for i, (op, neg, key) in enumerate(parse(expr)):
+        out += ("" if i == 0 else f" {op} ") + ("!" if neg else "") + key
+    return out
+
+
+# --------- алгебра над отсортированными массивами (слиянием, без set целых сегментов) ---------
+GALLOP = 16  # во сколько раз один массив меньше другого, чтобы искать бинарным поиском
+
+
+def _and(a: array, b: array) -> array:
+    if len(a) > len(b):
+        a, b = b, a
+    out, n = array("q"), len(b)
+    if len(a) * GALLOP <= len(b):
+        # маленький против большого: идём по меньшему, в большем — бинарный поиск с последней позиции
+        lo = 0
+        for x in a:
+            lo = bisect_left(b, x, lo)
+            if lo == n:
+                break
+            if b[lo] == x:
+                out.append(x)
+        return out
+    i = j = 0
+    m = len(a)
+    while i < m and j < n:
+        x, y = a[i], b[j]
+        if x < y:
+            i += 1
+        elif x > y:
+            j += 1
+        else:
+            out.append(x)
+            i += 1
+            j += 1
+    return out
+
+
+def _or(a: array, b: array) -> array:
+    out, i, j, m, n = array("q"), 0, 0, len(a), len(b)
+    while i < m and j < n:
+        x, y = a[i], b[j]
+        if x < y:
+            out.append(x)
+            i += 1
+        elif x > y:
+            out.append(y)
+            j += 1
+        else:
+            out.append(x)
+            i += 1
+            j += 1
+    out.extend(a[i:])
+    out.extend(b[j:])
+    return out
+
+
+def _and_not(a: array, b: array) -> array:
+    out, n = array("q"), len(b)
+    if len(a) * GALLOP <= n:
+        lo = 0
+        for x in a:
+            lo = bisect_left(b, x, lo)
+            if lo == n or b[lo] != x:
+                out.append(x)
+        return out
+    j = 0
+    for x in a:
+        while j < n and b[j] < x:
+            j += 1
+        if j == n or b[j] != x:
+            out.append(x)
+    return out
+
+
+class SegmentIndex:
+    """Держатель сегментов (см. docstring модуля)."""
+
+    def __init__(self, repo: Repo) -> None:
+        self.repo = repo
+        self._segments: dict[str, array] = {}
+        self._dirty: set[int] = set()
+        self._replay: set[int] | None = None  # id, применённые _flush во время rebuild
+        self._lock = asyncio.Lock()
+
+    def on_users_changed(self, telegram_ids: Iterable[int]) -> None:
+        """Хук Repo: строки users изменились (или удалены) — перечитаем перед следующим запросом."""
+        self._dirty.update(telegram_ids)
+
+    async def rebuild(self) -> None:
+        segments: dict[str, array] = {}
+        rows = 0
+        self._replay = set()
+        # keyset по PK: id приходят по возрастанию, append сохраняет порядок
+        async for tid, subscribed, role, city, designer in self.repo.iter_segment_rows():
+            rows += 1
+            for key in _keys(subscribed, role, city, designer):
+                seg = segments.get(key)
+                if seg is None:
+                    seg = segments[key] = array("q")
+                seg.append(tid)
+        async with self._lock:
+            # проход мог прочитать строку до записи: всё, что менялось за время прохода,
+            # перечитаем поверх нового индекса
+            self._segments = segments
+            self._dirty |= self._replay
+            self._replay = None
+        logger.info("segments: %s users, %s segments, %s subscribers", rows, len(segments), len(segments.get(ALL, ())))
+
+    async def _flush(self) -> None:
+        async with self._lock:
+            if not self._dirty:
+                return
+            tids, self._dirty = self._dirty, set()
+            if self._replay is not None:
+                self._replay |= tids
+            try:
+                rows = await self.repo.get_segment_rows(sorted(tids))
+            except Exception:
+                self._dirty |= tids
+                raise
+            if len(tids) <= FLUSH_INPLACE_MAX:
+                self._apply_inplace(tids, rows)
+            else:
+                await self._apply_merge(tids, rows)
+
+    def _apply_inplace(self, tids: set[int], rows: list[tuple]) -> None:
+        """Немного id: убрать/вставить бинарным поиском в каждом сегменте."""
+        segments = self._segments
+        for tid in tids:
+            for key in list(segments):
+                seg = segments[key]
+                i = bisect_left(seg, tid)
+                if i < len(seg) and seg[i] == tid:
+                    del seg[i]
+                    if not seg:
+                        del segments[key]
+        for tid, subscribed, role, city, designer in rows:
+            for key in _keys(subscribed, role, city, designer):
+                insort(segments.setdefault(key, array("q")), tid)
+
+    async def _apply_merge(self, tids: set[int], rows: list[tuple]) -> None:
+        """
+        Много id (например, пачка недоступных из журнала рассылки): каждый сегмент — один
+        проход (фильтр + слияние с перечитанными строками) вместо del/insort на каждый id.
+        Между сегментами отдаём управление циклу; индекс подменяется целиком в конце.
+        """
+        added: dict[str, array] = {}
+        for tid, subscribed, role, city, designer in sorted(rows):
+            for key in _keys(subscribed, role, city, designer):
+                added.setdefault(key, array("q")).append(tid)
+        drop = array("q", sorted(tids))
+        segments: dict[str, array] = {}
+        for key, seg in self._segments.items():
+            seg = _or(_and_not(seg, drop), added.pop(key, array("q")))
+            if seg:
+                segments[key] = seg
+            await asyncio.sleep(0)
+        segments.update(added)
+        self._segments = segments
+
+    async def resolve(self, expr: str) -> array:
+        """telegram_id аудитории по возрастанию (новый массив). ValueError — ошибка в выражении."""
+        terms = parse(expr)
+        await self._flush()
+        segments = self._segments
+        for _, _, key in terms:
+            if key.startswith("city:") and key not in segments:
+                raise ValueError(f"нет пользователей с городом {key[5:]!r}")
+        everyone = segments.get(ALL, array("q"))
+        result: array | None = None
+        for op, neg, key in terms:
+            ids = segments.get(key, array("q"))
+            if neg:
+                ids = _and_not(everyone, ids)
+            if result is None:
+                result = ids
+            elif op == "&":
+                result = _and(result, ids)
+            else:
+                result = _or(result, ids)
+        return _and(result, everyone)
+
+    async def count(self, expr: str) -> int:
+        """Превью: сколько получателей у выражения сейчас."""
+        return len(await self.resolve(expr))
+
+    async def sizes(self) -> dict[str, int]:
+        """Подписчиков в all и в каждой роли — для кнопок выбора аудитории."""
+        await self._flush()
+        everyone = self._segments.get(ALL, array("q"))
+        out = {ALL: len(everyone)}
+        for role in ROLES:
+            out[role] = len(_and(self._segments.get(role, array("q")), everyone))
+        return out
+
+    async def loop(self) -> None:
+        while True:
+            await asyncio.sleep(REBUILD_EVERY)
+            try:
+                await self.rebuild()
+            except Exception:
+                logger.exception("segments rebuild failed")
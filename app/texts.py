@@ -140,6 +140,12 @@ OPEN_MENU_FALLBACK_TEXT = "Что-то пошло не так, вернутьс
 
 ADMIN_PANEL_TEXT = "Админ-панель:"
 BROADCAST_AUDIENCE_TEXT = "Выберите аудиторию рассылки:"
+BROADCAST_SEGMENT_PROMPT = (
+    "Введите аудиторию выражением из сегментов:\n"
+    "all, collector, dealer, author, interest, designer, city:<город>\n"
+    "& — и, | — или, ! — не (слева направо, без скобок).\n"
+    "Пример: collector | dealer & city:Москва & !designer"
+)
 BROADCAST_SEND_PROMPT = "Отправьте пост (текст/фото/видео), который нужно разослать."
 BROADCAST_ADD_LINK_Q = "Добавить кнопку-ссылку под постом?"
 BROADCAST_LINK_TEXT_Q = "Введите текст кнопки:"
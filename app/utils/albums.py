@@ -0,0 +1,41 @@
+"""
+Альбомы (media_group_id): Telegram присылает каждую часть альбома отдельным сообщением,
+почти одновременно, и aiogram обрабатывает их параллельно.
+
+AlbumCollector.collect(): первая часть группы ждёт, пока части перестанут приходить
+(ALBUM_WAIT сек тишины), и получает весь альбом; остальные части получают None —
+хендлер для них ничего не делает. Итог: одна запись в состояние и один ответ на альбом.
+Сообщение без media_group_id возвращается сразу как альбом из одного.
+"""
+from __future__ import annotations
+
+import asyncio
+
+from aiogram.types import Message
+
+ALBUM_WAIT = 0.6  # сек тишины, после которой альбом считаем полным
+
+
+class AlbumCollector:
+    def __init__(self, wait: float = ALBUM_WAIT) -> None:
+        self.wait = wait
+        self._groups: dict[tuple[int, str], list[Message]] = {}
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        """Весь альбом (по message_id) — первой части группы; None — остальным."""
+        if message.media_group_id is None:
+            return [message]
+        key = (message.chat.id, message.media_group_id)
+        parts = self._groups.get(key)
+        if parts is not None:
+            parts.append(message)
+            return None
+        parts = self._groups[key] = [message]
+        try:
+            seen = 0
+            while seen != len(parts):  # пока приходят новые части — ждём дальше
+                seen = len(parts)
+                await asyncio.sleep(self.wait)
+        finally:
+            del self._groups[key]
+        return sorted(parts, key=lambda m: m.message_id)